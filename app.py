@@ -1,12 +1,15 @@
 import streamlit as st
 import os
 import json
-import pandas as pd
-import io
+import time
 import zipfile
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from lxml import etree as ET
-from tableau_analyzer import process_tableau_file, analyseer_tableau_bestand, extraheer_twb_uit_twbx, sla_op_als_json, NAMESPACES
+from tableau_cache import GeheugenCache, bereken_sleutel
+from tableau_json import knoop_op_pad, parse_pad, voorbeeld
+from tableau_linter import lint_werkboek
+from tableau_taken import AnalyseTaak
 
 # Vertaaltabellen voor technische termen naar begrijpelijke taal
 DATATYPE_TRANSLATION = {
@@ -73,13 +76,51 @@ def safe_st_image(rel_or_abs_path, **kwargs):
         # Gebruik een compacte info-melding i.p.v. exception zodat de app niet crasht
         st.info(f"Afbeelding niet gevonden: {rel_or_abs_path}")
 
-# Pagina configuratie
-st.set_page_config(
-    page_title="Tableau Analyzer",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+def configureer_pagina():
+    """
+    Pagina configuratie. Wordt door start_app aangeroepen in plaats van bij het importeren,
+    zodat importeren van deze module geen Streamlit-calls doet.
+    """
+    st.set_page_config(
+        page_title="Tableau Analyzer",
+        page_icon="📊",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+# Grenzen van het gedeelde analyse-register in het geheugen
+ANALYSE_TTL_SECONDEN = int(os.environ.get("TABLEAU_ANALYZER_TTL_SECONDEN", "3600"))
+ANALYSE_MAX_ENTRIES = int(os.environ.get("TABLEAU_ANALYZER_MAX_ANALYSES", "50"))
+# Aantal analyses dat tegelijk draait, over alle sessies samen
+ANALYSE_WORKERS = int(os.environ.get("TABLEAU_ANALYZER_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Hoe vaak de pagina de voortgang van lopende analyses opnieuw ophaalt
+VOORTGANG_INTERVAL_SECONDEN = 0.5
+
+@st.cache_resource
+def _analyse_register():
+    """
+    Proceswijd register van analyses, gedeeld door alle sessies en geïndexeerd op de
+    content-hash van de upload. Sessies bewaren alleen de sleutel, niet de data zelf.
+    """
+    return GeheugenCache(max_entries=ANALYSE_MAX_ENTRIES, ttl_seconden=ANALYSE_TTL_SECONDEN)
+
+@st.cache_resource
+def _analyse_pool():
+    """
+    Proceswijde threadpool voor analyses. Threads delen het register en de standaard
+    Analyzer (die thread-safe is), en lxml geeft de GIL vrij tijdens het parsen.
+    """
+    return ThreadPoolExecutor(max_workers=ANALYSE_WORKERS, thread_name_prefix="analyse")
+
+@st.cache_resource
+def _schijf_cache():
+    """Gedeelde persistente AnalyseCache als TABLEAU_ANALYZER_CACHE_MAP is ingesteld, anders None."""
+    cache_map = os.environ.get("TABLEAU_ANALYZER_CACHE_MAP")
+    if not cache_map:
+        return None
+    from tableau_cache import AnalyseCache
+    max_mb = int(os.environ.get("TABLEAU_ANALYZER_CACHE_MAX_MB", "1024"))
+    return AnalyseCache(cache_map, max_bytes=max_mb * 1024 * 1024)
 
 # Functie om aangepaste CSS te laden
 def load_custom_css():
@@ -92,85 +133,458 @@ def load_custom_css():
     else:
         st.warning("Aangepast CSS-bestand (style.css) niet gevonden in de map 'static'.")
 
-def display_field_info(field):
-    """Toon veldinformatie in een leesbaar formaat"""
+# Aantal rijen per pagina in de resultaattabellen; alleen die rijen worden naar de browser gestuurd
+PAGINA_GROOTTE = 50
+
+VELD_KOLOMMEN = ["naam", "alias", "databron", "datatype", "rol", "type", "berekend", "complexiteit"]
+DATABRON_KOLOMMEN = ["naam", "versie", "kolommen", "berekende_velden", "verbindingen", "custom_sql"]
+VERBINDING_KOLOMMEN = ["databron", "type", "server", "database"]
+WERKBLAD_KOLOMMEN = ["naam", "databronnen", "velden", "filters", "quick_filters"]
+DASHBOARD_KOLOMMEN = ["naam", "objecten", "werkbladen"]
+
+def _toon_tabel(rijen):
+    """Toon een lijst van dicts als tabel; pandas wordt pas geladen als er een tabel getoond wordt."""
+    import pandas as pd
+    st.dataframe(pd.DataFrame(rijen), hide_index=True, use_container_width=True)
+
+def bouw_tabellen(analyse_data):
+    """
+    Zet een analyse om naar de DataFrames van de resultaatweergave.
+    Elke tabel heeft een kolom `_zoek` (naam en alias in kleine letters) voor het zoeken;
+    de veldentabel bewaart in `_ds` en `_kol` waar het veld in analyse_data staat, zodat
+    de details pas worden opgezocht als een veld wordt geopend.
+    """
+    import pandas as pd
+    velden, databronnen, verbindingen = [], [], []
+    for ds_index, ds in enumerate(analyse_data.get('databronnen', [])):
+        kolommen = ds.get('kolommen', [])
+        for kol_index, col in enumerate(kolommen):
+            velden.append({
+                'naam': col.get('naam'),
+                'alias': col.get('alias') or col.get('caption'),
+                'databron': ds.get('naam'),
+                'datatype': translate_datatype(col.get('datatype') or 'unknown'),
+                'rol': translate_role(col.get('rol') or 'unknown'),
+                'type': translate_type(col.get('type') or 'unknown'),
+                'berekend': bool(col.get('is_berekend_veld')),
+                'complexiteit': col.get('complexiteit'),
+                '_ds': ds_index,
+                '_kol': kol_index,
+            })
+        databronnen.append({
+            'naam': ds.get('naam'),
+            'versie': ds.get('versie'),
+            'kolommen': len(kolommen),
+            'berekende_velden': sum(1 for col in kolommen if col.get('is_berekend_veld')),
+            'verbindingen': len(ds.get('verbindingen') or []),
+            'custom_sql': len(ds.get('custom_sql') or []),
+        })
+        for conn in ds.get('verbindingen') or []:
+            verbindingen.append({
+                'databron': ds.get('naam'),
+                'type': conn.get('class'),
+                'server': conn.get('server'),
+                'database': conn.get('dbname'),
+            })
+    werkbladen = [{
+        'naam': ws.get('naam'),
+        'databronnen': ", ".join(ws.get('gebruikte_databronnen') or []),
+        'velden': len(ws.get('gebruikte_velden_direct') or []),
+        'filters': len(ws.get('filters') or []),
+        'quick_filters': ws.get('quick_filters'),
+    } for ws in analyse_data.get('werkbladen', [])]
+    dashboards = [{
+        'naam': db.get('naam'),
+        'objecten': len(db.get('objecten') or []),
+        'werkbladen': ", ".join(obj.get('naam_object') or '' for obj in db.get('objecten') or []
+                                if obj.get('type') == 'viz'),
+    } for db in analyse_data.get('dashboards', [])]
+
+    def _tabel(rijen, kolommen):
+        df = pd.DataFrame(rijen, columns=kolommen + [k for k in ('_ds', '_kol') if rijen and k in rijen[0]])
+        zoektekst = df['naam'].fillna('')
+        if 'alias' in df:
+            zoektekst = zoektekst + ' ' + df['alias'].fillna('')
+        df['_zoek'] = zoektekst.str.casefold()
+        return df
+
+    return {
+        'velden': _tabel(velden, VELD_KOLOMMEN),
+        'databronnen': _tabel(databronnen, DATABRON_KOLOMMEN),
+        'verbindingen': pd.DataFrame(verbindingen, columns=VERBINDING_KOLOMMEN),
+        'werkbladen': _tabel(werkbladen, WERKBLAD_KOLOMMEN),
+        'dashboards': _tabel(dashboards, DASHBOARD_KOLOMMEN),
+    }
+
+@st.cache_resource(max_entries=ANALYSE_MAX_ENTRIES, ttl=ANALYSE_TTL_SECONDEN)
+def _analyse_tabellen(sleutel, _analyse_data):
+    """
+    De tabellen van een analyse, één keer gebouwd per sleutel en gedeeld door alle sessies
+    (analyse_data zelf telt niet mee in de cache-sleutel). De DataFrames worden niet gewijzigd:
+    filteren en pagineren maakt altijd nieuwe frames.
+    """
+    return bouw_tabellen(_analyse_data)
+
+def _filter(df, zoek, keuzes=None):
+    """Filtert op een zoekterm in naam/alias en op de gekozen waarden per kolom."""
+    if zoek:
+        df = df[df['_zoek'].str.contains(zoek.strip().casefold(), regex=False)]
+    for kolom, waarden in (keuzes or {}).items():
+        if waarden:
+            df = df[df[kolom].isin(waarden)]
+    return df
+
+def _toon_pagina(df, sleutel, kolommen):
+    """Toont één pagina van een (gefilterde) tabel en retourneert de rijen van die pagina."""
+    aantal = len(df)
+    paginas = max(1, -(-aantal // PAGINA_GROOTTE))
+    pagina_sleutel = f"{sleutel}_pagina"
+    # Na een strengere filter kan de bewaarde pagina buiten het bereik vallen
+    if st.session_state.get(pagina_sleutel, 1) > paginas:
+        st.session_state[pagina_sleutel] = 1
+    col1, col2 = st.columns([1, 4])
+    with col1:
+        pagina = st.number_input("Pagina", min_value=1, max_value=paginas, step=1, key=pagina_sleutel)
+    with col2:
+        st.caption(f"{aantal} resultaten, pagina {pagina} van {paginas}")
+    start = (pagina - 1) * PAGINA_GROOTTE
+    deel = df.iloc[start:start + PAGINA_GROOTTE]
+    st.dataframe(deel[kolommen], hide_index=True, use_container_width=True)
+    return deel
+
+def _kies_detail(deel, sleutel, label):
+    """Selectbox met de rijen van de huidige pagina; retourneert de index van de gekozen rij of None."""
+    if deel.empty:
+        return None
+    namen = deel['naam'].to_dict()
+    return st.selectbox(label, [None] + list(namen), key=f"{sleutel}_detail",
+                        format_func=lambda i: "— kies om details te tonen —" if i is None else str(namen[i]))
+
+def toon_veld_details(field):
+    """Toon de details van één veld; wordt alleen aangeroepen voor het geopende veld."""
+    st.markdown(f"**{field.get('naam', 'Onbekend')}**")
+    if field.get('alias'):
+        st.caption(f"Weergavenaam (Alias): {field['alias']}")
+    if not field.get('formule'):
+        st.write("Geen berekend veld.")
+        return
+    st.code(field['formule'], language='sql')
+    if 'complexiteit' in field:
+        st.write(f"**Complexiteit:** {field['complexiteit']}")
+    if 'afhankelijkheden' in field:
+        if field['afhankelijkheden']:
+            st.write("**Afhankelijkheden:** " + ", ".join(f"`{dep}`" for dep in field['afhankelijkheden']))
+        else:
+            st.write("Geen directe afhankelijkheden gevonden.")
+    if field.get('gebruikte_functies'):
+        st.write("**Gebruikte functies:** " + ", ".join(f"`{f}`" for f in field['gebruikte_functies']))
+
+def toon_databronnen(tabellen, analyse_data):
+    """Databronnen, verbindingen en een doorzoekbare, gepagineerde lijst van alle velden."""
+    databronnen = tabellen['databronnen']
+    if databronnen.empty:
+        st.info("Geen databronnen gevonden")
+        return
+    st.dataframe(databronnen[DATABRON_KOLOMMEN], hide_index=True, use_container_width=True)
+    if not tabellen['verbindingen'].empty:
+        with st.expander(f"🔌 {len(tabellen['verbindingen'])} verbinding(en)"):
+            st.dataframe(tabellen['verbindingen'], hide_index=True, use_container_width=True)
+    queries = [(ds.get('naam'), query) for ds in analyse_data.get('databronnen', []) for query in ds.get('custom_sql') or []]
+    if queries:
+        with st.expander(f"🧾 {len(queries)} custom SQL-quer{'y' if len(queries) == 1 else 'ies'}"):
+            for databron, query in queries:
+                st.write(f"**{query.get('naam') or 'Zonder naam'}** ({databron}, fingerprint `{query.get('fingerprint')}`)")
+                st.code(query.get('sql') or '', language="sql")
+
+    st.subheader("Velden")
+    velden = tabellen['velden']
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        zoek = st.text_input("Zoek op naam of alias", key="velden_zoek")
+    with col2:
+        datatypes = st.multiselect("Type", sorted(velden['datatype'].dropna().unique()), key="velden_datatype")
+    with col3:
+        rollen = st.multiselect("Rol", sorted(velden['rol'].dropna().unique()), key="velden_rol")
+    with col4:
+        alleen_berekend = st.checkbox("Alleen berekende velden", key="velden_berekend")
+    gefilterd = _filter(velden, zoek, {'datatype': datatypes, 'rol': rollen})
+    if alleen_berekend:
+        gefilterd = gefilterd[gefilterd['berekend']]
+    deel = _toon_pagina(gefilterd, "velden", VELD_KOLOMMEN)
+    gekozen = _kies_detail(deel, "velden", "Details van veld")
+    if gekozen is not None:
+        ds_index, kol_index = int(velden.at[gekozen, '_ds']), int(velden.at[gekozen, '_kol'])
+        toon_veld_details(analyse_data['databronnen'][ds_index]['kolommen'][kol_index])
+
+def toon_werkbladen(tabellen, analyse_data):
+    """Doorzoekbare, gepagineerde lijst van werkbladen met de details van één gekozen werkblad."""
+    werkbladen = tabellen['werkbladen']
+    if werkbladen.empty:
+        st.info("Geen werkbladen gevonden")
+        return
+    zoek = st.text_input("Zoek op naam", key="werkbladen_zoek")
+    deel = _toon_pagina(_filter(werkbladen, zoek), "werkbladen", WERKBLAD_KOLOMMEN)
+    gekozen = _kies_detail(deel, "werkbladen", "Details van werkblad")
+    if gekozen is not None:
+        ws = analyse_data['werkbladen'][gekozen]
+        if ws.get('gebruikte_databronnen'):
+            st.write("**Gebruikte databronnen:** " + ", ".join(ws['gebruikte_databronnen']))
+        if ws.get('gebruikte_velden_direct'):
+            st.write("**Gebruikte velden:** " + ", ".join(f"`{veld}`" for veld in ws['gebruikte_velden_direct']))
+
+def toon_dashboards(tabellen, analyse_data):
+    """Doorzoekbare, gepagineerde lijst van dashboards met de onderdelen van één gekozen dashboard."""
+    dashboards = tabellen['dashboards']
+    if dashboards.empty:
+        st.info("Geen dashboards gevonden")
+        return
+    zoek = st.text_input("Zoek op naam", key="dashboards_zoek")
+    deel = _toon_pagina(_filter(dashboards, zoek), "dashboards", DASHBOARD_KOLOMMEN)
+    gekozen = _kies_detail(deel, "dashboards", "Details van dashboard")
+    if gekozen is not None:
+        objecten = analyse_data['dashboards'][gekozen].get('objecten') or []
+        if objecten:
+            _toon_tabel([{
+                'type': obj.get('type', 'Onbekend'),
+                'naam': obj.get('naam_object') or 'Zonder naam',
+            } for obj in objecten])
+        else:
+            st.write("Geen onderdelen gevonden.")
+
+@st.cache_resource(max_entries=ANALYSE_MAX_ENTRIES, ttl=ANALYSE_TTL_SECONDEN)
+def _lint_rapport(sleutel, _analyse_data):
+    """Het prestatierapport van een analyse, één keer berekend per sleutel."""
+    return lint_werkboek(_analyse_data)
+
+def toon_prestaties(rapport):
+    """Risicoscore en bevindingen van de prestatielinter, de ernstigste eerst."""
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Naam", field.get('naam', 'Onbekend'))
+        st.metric("Risicoscore", rapport["risicoscore"])
     with col2:
-        st.metric("Type", translate_datatype(field.get('datatype', 'unknown')))
+        st.metric("Risico", rapport["risico"])
     with col3:
-        st.metric("Rol", translate_role(field.get('rol', 'unknown')))
-    
-    # Toon aanvullende informatie
-    if 'formule' in field and field['formule']:
-        with st.expander("Details berekend veld"):
-            st.write("**Formule:**")
-            st.code(field['formule'], language='sql') # 'tableau' of 'markdown' indien beter
-            
-            if 'complexiteit' in field:
-                st.write(f"**Complexiteit:** {field['complexiteit']}")
-            
-            if 'afhankelijkheden' in field:
-                st.write("**Afhankelijkheden:**")
-                if field['afhankelijkheden']:
-                    for dep in field['afhankelijkheden']:
-                        st.write(f"- `{dep}`") # Gebruik code formatting voor veldnamen
-                else:
-                    st.write("Geen directe afhankelijkheden gevonden.")
-
-    if 'alias' in field and field['alias']:
-        st.caption(f"Weergavenaam (Alias): {field['alias']}")
+        st.metric("Bevindingen", len(rapport["bevindingen"]))
+    if not rapport["bevindingen"]:
+        st.success("Geen kostbare patronen gevonden")
+        return
+    _toon_tabel([{"ernst": b["ernst"], "regel": b["regel"], "type": b["object_type"],
+                  "object": b["object"], "bericht": b["bericht"]} for b in rapport["bevindingen"]])
 
-def display_datasource(ds):
-    """Toon informatie over een databron"""
-    st.subheader(f"Databron: {ds.get('naam', 'Onbekend')}")
-    
-    # Toon verbindingen
-    if 'verbindingen' in ds and ds['verbindingen']:
-        with st.expander(f"🔌 {len(ds['verbindingen'])} verbinding(en)"):
-            for conn in ds['verbindingen']:
-                st.write(f"- **Type:** {conn.get('class', 'Onbekend')}")
-                if conn.get('server'):
-                    st.write(f"  - Server: `{conn['server']}`")
-                if conn.get('dbname'):
-                    st.write(f"  - Database: `{conn['dbname']}`")
-    
-    # Toon kolommen/velden
-    if 'kolommen' in ds and ds['kolommen']:
-        st.subheader("Velden")
-        for field in ds['kolommen']:
-            with st.container():
-                display_field_info(field)
-                st.markdown("---")
-
-def display_worksheet(ws):
-    """Toon informatie over een werkblad"""
-    st.subheader(f"Werkblad: {ws.get('naam', 'Onbekend')}")
-    
-    # Toon gebruikte databronnen
-    if 'gebruikte_databronnen' in ws and ws['gebruikte_databronnen']:
-        st.write("**Gebruikte databronnen:**")
-        for bron in ws['gebruikte_databronnen']:
-            st.write(f"- {bron}")
-    
-    # Toon gebruikte velden
-    if 'gebruikte_velden_direct' in ws and ws['gebruikte_velden_direct']:
-        with st.expander(f"🔍 {len(ws['gebruikte_velden_direct'])} gebruikte velden"):
-            for veld in ws['gebruikte_velden_direct']:
-                st.write(f"- {veld}")
-
-def display_dashboard(db):
-    """Toon informatie over een dashboard"""
-    st.subheader(f"Dashboard: {db.get('naam', 'Onbekend')}")
-    
-    # Toon dashboard objecten
-    if 'objecten' in db and db['objecten']:
-        st.write("**Onderdelen:**")
-        for obj in db['objecten']:
-            obj_type = obj.get('type', 'onbekend')
-            obj_name = obj.get('naam_object', 'Zonder naam')
-            st.write(f"- **{obj_type.capitalize()}:** {obj_name}")
+def _mb(aantal_bytes):
+    return round(aantal_bytes / (1024 * 1024), 1)
+
+def toon_pakket(pakket):
+    """Inhoud van een .twbx-pakket: grootte per type en de grootste bestanden."""
+    with st.expander(f"📦 Pakket: {pakket['aantal_bestanden']} bestanden, "
+                     f"{_mb(pakket['gecomprimeerd_bytes'])} MB ({_mb(pakket['ongecomprimeerd_bytes'])} MB uitgepakt)"):
+        _toon_tabel([{"type": soort, "bestanden": totaal["aantal"],
+                      "gecomprimeerd_mb": _mb(totaal["gecomprimeerd_bytes"]),
+                      "ongecomprimeerd_mb": _mb(totaal["ongecomprimeerd_bytes"])}
+                     for soort, totaal in pakket["per_type"].items()])
+        st.write("**Grootste bestanden:**")
+        _toon_tabel([{"naam": bestand["naam"], "type": bestand["type"],
+                      "gecomprimeerd_mb": _mb(bestand["gecomprimeerd_bytes"]),
+                      "ongecomprimeerd_mb": _mb(bestand["ongecomprimeerd_bytes"]),
+                      "compressie_ratio": bestand["compressie_ratio"]}
+                     for bestand in pakket["bestanden"][:PAGINA_GROOTTE]])
+
+@st.cache_resource(max_entries=ANALYSE_MAX_ENTRIES, ttl=ANALYSE_TTL_SECONDEN)
+def _download_json(sleutel, _analyse_data):
+    """De JSON voor de download, één keer gecodeerd per analyse en gedeeld door alle sessies."""
+    return json.dumps(_analyse_data, indent=4, ensure_ascii=False).encode('utf-8')
+
+def toon_json_download(analyse_handle, analyse_data):
+    """Codeert de JSON pas na een klik op 'Download voorbereiden'; daarna komt die uit de cache."""
+    sleutel = analyse_handle["sleutel"]
+    if st.session_state.get("json_download_sleutel") != sleutel:
+        if st.button("📦 Download voorbereiden", key="json_download_voorbereiden"):
+            st.session_state["json_download_sleutel"] = sleutel
+        else:
+            return
+    st.download_button(
+        label="📥 Download JSON",
+        data=_download_json(sleutel, analyse_data),
+        file_name=f"{os.path.splitext(analyse_handle['bestandsnaam'])[0]}_analyse.json",
+        mime="application/json"
+    )
+
+def _zet_json_pad(pad):
+    st.session_state["json_pad"] = pad
+    st.session_state["json_pad_tekst"] = "/" + "/".join(map(str, pad))
+    st.session_state["json_vanaf"] = 0
+
+def _json_omhoog():
+    _zet_json_pad(st.session_state["json_pad"][:-1])
+
+def _json_open():
+    kind = st.session_state.get("json_open")
+    if kind is not None:
+        _zet_json_pad(st.session_state["json_pad"] + [kind])
+    st.session_state["json_open"] = None
+
+def _json_ga_naar():
+    _zet_json_pad(parse_pad(st.session_state.get("json_pad_tekst", "")))
+
+def toon_json_voorbeeld(sleutel, analyse_data, max_items=50):
+    """
+    Navigeerbare, ingekorte weergave van het resultaat: er wordt steeds één knoop getoond,
+    één niveau diep en maximaal max_items kinderen tegelijk. Diepere knopen worden pas
+    opgezocht als de gebruiker ze opent.
+    """
+    if st.session_state.get("json_pad_analyse") != sleutel:
+        st.session_state["json_pad_analyse"] = sleutel
+        _zet_json_pad([])
+    pad = st.session_state["json_pad"]
+    try:
+        knoop = knoop_op_pad(analyse_data, pad)
+    except (KeyError, IndexError, ValueError):
+        st.warning(f"Pad niet gevonden: /{'/'.join(map(str, pad))}")
+        _zet_json_pad([])
+        pad, knoop = [], analyse_data
+
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.text_input("Pad", key="json_pad_tekst", on_change=_json_ga_naar,
+                      help="Bijv. databronnen/0/kolommen; druk op Enter om erheen te gaan")
+    with col2:
+        st.button("⬆ Omhoog", key="json_omhoog", on_click=_json_omhoog, disabled=not pad)
+
+    aantal = len(knoop) if isinstance(knoop, (dict, list)) else 0
+    vanaf = 0
+    if aantal > max_items:
+        vanaf = st.number_input(f"Vanaf item (van {aantal})", min_value=0, max_value=aantal - 1,
+                                step=max_items, key="json_vanaf")
+    st.json(voorbeeld(knoop, start=vanaf, max_items=max_items), expanded=True)
+
+    if isinstance(knoop, dict):
+        kinderen = [k for k, w in islice(knoop.items(), vanaf, vanaf + max_items) if isinstance(w, (dict, list))]
+    elif isinstance(knoop, list):
+        kinderen = [i for i in range(vanaf, min(aantal, vanaf + max_items)) if isinstance(knoop[i], (dict, list))]
+    else:
+        kinderen = []
+    if kinderen:
+        st.selectbox("Open onderdeel", [None] + kinderen, key="json_open", on_change=_json_open,
+                     format_func=lambda k: "— kies een onderdeel —" if k is None else str(k))
+
+def _foutmelding(e):
+    """Een begrijpelijke melding voor een mislukte analyse."""
+    if isinstance(e, zipfile.BadZipFile):
+        return "Het .twbx-bestand lijkt corrupt of is geen geldig zip-archief."
+    if isinstance(e, (KeyError, IndexError)):
+        return "Geen geldig .twb-bestand gevonden in het .twbx-archief."
+    if isinstance(e, ET.ParseError):
+        return "Het bestand is geen geldig Tableau XML-bestand."
+    return f"Onverwachte technische fout: {type(e).__name__}: {e}"
+
+def _overzicht_rij(handle):
+    """Eén rij van het overzicht over alle werkboeken; de aantallen komen uit de gecachte tabellen."""
+    rij = {"bestandsnaam": handle["bestandsnaam"],
+           "status": {"ok": "✅", "fout": "❌"}.get(handle["status"], "⏳"),
+           "duur_s": handle["duur_s"]}
+    analyse_data = _analyse_register().get(handle["sleutel"]) if handle["status"] == "ok" else None
+    if analyse_data is not None:
+        tabellen = _analyse_tabellen(handle["sleutel"], analyse_data)
+        velden = tabellen['velden']
+        rij.update({
+            "databronnen": len(tabellen['databronnen']),
+            "verbindingen": len(tabellen['verbindingen']),
+            "velden": len(velden),
+            "berekende_velden": int(velden['berekend'].sum()),
+            "complexe_formules": int((velden['complexiteit'] == "Complex").sum()),
+            "werkbladen": len(tabellen['werkbladen']),
+            "dashboards": len(tabellen['dashboards']),
+            "pakket_mb": _mb(analyse_data['pakket']['gecomprimeerd_bytes']) if analyse_data.get('pakket') else None,
+            "risicoscore": _lint_rapport(handle["sleutel"], analyse_data)["risicoscore"],
+        })
+    rij["fout"] = handle["fout"]
+    return rij
+
+def start_analyses(uploaded_files):
+    """
+    Start voor elke upload een AnalyseTaak op de gedeelde pool en bewaart de taken in
+    de sessie. De pagina blijft bruikbaar; volg_analyses() toont de voortgang.
+    """
+    register, schijf_cache, pool = _analyse_register(), _schijf_cache(), _analyse_pool()
+    for taak in st.session_state.get('analyse_taken') or []:
+        taak.annuleer()
+    handles, taken = [], []
+    for upload in uploaded_files:
+        # De upload wordt direct vanuit het geheugen geparsed, ook .twbx archieven
+        inhoud = upload.getvalue()
+        sleutel = bereken_sleutel(inhoud, bestandsnaam=upload.name)
+        handles.append({"sleutel": sleutel, "bestandsnaam": upload.name, "status": "bezig", "fout": None,
+                        "duur_s": None})
+        # Dezelfde upload wordt maar één keer geanalyseerd, ook als meerdere sessies hem tegelijk aanbieden
+        taken.append(AnalyseTaak(inhoud, upload.name, streaming=True, cache=schijf_cache,
+                                 register=register, sleutel=sleutel).start(pool))
+    st.session_state['analyse_handles'] = handles
+    st.session_state['analyse_taken'] = taken
+
+def _annuleer_alle():
+    for taak in st.session_state.get('analyse_taken') or []:
+        taak.annuleer()
+
+def _voortgang_tekst(voortgang):
+    """Eén regel voortgang: fase, gelezen MB en de aantallen die tot nu toe bekend zijn."""
+    if voortgang["status"] == "wachtend":
+        return f"{voortgang['bestandsnaam']}: wacht op een vrije worker"
+    delen = [f"{voortgang['bestandsnaam']}: {voortgang['fase'] or 'bezig'}",
+             f"{voortgang['gelezen_mb']:.1f} van {voortgang['totaal_mb']:.1f} MB"]
+    aantallen = dict(voortgang["elementen"])
+    for meting in voortgang["fases"]:
+        aantallen.update({k: v for k, v in meting.items() if k in ("databronnen", "kolommen", "werkbladen", "dashboards")})
+    delen += [f"{aantal} {naam}" for naam, aantal in aantallen.items()]
+    return " · ".join(delen)
+
+def volg_analyses():
+    """
+    Toont de voortgang van de lopende analyses van deze sessie, met een knop om ze te
+    annuleren, en werkt de handles bij van taken die klaar zijn. Afgeronde taken worden
+    uit de sessie verwijderd, zodat daarna alleen het register nog naar de data verwijst.
+    Returns:
+        bool: True als er nog analyses lopen (de pagina moet dan opnieuw worden getekend).
+    """
+    taken = st.session_state.get('analyse_taken')
+    if not taken:
+        return False
+    handles = st.session_state.get('analyse_handles') or []
+    lopend = [taak for taak in taken if not taak.is_gereed]
+    for taak, handle in zip(taken, handles):
+        if not taak.is_gereed or handle["status"] != "bezig":
+            continue
+        handle["duur_s"] = taak.duur_s
+        if taak.status == "klaar":
+            handle["status"] = "ok"
+        elif taak.status == "geannuleerd":
+            handle["status"] = "fout"
+            handle["fout"] = "Geannuleerd"
+        else:
+            handle["status"] = "fout"
+            handle["fout"] = _foutmelding(taak.fout)
+
+    if lopend:
+        st.subheader(f"Analyse bezig: {len(taken) - len(lopend)} van {len(taken)} bestanden klaar")
+        for i, taak in enumerate(taken):
+            if taak.is_gereed:
+                continue
+            voortgang = taak.voortgang()
+            kol_balk, kol_knop = st.columns([5, 1])
+            with kol_balk:
+                st.progress(voortgang["fractie"], text=_voortgang_tekst(voortgang))
+            with kol_knop:
+                st.button("Annuleer", key=f"annuleer_analyse_{i}", on_click=taak.annuleer)
+        if len(lopend) > 1:
+            st.button("Annuleer alles", key="annuleer_alle_analyses", on_click=_annuleer_alle)
+        return True
+
+    del st.session_state['analyse_taken']
+    for handle in handles:
+        if handle["status"] == "fout":
+            st.error(f"{handle['bestandsnaam']}: {handle['fout']}")
+    if any(handle["status"] == "ok" for handle in handles):
+        st.success("Analyse voltooid!")
+    return False
 
 def main():
     # Header section with logos and title
@@ -191,7 +605,8 @@ def main():
 
     # Original markdown for upload instruction (re-added)
     st.markdown("""
-    Upload een Tableau bestand (.twb of .twbx) om de structuur en metadata te analyseren. 
+    Upload één of meer Tableau bestanden (.twb of .twbx) om de structuur en metadata te analyseren;
+    meerdere werkboeken worden parallel geanalyseerd en in één overzicht vergeleken.
     Je kunt ook aanvullende bestanden uploaden voor extra context.
     """)
     
@@ -199,9 +614,10 @@ def main():
     tab1, tab2 = st.tabs(["Tableau Bestand", "Extra Bestanden"])
     
     with tab1:
-        st.subheader("Tableau Bestand")
-        uploaded_file = st.file_uploader("Kies een Tableau bestand (.twb of .twbx)", 
+        st.subheader("Tableau Bestanden")
+        uploaded_files = st.file_uploader("Kies één of meer Tableau bestanden (.twb of .twbx)",
                                      type=['twb', 'twbx'],
+                                     accept_multiple_files=True,
                                      key="tableau_uploader_1")
     
     with tab2:
@@ -243,95 +659,40 @@ def main():
                 for file in csv_files:
                     st.write(f"- {file.name} ({file.size/1024:.1f} KB)")
     
-    if uploaded_file is not None:
+    if uploaded_files:
         # Toon bestandsinformatie in de sidebar
         with st.sidebar:
             st.subheader("Bestandsinformatie")
-            st.write(f"**Naam:** {uploaded_file.name}")
-            st.write(f"**Grootte:** {uploaded_file.size / 1024:.2f} KB")
+            if len(uploaded_files) == 1:
+                st.write(f"**Naam:** {uploaded_files[0].name}")
+            else:
+                st.write(f"**Bestanden:** {len(uploaded_files)}")
+            st.write(f"**Grootte:** {sum(f.size for f in uploaded_files) / 1024:.2f} KB")
         
         # Analyseer knop
-        if st.button("Analyseer bestand", type="primary", key="analyze_btn"):
-            # Tijdelijke map aanmaken
-            temp_dir = "temp_upload"
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_file = os.path.join(temp_dir, uploaded_file.name)
-            
-            # Bestand tijdelijk opslaan
-            with open(temp_file, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            # Analyse uitvoeren
-            with st.spinner("Bezig met analyseren... Dit kan even duren voor grote bestanden."):
-                analysis_path = temp_file
-                temp_dir_for_twbx_extraction = None # Voor opruimen
-                try:
-                    if uploaded_file.name.lower().endswith('.twbx'):
-                        st.info("Het is een .twbx bestand, bezig met uitpakken...")
-                        # Maak een unieke submap voor extractie binnen temp_dir
-                        # Dit voorkomt conflicten als bestandsnamen in zip hetzelfde zijn als de zip zelf.
-                        timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-                        temp_dir_for_twbx_extraction = os.path.join(temp_dir, f"extracted_{timestamp}")
-                        os.makedirs(temp_dir_for_twbx_extraction, exist_ok=True)
-                        
-                        # extraheer_twb_uit_twbx is nu onderdeel van tableau_analyzer en logt zelf
-                        # en raised exceptions bij fouten.
-                        analysis_path = extraheer_twb_uit_twbx(temp_file, temp_dir_for_twbx_extraction)
-                        if not analysis_path: 
-                            # Dit zou niet moeten gebeuren als extraheer_twb_uit_twbx een exception raised.
-                            # Maar als het None retourneert zonder exception:
-                            st.error("Kon het .twb-bestand niet uit het .twbx-archief extraheren. Het archief is mogelijk leeg of beschadigd.")
-                            # Clear session state to prevent showing old data
-                            if 'analyse_data' in st.session_state:
-                                del st.session_state['analyse_data']
-                            return # Stop verdere verwerking
-
-                    # Analyseer het .twb bestand (of het geëxtraheerde .twb bestand)
-                    analyse_data = analyseer_tableau_bestand(analysis_path) 
-                    
-                    # analyseer_tableau_bestand raised exceptions bij fouten, dus als we hier komen is het succesvol
-                    st.session_state['analyse_data'] = analyse_data
-                    st.session_state['bestandsnaam'] = uploaded_file.name # Originele bestandsnaam
-                    st.success("Analyse voltooid!")
-
-                except FileNotFoundError:
-                    st.error(f"Bestand niet gevonden: {temp_file}. Dit zou niet moeten gebeuren na een succesvolle upload.")
-                except zipfile.BadZipFile:
-                    st.error("Fout bij het verwerken van het .twbx-bestand: Het bestand lijkt corrupt of is geen geldig zip-archief.")
-                except (KeyError, IndexError): # Gevangen als .twb niet in .twbx zit
-                    st.error("Kon geen geldig .twb-bestand vinden in het geüploade .twbx-archief. Controleer de inhoud van het bestand.")
-                except ET.ParseError: # Specifiek voor XML parse fouten
-                    st.error("Fout bij het parsen van het Tableau-bestand. Controleer of het een geldig .twb XML-bestand is (of correct is geëxtraheerd uit .twbx).")
-                except Exception as e: # Vang alle andere exceptions van de analyzer
-                    st.error(f"Er is een onverwachte technische fout opgetreden tijdens de analyse.")
-                    # Optioneel: toon meer details in een expander voor technische gebruikers
-                    with st.expander("Technische details van de fout (voor ontwikkelaars)"):
-                        st.text(f"Fouttype: {type(e).__name__}")
-                        st.text(f"Foutmelding: {str(e)}")
-                    # Clear session state om te voorkomen dat oude data wordt getoond bij een nieuwe fout
-                    if 'analyse_data' in st.session_state:
-                        del st.session_state['analyse_data']
-                finally:
-                    # Tijdelijk origineel geüpload bestand verwijderen
-                    if os.path.exists(temp_file):
-                        try:
-                            os.remove(temp_file)
-                        except Exception as e_rem_orig:
-                            # Loggen naar console/server log, niet per se naar UI
-                            print(f"Waarschuwing: kon tijdelijk geüpload bestand {temp_file} niet verwijderen: {e_rem_orig}")
-                    
-                    # Tijdelijke extractiemap verwijderen indien aangemaakt
-                    if temp_dir_for_twbx_extraction and os.path.exists(temp_dir_for_twbx_extraction):
-                        try:
-                            # shutil.rmtree is nodig voor mappen
-                            import shutil
-                            shutil.rmtree(temp_dir_for_twbx_extraction)
-                        except Exception as e_rem_extr:
-                            print(f"Waarschuwing: kon tijdelijke extractiemap {temp_dir_for_twbx_extraction} niet verwijderen: {e_rem_extr}")
-        
-        # Toon analyse-resultaten als die er zijn
-        if 'analyse_data' in st.session_state and st.session_state['analyse_data']:
-            analyse_data = st.session_state['analyse_data']
+        label = "Analyseer bestand" if len(uploaded_files) == 1 else f"Analyseer {len(uploaded_files)} bestanden"
+        if st.button(label, type="primary", key="analyze_btn"):
+            start_analyses(uploaded_files)
+        # De analyses lopen op de achtergrond; deze run toont alleen hun voortgang
+        analyses_lopen = volg_analyses()
+
+        analyse_handles = st.session_state.get('analyse_handles') or []
+        if len(analyse_handles) > 1:
+            st.subheader("Overzicht van alle werkboeken")
+            _toon_tabel([_overzicht_rij(h) for h in analyse_handles])
+
+        # Toon analyse-resultaten van het gekozen werkboek
+        geslaagd = [h for h in analyse_handles if h["status"] == "ok"]
+        analyse_handle = geslaagd[0] if geslaagd else None
+        if len(geslaagd) > 1:
+            keuze = st.selectbox("Werkboek", range(len(geslaagd)), key="analyse_keuze",
+                                 format_func=lambda i: geslaagd[i]["bestandsnaam"])
+            analyse_handle = geslaagd[min(keuze, len(geslaagd) - 1)]
+        analyse_data = _analyse_register().get(analyse_handle["sleutel"]) if analyse_handle else None
+        if analyse_handle and analyse_data is None:
+            st.info("De analyse is niet meer in het geheugen beschikbaar. Klik opnieuw op 'Analyseer bestand'.")
+
+        if analyse_data:
             
             # Samenvatting sectie
             st.subheader("Samenvatting")
@@ -343,137 +704,52 @@ def main():
                 st.metric("Dashboards", len(analyse_data.get('dashboards', [])))
             with col3:
                 st.metric("Databronnen", len(analyse_data.get('databronnen', [])))
+            if analyse_data.get('pakket'):
+                toon_pakket(analyse_data['pakket'])
             
             # Tabbladen voor verschillende secties
-            tab_ds, tab_ws, tab_db = st.tabs(["🔌 Databronnen", "📊 Werkbladen", "📋 Dashboards"])
+            tab_ds, tab_ws, tab_db, tab_pr = st.tabs(["🔌 Databronnen", "📊 Werkbladen", "📋 Dashboards",
+                                                       "⚡ Prestaties"])
             
+            # De tabellen worden één keer per analyse gebouwd; elke rerun toont alleen de huidige pagina
+            tabellen = _analyse_tabellen(analyse_handle["sleutel"], analyse_data)
+
             with tab_ds:
                 st.subheader("Databronnen")
-                databronnen = analyse_data.get('databronnen', [])
-                if databronnen:
-                    for bron in databronnen:
-                        display_datasource(bron)
-                else:
-                    st.info("Geen databronnen gevonden")
-            
+                toon_databronnen(tabellen, analyse_data)
+
             with tab_ws:
                 st.subheader("Werkbladen")
-                werkbladen = analyse_data.get('werkbladen', [])
-                if werkbladen:
-                    for ws in werkbladen:
-                        display_worksheet(ws)
-                else:
-                    st.info("Geen werkbladen gevonden")
-            
+                toon_werkbladen(tabellen, analyse_data)
+
             with tab_db:
                 st.subheader("Dashboards")
-                dashboards = analyse_data.get('dashboards', [])
-                if dashboards:
-                    for db in dashboards:
-                        display_dashboard(db)
-                else:
-                    st.info("Geen dashboards gevonden")
-            
-            # JSON downloaden
+                toon_dashboards(tabellen, analyse_data)
+
+            with tab_pr:
+                st.subheader("Prestaties")
+                toon_prestaties(_lint_rapport(analyse_handle["sleutel"], analyse_data))
+
+            # JSON downloaden en bekijken; beide kosten pas iets als de gebruiker erom vraagt
             st.subheader("Volledige gegevens")
-            json_data = json.dumps(analyse_data, indent=4, ensure_ascii=False)
-            st.download_button(
-                label="📥 Download JSON",
-                data=json_data,
-                file_name=f"{os.path.splitext(st.session_state['bestandsnaam'])[0]}_analyse.json",
-                mime="application/json"
-            )
-            
-            # Toon een voorbeeld van de JSON (ingekort)
-            with st.expander("🔍 Bekijk een voorbeeld van de JSON"):
-                st.json(json.loads(json_data))
+            toon_json_download(analyse_handle, analyse_data)
+            if st.checkbox("🔍 Bekijk de JSON", key="json_voorbeeld_tonen"):
+                toon_json_voorbeeld(analyse_handle["sleutel"], analyse_data)
     
     # Voettekst
     st.markdown("---")
     st.caption("Tableau Analyzer - Gemaakt met Streamlit")
 
-# De display_datasource, display_worksheet, display_dashboard functies zijn hieronder
-# ongewijzigd gebleven, maar voor de duidelijkheid van de diff hier ingekort.
-# Zorg ervoor dat ze in de uiteindelijke code aanwezig zijn.
-
-def display_datasource(bron):
-    """Toon details van een databron"""
-    with st.expander(f"🔌 {bron.get('naam', 'Onbekende bron')}"):
-        # Algemene informatie
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Aantal verbindingen", len(bron.get('verbindingen', [])))
-        with col2:
-            st.metric("Aantal kolommen", len(bron.get('kolommen', [])))
-        
-        # Toon verbindingen
-        if 'verbindingen' in bron and bron['verbindingen']:
-            st.subheader("Verbindingen")
-            verbindingen = []
-            for v in bron['verbindingen']:
-                verbindingen.append({
-                    'type': v.get('class', 'Onbekend'),
-                    'server': v.get('server', 'Onbekend'),
-                    'database': v.get('dbname', 'Onbekend')
-                })
-            st.dataframe(pd.DataFrame(verbindingen))
-        
-        # Toon kolommen
-        if 'kolommen' in bron and bron['kolommen']:
-            st.subheader("Kolommen")
-            kolommen = []
-            for k in bron['kolommen']:
-                kolommen.append({
-                    'naam': k.get('naam', 'Onbekend'),
-                    'type': k.get('datatype', 'Onbekend'),
-                    'rol': k.get('role', 'Onbekend')
-                })
-            st.dataframe(pd.DataFrame(kolommen))
-
-def display_worksheet(ws):
-    """Toon details van een werkblad"""
-    with st.expander(f"📊 {ws.get('naam', 'Onbekend werkblad')}"):
-        # Algemene informatie
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Aantal gebruikte databronnen", len(ws.get('gebruikte_databronnen', [])))
-        with col2:
-            st.metric("Aantal berekende velden", len(ws.get('berekende_velden', [])))
-        
-        # Toon gebruikte databronnen
-        if 'gebruikte_databronnen' in ws and ws['gebruikte_databronnen']:
-            st.subheader("Gebruikte databronnen")
-            st.write(", ".join(ws['gebruikte_databronnen']))
-        
-        # Toon berekende velden
-        if 'berekende_velden' in ws and ws['berekende_velden']:
-            st.subheader("Berekende velden")
-            velden = []
-            for v in ws['berekende_velden']:
-                velden.append({
-                    'naam': v.get('naam', 'Onbekend'),
-                    'formule': v.get('formule', 'Geen formule')
-                })
-            st.dataframe(pd.DataFrame(velden))
-
-def display_dashboard(db):
-    """Toon details van een dashboard"""
-    with st.expander(f"📋 {db.get('naam', 'Onbekend dashboard')}"):
-        # Algemene informatie
-        st.metric("Aantal objecten", len(db.get('objecten', [])))
-        
-        # Toon objecten
-        if 'objecten' in db and db['objecten']:
-            st.subheader("Objecten")
-            objecten = []
-            for obj in db['objecten']:
-                objecten.append({
-                    'type': obj.get('type', 'Onbekend'),
-                    'naam': obj.get('naam', 'Naamloos'),
-                    'grootte': f"{obj.get('breedte', 0)}x{obj.get('hoogte', 0)}"
-                })
-            st.dataframe(pd.DataFrame(objecten))
+    if uploaded_files and analyses_lopen:
+        # Peil de voortgang opnieuw; een klik op 'Annuleer' wordt bij de volgende run verwerkt
+        time.sleep(VOORTGANG_INTERVAL_SECONDEN)
+        st.rerun()
 
-if __name__ == "__main__":
+def start_app():
+    """Start de volledige Streamlit UI: pagina configuratie, CSS en de app zelf."""
+    configureer_pagina() # Moet de eerste Streamlit-call zijn
     load_custom_css() # Laad CSS voordat de rest van de app wordt getekend
-    main() 
\ No newline at end of file
+    main()
+
+if __name__ == "__main__":
+    start_app() 
\ No newline at end of file
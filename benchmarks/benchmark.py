@@ -0,0 +1,270 @@
+"""
+Benchmark harness voor de Tableau analyzer.
+
+Genereert synthetische werkboeken (zie genereer_werkboek) en meet per schaal de
+wandtijd en het piekgeheugen van de belangrijkste stappen. Elke meting draait in
+een eigen proces, zodat het piekgeheugen (ru_maxrss) niet door eerdere metingen
+wordt vertekend en ook de allocaties van libxml2 meetellen.
+
+Gebruik:
+    # Baseline vastleggen
+    python benchmarks/benchmark.py --schaal klein middel --sla-baseline-op
+
+    # Vergelijken met de baseline; exitcode 1 bij een regressie boven de drempel,
+    # exitcode 2 als de baseline ontbreekt (tenzij --zonder-baseline-toestaan)
+    python benchmarks/benchmark.py --schaal klein middel --drempel 0.25
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from genereer_werkboek import SCHALEN, genereer_werkboek
+
+STANDAARD_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# Verschillen kleiner dan dit tellen nooit als regressie (meetruis bij zeer korte metingen)
+MIN_VERSCHIL_S = 0.005
+MIN_VERSCHIL_MB = 2.0
+
+
+def _formules(project_data):
+    return [col["formule"] for ds in project_data["databronnen"]
+            for col in ds["kolommen"] if col.get("formule")]
+
+
+def _bench_analyse_boom(bestanden):
+    from tableau_analyzer import analyseer_tableau_bestand
+    return lambda: analyseer_tableau_bestand(bestanden["twb"])
+
+
+def _bench_analyse_streaming(bestanden):
+    from tableau_analyzer import analyseer_tableau_bestand
+    return lambda: analyseer_tableau_bestand(bestanden["twb"], streaming=True)
+
+
+def _bench_twbx(bestanden):
+    from tableau_analyzer import analyze_stream
+    return lambda: analyze_stream(bestanden["twbx"], streaming=True)
+
+
+def _bench_afhankelijkheden(bestanden):
+    from tableau_analyzer import VeldIndex, analyseer_tableau_bestand, extract_field_dependencies
+    from tableau_formule import wis_formule_cache
+    project_data = analyseer_tableau_bestand(bestanden["twb"], streaming=True)
+    index = VeldIndex.uit_databronnen(project_data["databronnen"])
+    formules = _formules(project_data)
+
+    def _run():
+        wis_formule_cache() # Meet het koude pad, niet de formule-cache
+        for formule in formules:
+            extract_field_dependencies(formule, index)
+    return _run
+
+
+def _bench_complexiteit(bestanden):
+    from tableau_analyzer import analyseer_tableau_bestand, score_complexity
+    from tableau_formule import wis_formule_cache
+    formules = _formules(analyseer_tableau_bestand(bestanden["twb"], streaming=True))
+
+    def _run():
+        wis_formule_cache()
+        for formule in formules:
+            score_complexity(formule)
+    return _run
+
+
+def _bench_json(bestanden):
+    from tableau_analyzer import analyseer_tableau_bestand, sla_op_als_json
+    project_data = analyseer_tableau_bestand(bestanden["twb"], streaming=True)
+    uitvoer = os.path.join(os.path.dirname(bestanden["twb"]), "uitvoer_analyse.json")
+    return lambda: sla_op_als_json(project_data, uitvoer)
+
+
+# Naam -> functie die (in het meetproces) de voorbereiding doet en de te meten callable retourneert
+BENCHMARKS = {
+    "analyse_boom": _bench_analyse_boom,
+    "analyse_streaming": _bench_analyse_streaming,
+    "twbx_analyse": _bench_twbx,
+    "afhankelijkheden": _bench_afhankelijkheden,
+    "complexiteit": _bench_complexiteit,
+    "json_opslaan": _bench_json,
+}
+
+
+def _meet_in_proces(naam, bestanden, herhalingen, wachtrij):
+    """Draait in een apart proces: voorbereiden, meten en het resultaat via de wachtrij teruggeven."""
+    import logging
+    logging.disable(logging.CRITICAL)
+    try:
+        import resource
+        uitvoeren = BENCHMARKS[naam](bestanden)
+        # ru_maxrss is een hoogwatermerk; het verschil met de stand na de voorbereiding is de piek van de meting
+        rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tijden = []
+        for _ in range(herhalingen):
+            start = time.perf_counter()
+            uitvoeren()
+            tijden.append(time.perf_counter() - start)
+        rss_piek = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux rapporteert KB, macOS bytes
+        deler = 1024 * 1024 if sys.platform == "darwin" else 1024
+        wachtrij.put({
+            "tijd_s": round(min(tijden), 4),
+            "tijd_mediaan_s": round(sorted(tijden)[len(tijden) // 2], 4),
+            "piek_geheugen_mb": round((rss_piek - rss_start) / deler, 1),
+        })
+    except Exception as e:
+        wachtrij.put({"fout": f"{type(e).__name__}: {e}"})
+
+
+def meet(naam, bestanden, herhalingen=3, poll_seconden=1.0):
+    """
+    Meet één benchmark in een vers proces.
+    Stopt het proces zonder resultaat (bijv. OOM-kill of segfault), dan is de meting een `fout`.
+    """
+    context = multiprocessing.get_context("spawn")
+    wachtrij = context.Queue()
+    proces = context.Process(target=_meet_in_proces, args=(naam, bestanden, herhalingen, wachtrij))
+    proces.start()
+    try:
+        while True:
+            try:
+                return wachtrij.get(timeout=poll_seconden)
+            except queue.Empty:
+                if proces.is_alive():
+                    continue
+            # Het proces is gestopt; een resultaat dat het vlak daarvoor schreef kan nog onderweg zijn
+            try:
+                return wachtrij.get(timeout=poll_seconden)
+            except queue.Empty:
+                proces.join()
+                return {"fout": f"Meetproces gestopt zonder resultaat (exitcode {proces.exitcode})"}
+    finally:
+        proces.join()
+
+
+def draai_benchmarks(schalen, herhalingen=3, benchmarks=None, werk_map=None):
+    """
+    Genereert per schaal een werkboek en draait de benchmarks.
+    Returns:
+        dict: {"meta": {...}, "resultaten": {schaal: {benchmark: meting}}}
+    """
+    from tableau_analyzer import ANALYZER_VERSIE
+    benchmarks = benchmarks or list(BENCHMARKS)
+    eigen_map = werk_map is None
+    werk_map = werk_map or tempfile.mkdtemp(prefix="tableau_benchmark_")
+    resultaten = {}
+    try:
+        for schaal in schalen:
+            twb = os.path.join(werk_map, f"{schaal}.twb")
+            twbx = genereer_werkboek(twb, twbx=True, **SCHALEN[schaal])
+            bestanden = {"twb": twb, "twbx": twbx}
+            resultaten[schaal] = {}
+            for naam in benchmarks:
+                meting = meet(naam, bestanden, herhalingen)
+                resultaten[schaal][naam] = meting
+                print(f"{schaal:>8} {naam:<20} " + (meting.get("fout") or
+                      f"{meting['tijd_s']:>9.4f}s {meting['piek_geheugen_mb']:>8.1f} MB"), flush=True)
+    finally:
+        if eigen_map:
+            shutil.rmtree(werk_map, ignore_errors=True)
+    return {
+        "meta": {
+            "analyzer_versie": ANALYZER_VERSIE,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "herhalingen": herhalingen,
+            "datum": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "resultaten": resultaten,
+    }
+
+
+def vergelijk_met_baseline(huidig, baseline, drempel=0.2):
+    """
+    Vergelijkt metingen met een baseline.
+    Args:
+        huidig (dict): Uitvoer van draai_benchmarks.
+        baseline (dict): Eerder opgeslagen uitvoer van draai_benchmarks.
+        drempel (float): Toegestane relatieve verslechtering, bijv. 0.2 voor 20%.
+    Returns:
+        list[str]: Beschrijvingen van de regressies; leeg als alles binnen de drempel valt.
+    """
+    regressies = []
+    for schaal, metingen in huidig["resultaten"].items():
+        for naam, meting in metingen.items():
+            basis = baseline.get("resultaten", {}).get(schaal, {}).get(naam)
+            if basis is None or "fout" in basis:
+                continue
+            if "fout" in meting:
+                regressies.append(f"{schaal}/{naam}: {meting['fout']}")
+                continue
+            for sleutel, eenheid, minimum in (("tijd_s", "s", MIN_VERSCHIL_S),
+                                              ("piek_geheugen_mb", " MB", MIN_VERSCHIL_MB)):
+                oud, nieuw = basis[sleutel], meting[sleutel]
+                if nieuw - oud > minimum and nieuw > oud * (1 + drempel):
+                    regressies.append(f"{schaal}/{naam}: {sleutel} {oud}{eenheid} -> {nieuw}{eenheid} "
+                                      f"(+{(nieuw / oud - 1) * 100 if oud else float('inf'):.0f}%)")
+    return regressies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de Tableau analyzer op synthetische werkboeken.")
+    parser.add_argument("--schaal", nargs="+", choices=list(SCHALEN), default=["klein", "middel"],
+                        help="Schalen om te meten (standaard: klein middel)")
+    parser.add_argument("--benchmark", nargs="+", choices=list(BENCHMARKS), default=None,
+                        help="Alleen deze benchmarks draaien")
+    parser.add_argument("--herhalingen", type=int, default=3)
+    parser.add_argument("--baseline", default=STANDAARD_BASELINE, help="Pad van het baseline-bestand")
+    parser.add_argument("--sla-baseline-op", dest="sla_baseline_op", action="store_true",
+                        help="Schrijf de metingen als nieuwe baseline in plaats van te vergelijken")
+    parser.add_argument("--drempel", type=float, default=0.2,
+                        help="Toegestane verslechtering ten opzichte van de baseline (standaard: 0.2 = 20%%)")
+    parser.add_argument("--zonder-baseline-toestaan", dest="zonder_baseline_toestaan", action="store_true",
+                        help="Geen fout als het baseline-bestand ontbreekt (alleen meten)")
+    parser.add_argument("--uitvoer", default=None, help="Schrijf de metingen ook als JSON naar dit pad")
+    args = parser.parse_args(argv)
+
+    huidig = draai_benchmarks(args.schaal, herhalingen=args.herhalingen, benchmarks=args.benchmark)
+    if args.uitvoer:
+        with open(args.uitvoer, 'w', encoding='utf-8') as f:
+            json.dump(huidig, f, indent=2)
+
+    if args.sla_baseline_op:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(huidig, f, indent=2)
+        print(f"Baseline opgeslagen in {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Geen baseline gevonden in {args.baseline}; gebruik --sla-baseline-op om er een vast te leggen.")
+        return 0 if args.zonder_baseline_toestaan else 2
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    basis_meta = baseline.get("meta", {})
+    for sleutel in ("platform", "python", "herhalingen"):
+        if basis_meta.get(sleutel) != huidig["meta"][sleutel]:
+            print(f"Let op: baseline gemeten met {sleutel}={basis_meta.get(sleutel)}, nu {huidig['meta'][sleutel]}; "
+                  f"tijden zijn mogelijk niet vergelijkbaar.")
+    regressies = vergelijk_met_baseline(huidig, baseline, args.drempel)
+    if regressies:
+        print(f"{len(regressies)} regressie(s) ten opzichte van de baseline (drempel {args.drempel:.0%}):")
+        for regel in regressies:
+            print(f"  - {regel}")
+        return 1
+    print(f"Geen regressies ten opzichte van de baseline (drempel {args.drempel:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
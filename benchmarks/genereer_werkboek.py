@@ -0,0 +1,162 @@
+"""
+Generator van synthetische Tableau werkboeken voor benchmarks.
+
+Bouwt een .twb (en optioneel .twbx) met een gekozen aantal databronnen, kolommen,
+berekende velden, werkbladen en dashboards. Het XML wordt regel voor regel
+geschreven, zodat ook werkboeken van honderden MB zonder veel geheugen ontstaan.
+Met dezelfde seed is de uitvoer byte-voor-byte gelijk.
+
+Gebruik:
+    python benchmarks/genereer_werkboek.py uit.twb --databronnen 5 --kolommen 200 \\
+        --berekende-velden 1000 --formule-diepte 4 --werkbladen 50 --dashboards 10 --twbx
+"""
+import argparse
+import os
+import random
+import zipfile
+from xml.sax.saxutils import quoteattr
+
+# Sjablonen waarmee een formule per diepteniveau wordt ingepakt (str.format: {x} is de binnenste expressie)
+_FORMULE_SJABLONEN = (
+    "SUM({x})",
+    "ZN({x})",
+    "ROUND({x}, 2)",
+    "IIF({x} > 0, 1, 0)",
+    "({x} + [{kolom}])",
+    "IF {x} > 100 THEN 'Hoog' ELSE 'Laag' END",
+    "{{FIXED [{kolom}] : SUM({x})}}",
+    "WINDOW_SUM(SUM({x}))",
+    "DATEDIFF('day', {x}, TODAY())",
+)
+
+# Voorgedefinieerde schalen voor de benchmark harness
+SCHALEN = {
+    "klein": dict(databronnen=2, kolommen=50, berekende_velden=50, formule_diepte=3,
+                  werkbladen=10, dashboards=2),
+    "middel": dict(databronnen=5, kolommen=200, berekende_velden=500, formule_diepte=4,
+                   werkbladen=50, dashboards=10),
+    "groot": dict(databronnen=20, kolommen=500, berekende_velden=5000, formule_diepte=5,
+                  werkbladen=300, dashboards=50),
+}
+
+
+def _genereer_formule(rng, kolommen, eerdere_velden, diepte):
+    """Bouwt een formule van `diepte` geneste niveaus rond een kolom of een eerder berekend veld."""
+    if eerdere_velden and rng.random() < 0.5:
+        formule = f"[{rng.choice(eerdere_velden)}]"
+    else:
+        formule = f"[{rng.choice(kolommen)}]"
+    for _ in range(diepte):
+        formule = rng.choice(_FORMULE_SJABLONEN).format(x=formule, kolom=rng.choice(kolommen))
+    return formule
+
+
+def genereer_werkboek(pad, databronnen=2, kolommen=50, berekende_velden=50, formule_diepte=3,
+                      werkbladen=10, dashboards=2, twbx=False, seed=0):
+    """
+    Schrijft een synthetisch werkboek.
+    Args:
+        pad (str): Doelpad van het .twb-bestand.
+        databronnen (int): Aantal databronnen.
+        kolommen (int): Aantal gewone kolommen per databron.
+        berekende_velden (int): Totaal aantal berekende velden, verdeeld over de databronnen.
+            Ongeveer de helft verwijst naar een eerder berekend veld, zodat er
+            afhankelijkheidsketens ontstaan.
+        formule_diepte (int): Aantal geneste niveaus per formule.
+        werkbladen (int): Aantal werkbladen.
+        dashboards (int): Aantal dashboards; elk dashboard toont een paar werkbladen.
+        twbx (bool): Maak daarnaast een .twbx-archief met het werkboek en een dummy-extract.
+        seed (int): Seed voor de toevalsgenerator.
+    Returns:
+        str: Het pad van het .twbx-archief als twbx=True, anders dat van het .twb-bestand.
+    """
+    rng = random.Random(seed)
+    ds_namen = [f"federated.ds{d:04d}" for d in range(databronnen)]
+    kolom_namen = [f"Kolom {k}" for k in range(kolommen)]
+    werkblad_namen = [f"Werkblad {w}" for w in range(werkbladen)]
+
+    with open(pad, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='utf-8' ?>\n")
+        f.write("<workbook xmlns:user='http://www.tableausoftware.com/xml/user' version='18.1'>\n")
+        f.write("  <datasources>\n")
+        for d, ds_naam in enumerate(ds_namen):
+            f.write(f"    <datasource name={quoteattr(ds_naam)} caption={quoteattr(f'Databron {d}')} version='18.1'>\n")
+            f.write(f"      <connection class='federated'>\n"
+                    f"        <named-connections><named-connection name='c{d}'>"
+                    f"<connection class='postgres' dbname='db{d}' server='server{d % 3}' username='gebruiker'/>"
+                    f"</named-connection></named-connections>\n"
+                    f"      </connection>\n")
+            for kolom in kolom_namen:
+                rol = 'measure' if rng.random() < 0.4 else 'dimension'
+                datatype = 'real' if rol == 'measure' else 'string'
+                f.write(f"      <column name={quoteattr(f'[{kolom}]')} caption={quoteattr(kolom)} "
+                        f"datatype='{datatype}' role='{rol}' type='nominal'/>\n")
+            eerdere_velden = []
+            aantal = berekende_velden // databronnen + (1 if d < berekende_velden % databronnen else 0)
+            for b in range(aantal):
+                naam = f"Berekening {d}_{b}"
+                formule = _genereer_formule(rng, kolom_namen, eerdere_velden, formule_diepte)
+                f.write(f"      <column name={quoteattr(f'[{naam}]')} caption={quoteattr(naam)} "
+                        f"datatype='real' role='measure' type='quantitative'>\n"
+                        f"        <calculation class='tableau' formula={quoteattr(formule)}/>\n"
+                        f"      </column>\n")
+                eerdere_velden.append(naam)
+            f.write("    </datasource>\n")
+        f.write("  </datasources>\n")
+
+        f.write("  <worksheets>\n")
+        for werkblad in werkblad_namen:
+            ds_naam = rng.choice(ds_namen)
+            f.write(f"    <worksheet name={quoteattr(werkblad)}>\n"
+                    f"      <table><view>\n"
+                    f"        <datasources><datasource name={quoteattr(ds_naam)}/></datasources>\n"
+                    f"        <datasource-dependencies datasource={quoteattr(ds_naam)}>\n")
+            for kolom in rng.sample(kolom_namen, min(5, len(kolom_namen))):
+                f.write(f"          <column name={quoteattr(f'[{kolom}]')} datatype='string' role='dimension'/>\n")
+            f.write("        </datasource-dependencies>\n"
+                    "      </view></table>\n"
+                    "    </worksheet>\n")
+        f.write("  </worksheets>\n")
+
+        f.write("  <dashboards>\n")
+        for n in range(dashboards):
+            f.write(f"    <dashboard name={quoteattr(f'Dashboard {n}')}>\n      <zones>\n")
+            getoond = rng.sample(werkblad_namen, min(4, len(werkblad_namen)))
+            for z, werkblad in enumerate(getoond):
+                f.write(f"        <zone id='{z + 1}' name={quoteattr(werkblad)} type-v2='viz'/>\n")
+            f.write(f"        <zone id='{len(getoond) + 1}' type-v2='text'/>\n")
+            f.write("      </zones>\n    </dashboard>\n")
+        f.write("  </dashboards>\n")
+        f.write("</workbook>\n")
+
+    if not twbx:
+        return pad
+    twbx_pad = os.path.splitext(pad)[0] + ".twbx"
+    with zipfile.ZipFile(twbx_pad, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.write(pad, os.path.basename(pad))
+        zf.writestr("Data/Extracts/extract.hyper", rng.randbytes(64 * 1024))
+    return twbx_pad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genereer een synthetisch Tableau werkboek.")
+    parser.add_argument("pad", help="Doelpad van het .twb-bestand")
+    parser.add_argument("--schaal", choices=sorted(SCHALEN), default=None,
+                        help="Voorgedefinieerde schaal; losse opties overschrijven deze")
+    for optie in ("databronnen", "kolommen", "berekende-velden", "formule-diepte", "werkbladen", "dashboards"):
+        parser.add_argument(f"--{optie}", type=int, default=None)
+    parser.add_argument("--twbx", action="store_true", help="Maak ook een .twbx-archief")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    opties = dict(SCHALEN[args.schaal or "klein"])
+    for sleutel in opties:
+        waarde = getattr(args, sleutel)
+        if waarde is not None:
+            opties[sleutel] = waarde
+    print(genereer_werkboek(args.pad, twbx=args.twbx, seed=args.seed, **opties))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
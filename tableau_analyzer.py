@@ -1,22 +1,22 @@
 from lxml import etree as ET
 import zipfile
-import json
+import io
 import os
 import shutil
 import sys
+import threading
 from datetime import datetime
 import logging
 
-# Logging setup
+from tableau_diff import bereken_structuur_hashes, entiteiten_op_naam, vergelijk_versies
+from tableau_formule import analyseer_formule, formule_metrieken, score_formules
+from tableau_graaf import AfhankelijkheidsGraaf
+from tableau_json import analyse_json_schrijver, laad_analyse_json, schrijf_analyse_json
+from tableau_profiel import GEEN_METER, maak_meter, profileer
+from tableau_sql import sql_fingerprint
+
+# Geen handlers of niveaus bij het importeren: de CLI (main) en andere entrypoints configureren logging zelf
 logger = logging.getLogger(__name__)
-# Configure logger (do this once, preferably at application entry point or module import)
-# For now, basic configuration. This could be moved to main() or a dedicated setup function.
-if not logger.handlers: # Avoid adding multiple handlers if the module is reloaded
-    handler = logging.StreamHandler(sys.stderr)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO) # Default level, can be changed as needed
 
 # Fallback voor __file__ in geval van directe uitvoering of interactieve sessies
 try:
@@ -24,96 +24,265 @@ try:
 except NameError:
     SCRIPT_DIR = os.getcwd()
 
-# Constanten voor namespaces
+# Versie van het analyseresultaat; verhoog bij elke wijziging die de uitvoer beïnvloedt,
+# zodat gecachte resultaten van een oudere versie niet meer worden gebruikt.
+ANALYZER_VERSIE = "1.11.0"
+
+# Standaard namespaces voor XPath-expressies; alleen-lezen, een Analyzer maakt er een eigen kopie van
 NAMESPACES = {
     'user': 'http://www.tableausoftware.com/xml/user',
     # Voeg hier eventueel andere vaak gebruikte namespaces toe
 }
 
+class Analyzer:
+    """
+    Analysecontext met eigen namespaces, parserconfiguratie en gecompileerde XPath-expressies.
+
+    Eén instantie kan door meerdere threads tegelijk worden gebruikt, bijvoorbeeld in een
+    ThreadPoolExecutor binnen de Streamlit server: de configuratie is na het aanmaken
+    alleen-lezen, en lxml-parsers en XPath-objecten (die niet thread-safe zijn) worden per
+    thread aangemaakt en hergebruikt. Een analyse wijzigt geen globale state; de
+    namespaces van een werkboek horen alleen bij die ene analyse.
+    """
+
+    def __init__(self, namespaces=None, huge_tree=True):
+        """
+        Args:
+            namespaces (dict): Extra prefix -> URI paren voor XPath-expressies, bovenop NAMESPACES.
+            huge_tree (bool): Sta zeer diepe of grote documenten en tekstknopen toe (lxml huge_tree).
+        """
+        self.namespaces = dict(NAMESPACES, **(namespaces or {}))
+        self.huge_tree = huge_tree
+        self._lokaal = threading.local()
+
+    def parser(self):
+        """De XML-parser van de huidige thread."""
+        parser = getattr(self._lokaal, "parser", None)
+        if parser is None:
+            parser = self._lokaal.parser = ET.XMLParser(huge_tree=self.huge_tree)
+        return parser
+
+    def xpath(self, expressie):
+        """De gecompileerde XPath-expressie voor de huidige thread, met de namespaces van deze Analyzer."""
+        gecompileerd = getattr(self._lokaal, "xpaths", None)
+        if gecompileerd is None:
+            gecompileerd = self._lokaal.xpaths = {}
+        xpath = gecompileerd.get(expressie)
+        if xpath is None:
+            xpath = gecompileerd[expressie] = ET.XPath(expressie, namespaces=self.namespaces)
+        return xpath
+
+    def analyseer_bestand(self, twb_bestands_pad, **opties):
+        """Zie analyseer_tableau_bestand."""
+        return analyseer_tableau_bestand(twb_bestands_pad, analyzer=self, **opties)
+
+    def analyseer_stream(self, bron, **opties):
+        """Zie analyze_stream."""
+        return analyze_stream(bron, analyzer=self, **opties)
+
+    def analyseer_bytes(self, inhoud, **opties):
+        """Zie analyze_bytes."""
+        return analyze_stream(inhoud, analyzer=self, **opties)
+
+# Gedeelde context voor de functies op moduleniveau
+STANDAARD_ANALYZER = Analyzer()
+
 # Functies voor complexiteit en afhankelijkheden
 def score_complexity(formula_string):
-    """Scoort de complexiteit van een Tableau formule."""
+    """
+    Scoort de complexiteit van een Tableau formule.
+
+    Gebruikt de gecachte formule-analyse (zie tableau_formule), die tekst en commentaar
+    negeert en echte Tableau functies, LOD-expressies, tabelberekeningen en nesting telt.
+    Returns:
+        str: "Eenvoudig", "Gemiddeld", "Complex" of "Onbekend" voor een lege formule.
+    """
     if not formula_string:
         return "Onbekend" # Of "N/A"
+    return formule_metrieken(formula_string)["label"]
 
-    length = len(formula_string)
-    # Ruwe telling van functies (vereenvoudigd: telt open haakjes)
-    # Een betere methode zou zijn om specifieke Tableau functienamen te tellen.
-    num_functions = formula_string.count('(') 
-    
-    # Basis nesting check (vereenvoudigd: diepte van haakjes)
-    # Dit is een zeer basale indicator en kan verfijnd worden.
-    nesting_depth = 0
-    max_nesting_depth = 0
-    for char in formula_string:
-        if char == '(':
-            nesting_depth += 1
-            max_nesting_depth = max(max_nesting_depth, nesting_depth)
-        elif char == ')':
-            nesting_depth -= 1
-
-    if length >= 150 or num_functions > 3 or max_nesting_depth > 2: # Aangepast voor max_nesting_depth
-        return "Complex"
-    elif length >= 50 or num_functions > 1 or max_nesting_depth > 1: # Aangepast voor max_nesting_depth
-        return "Gemiddeld"
-    else:
-        return "Eenvoudig"
+def _normaliseer_veldnaam(naam):
+    """Normaliseert een veld- of databronnaam voor opzoeken: zonder blokhaken, ']]' als ']', casefold."""
+    naam = naam.strip()
+    if len(naam) >= 2 and naam[0] == '[' and naam[-1] == ']':
+        naam = naam[1:-1]
+    return naam.replace(']]', ']').casefold()
+
+class VeldIndex:
+    """
+    Case-insensitive symbooltabel van alle velden in een werkboek.
+
+    Een veld is vindbaar op zijn interne naam en op zijn caption, met of zonder
+    blokhaken, en ook in de vorm [databron].[veld]. Opzoeken kost één dict-lookup,
+    ongeacht het aantal velden.
+    """
+
+    def __init__(self):
+        self._op_naam = {} # genormaliseerde naam/caption -> [(databron, veldnaam), ...]
+        self._op_databron = {} # (genormaliseerde databron, genormaliseerde naam/caption) -> (databron, veldnaam)
+
+    @classmethod
+    def uit_databronnen(cls, databronnen):
+        """Bouwt een index uit de 'databronnen' van project_data."""
+        index = cls()
+        for ds in databronnen:
+            for col in ds["kolommen"]:
+                if col.get("naam"):
+                    index.voeg_toe(col["naam"], caption=col.get("caption"), databron=ds.get("naam"))
+        return index
+
+    @classmethod
+    def uit_veldnamen(cls, veldnamen):
+        """Bouwt een index uit een platte lijst veldnamen (zonder databron)."""
+        index = cls()
+        for veldnaam in veldnamen:
+            index.voeg_toe(veldnaam)
+        return index
+
+    def voeg_toe(self, veldnaam, caption=None, databron=None):
+        """Voegt een veld toe onder zijn naam en (optioneel) caption."""
+        doel = (databron, veldnaam)
+        ds_sleutel = _normaliseer_veldnaam(databron) if databron else None
+        for sleutel in {_normaliseer_veldnaam(veldnaam), _normaliseer_veldnaam(caption or veldnaam)}:
+            kandidaten = self._op_naam.setdefault(sleutel, [])
+            if doel not in kandidaten:
+                kandidaten.append(doel)
+            if ds_sleutel is not None:
+                self._op_databron.setdefault((ds_sleutel, sleutel), doel)
+
+    def los_op(self, veld, databron=None, context_databron=None):
+        """
+        Zoekt een veldreferentie op.
+        Args:
+            veld (str): Veldnaam of caption zoals in de formule, met of zonder blokhaken.
+            databron (str): Databron uit een [databron].[veld]-referentie, indien aanwezig.
+            context_databron (str): Databron van de formule zelf; heeft voorrang bij
+                velden die in meerdere databronnen voorkomen.
+        Returns:
+            tuple | None: (databron, veldnaam) van het gevonden veld, of None.
+        """
+        sleutel = _normaliseer_veldnaam(veld)
+        if databron is not None:
+            doel = self._op_databron.get((_normaliseer_veldnaam(databron), sleutel))
+            if doel is not None:
+                return doel
+        kandidaten = self._op_naam.get(sleutel)
+        if not kandidaten:
+            return None
+        if context_databron is not None and len(kandidaten) > 1:
+            for doel in kandidaten:
+                if doel[0] == context_databron:
+                    return doel
+        return kandidaten[0]
+
+    def __len__(self):
+        return len(self._op_naam)
+
+def _los_formule_op(formula_string, index, context_databron=None):
+    """
+    Lost de veldreferenties van één formule op tot (databron, veldnaam)-paren, in volgorde van voorkomen.
+    De referenties komen uit de gecachte parse; [..] binnen tekstliterals of commentaar telt niet mee.
+    """
+    gevonden = {}
+    for databron, veld in analyseer_formule(formula_string).referenties:
+        doel = index.los_op(veld, databron=databron, context_databron=context_databron)
+        if doel is not None:
+            gevonden.setdefault(doel, None)
+    return list(gevonden)
 
 def extract_field_dependencies(formula_string, all_fields):
-    """Extraheert veldafhankelijkheden uit een formule."""
-    dependencies = set() # Gebruik een set om duplicaten te voorkomen
+    """
+    Extraheert veldafhankelijkheden uit een formule.
+    Args:
+        formula_string (str): De Tableau formule.
+        all_fields (list[str] | VeldIndex): Bekende velden, als lijst namen of als vooraf gebouwde index.
+    Returns:
+        list[str]: De gevonden veldnamen (in de schrijfwijze van all_fields), in volgorde van voorkomen.
+    """
     if not formula_string or not all_fields:
         return []
+    index = all_fields if isinstance(all_fields, VeldIndex) else VeldIndex.uit_veldnamen(all_fields)
+    return list(dict.fromkeys(veldnaam for _, veldnaam in _los_formule_op(formula_string, index)))
 
-    # Zoek naar velden tussen blokhaken, bijv. [Sales] of [Order Date]
-    # Deze regex probeert ook veldnamen met spaties correct te matchen
-    import re
-    # ([^\[\]]+) zorgt ervoor dat we de inhoud binnen de haken krijgen
-    # We moeten de blokhaken escapen omdat ze speciale betekenis hebben in regex.
-    potential_fields = re.findall(r'\[([^\[\]]+)\]', formula_string)
-    
-    for pf in potential_fields:
-        # Vergelijk met de lijst van alle bekende velden (case-insensitive voor robuustheid)
-        # Soms hebben velden in formules een prefix van hun databron, bv [DatasourceName].[FieldName]
-        # Voor nu negeren we de datasource prefix in de matching, maar dit kan verfijnd worden.
-        cleaned_pf = pf.split('.')[-1] # Neem het laatste deel als er een punt is
-        
-        for field_name in all_fields:
-            if field_name.lower() == cleaned_pf.lower():
-                dependencies.add(field_name) # Voeg de originele veldnaam toe (met juiste casing)
-                break 
-                # Als een veldnaam in de formule [Orders (Sample)].[Order ID] is
-                # en all_fields bevat "Order ID", dan moet dit matchen.
-                # De huidige cleaned_pf logica zal "Order ID]" teruggeven zonder de laatste ']'
-                # Dit moet nog verfijnd worden als dit een probleem blijkt.
-                # Voor nu, uitgaande van simpele [FieldName] of [FieldName met spaties]
+def los_afhankelijkheden_op(formules, index, als_paren=False):
+    """
+    Lost de afhankelijkheden van veel formules in één keer op.
+    Args:
+        formules (list[tuple[str, str]]): (formule, context_databron)-paren.
+        index (VeldIndex): Vooraf gebouwde index van alle velden.
+        als_paren (bool): Retourneer (databron, veldnaam)-paren in plaats van alleen veldnamen.
+    Returns:
+        list[list]: Per formule de gevonden veldnamen (of paren), in dezelfde volgorde als `formules`.
+    """
+    # Dezelfde formule komt vaak in meerdere databronnen voor; los elke combinatie maar één keer op
+    opgelost = {}
+    resultaat = []
+    for formule, context_databron in formules:
+        sleutel = (formule, context_databron)
+        if sleutel not in opgelost:
+            paren = _los_formule_op(formule, index, context_databron)
+            opgelost[sleutel] = paren if als_paren else list(dict.fromkeys(veldnaam for _, veldnaam in paren))
+        resultaat.append(opgelost[sleutel])
+    return resultaat
+
+def _kies_twb_member(zip_ref):
+    """Kiest het .twb-bestand uit een geopend .twbx-archief, met voorkeur voor de root van de zip."""
+    twb_files = [name for name in zip_ref.namelist() if name.endswith('.twb')]
+    if not twb_files:
+        return None
 
-    return list(dependencies)
+    twb_file_in_zip = twb_files[0] # Standaard de eerste
+    # Voorkeur voor .twb in root van zip
+    for f_name in twb_files:
+        if '/' not in f_name and '\\' not in f_name:
+            twb_file_in_zip = f_name
+            break
+    return twb_file_in_zip
 
-def registreer_alle_namespaces(bestands_pad):
+def _pakket_type(naam):
+    """Het type van een archiefmember: de extensie in kleine letters, of 'overig' zonder extensie."""
+    extensie = os.path.splitext(naam.rstrip('/'))[1].lower().lstrip('.')
+    return extensie or "overig"
+
+def pakket_inventaris(zip_ref, twb_member=None):
     """
-    Parseert het XML-bestand en registreert alle gevonden namespaces.
-    Dit is cruciaal voor ElementTree om elementen correct te vinden.
+    Inventaris van alle bestanden in een .twbx-archief, uitsluitend uit de central
+    directory (ZipInfo); er wordt niets gedecomprimeerd of gelezen.
+    Args:
+        zip_ref (zipfile.ZipFile): Het geopende archief.
+        twb_member (str): Het geanalyseerde .twb-member, wordt als zodanig gemarkeerd.
+    Returns:
+        dict: Totalen, totalen per type (extensie, bijv. "hyper", "png", "csv") en per
+            bestand de naam, het type, de gecomprimeerde en ongecomprimeerde grootte en
+            de compressie_ratio (ongecomprimeerd / gecomprimeerd; 1.0 is niet
+            gecomprimeerd). De bestanden staan op gecomprimeerde grootte, de grootste eerst.
     """
-    try:
-        # Gebruik een set om dubbele registraties van dezelfde URI onder verschillende prefixen te voorkomen
-        # Hoewel ET.register_namespace dit zelf ook zou moeten afhandelen.
-        geziene_uris = set()
-        for event, elem in ET.iterparse(bestands_pad, events=('start-ns',)):
-            ns_prefix, ns_uri = elem
-            if ns_uri not in geziene_uris:
-                ET.register_namespace(ns_prefix, ns_uri)
-                NAMESPACES[ns_prefix] = ns_uri # Voeg toe aan onze globale dictionary
-                geziene_uris.add(ns_uri)
-        logger.info(f"Geregistreerde namespaces: {list(NAMESPACES.keys())}")
-    except ET.ParseError as e:
-        logger.error(f"XML Parse Fout bij registratie namespaces in {os.path.basename(bestands_pad)}: {e}")
-        # Optioneel: raise de error opnieuw als de caller dit moet weten
-        # raise
-    except Exception as e:
-        logger.exception(f"Algemene fout bij registratie namespaces voor {os.path.basename(bestands_pad)}: ")
-        # Optioneel: raise
-
+    bestanden = []
+    per_type = {}
+    for info in zip_ref.infolist():
+        if info.is_dir():
+            continue
+        soort = _pakket_type(info.filename)
+        bestanden.append({
+            "naam": info.filename,
+            "type": soort,
+            "gecomprimeerd_bytes": info.compress_size,
+            "ongecomprimeerd_bytes": info.file_size,
+            "compressie_ratio": round(info.file_size / info.compress_size, 2) if info.compress_size else None,
+            "is_twb": info.filename == twb_member,
+        })
+        totaal = per_type.setdefault(soort, {"aantal": 0, "gecomprimeerd_bytes": 0, "ongecomprimeerd_bytes": 0})
+        totaal["aantal"] += 1
+        totaal["gecomprimeerd_bytes"] += info.compress_size
+        totaal["ongecomprimeerd_bytes"] += info.file_size
+    bestanden.sort(key=lambda b: -b["gecomprimeerd_bytes"])
+    return {
+        "aantal_bestanden": len(bestanden),
+        "gecomprimeerd_bytes": sum(b["gecomprimeerd_bytes"] for b in bestanden),
+        "ongecomprimeerd_bytes": sum(b["ongecomprimeerd_bytes"] for b in bestanden),
+        "per_type": dict(sorted(per_type.items(), key=lambda t: -t[1]["gecomprimeerd_bytes"])),
+        "bestanden": bestanden,
+    }
 
 def extraheer_twb_uit_twbx(twbx_bestands_pad, tijdelijke_map):
     try:
@@ -122,18 +291,11 @@ def extraheer_twb_uit_twbx(twbx_bestands_pad, tijdelijke_map):
             logger.info(f"Tijdelijke map aangemaakt: {tijdelijke_map}")
 
         with zipfile.ZipFile(twbx_bestands_pad, 'r') as zip_ref:
-            twb_files = [name for name in zip_ref.namelist() if name.endswith('.twb')]
-            if not twb_files:
+            twb_file_in_zip = _kies_twb_member(zip_ref)
+            if twb_file_in_zip is None:
                 logger.error(f"Geen .twb bestand gevonden in {twbx_bestands_pad}")
                 return None
             
-            twb_file_in_zip = twb_files[0] # Standaard de eerste
-            # Voorkeur voor .twb in root van zip
-            for f_name in twb_files:
-                if '/' not in f_name and '\\' not in f_name:
-                    twb_file_in_zip = f_name
-                    break
-            
             logger.info(f"Geselecteerd .twb bestand uit archief: {twb_file_in_zip}")
             doel_pad = os.path.join(tijdelijke_map, os.path.basename(twb_file_in_zip))
             
@@ -157,17 +319,10 @@ def extraheer_twb_uit_twbx(twbx_bestands_pad, tijdelijke_map):
         # Vang andere onverwachte fouten op
         raise # Re-raise voor generieke afhandeling
 
-def analyseer_tableau_bestand(twb_bestands_pad):
-    """
-    Analyseert een .twb-bestand en extraheert metadata.
-    Args:
-        twb_bestands_pad (str): Het pad naar het .twb-bestand.
-    Returns:
-        dict: Een dictionary met de geëxtraheerde metadata, of None bij een fout.
-    """
-    logger.info(f"Start gedetailleerde analyse van: {os.path.basename(twb_bestands_pad)}")
-    project_data = {
-        "bestandsnaam": os.path.basename(twb_bestands_pad),
+def _nieuwe_project_data(bestandsnaam):
+    """Maakt de lege resultaatstructuur voor een analyse aan."""
+    return {
+        "bestandsnaam": bestandsnaam,
         "extract_datum": datetime.now().isoformat(),
         "databronnen": [],
         "werkbladen": [],
@@ -178,124 +333,680 @@ def analyseer_tableau_bestand(twb_bestands_pad):
         "extensies": []
     }
 
-    try:
-        registreer_alle_namespaces(twb_bestands_pad) # Essentieel voor correcte XPath queries
-        tree = ET.parse(twb_bestands_pad)
-        root = tree.getroot()
-
-        # 1. Databronnen
-        for ds_node in root.findall('.//datasource', namespaces=NAMESPACES):
-            ds_info = {
-                "naam": ds_node.get('name', ds_node.get('caption', 'Onbekende Databron')),
-                "versie": ds_node.get('version', 'N/A'),
-                "verbindingen": [],
-                "kolommen": []
+# Tags van een relatie; werkboeken met het objectmodel (2020.2+) schrijven de relaties onder deze namen
+_RELATIE_TAGS = frozenset({'relation', '_.fcp.ObjectModelEncapsulateLegacy.false...relation',
+                           '_.fcp.ObjectModelEncapsulateLegacy.true...relation'})
+
+# Secties die los geëxtraheerd kunnen worden, met de XML-tags die elke sectie nodig heeft
+SECTIE_TAGS = {
+    "databronnen": frozenset({'datasource', 'connection', 'column', 'calculation'}) | _RELATIE_TAGS,
+    "werkbladen": frozenset({'worksheet', 'datasource-dependencies', 'column', 'window', 'card'}),
+    "dashboards": frozenset({'dashboard', 'zone'}),
+}
+_SECTIE_ALIASSEN = {"datasources": "databronnen", "worksheets": "werkbladen"}
+
+# Elementen waarvan de 'end'-events bij een beperkte streaming-analyse toch worden gevolgd,
+# zodat ook niet-gevraagde (vaak grote) subtrees uit het geheugen verdwijnen. Daaronder alle
+# bekende directe kinderen van <workbook>: een subtree zonder eigen events wordt anders pas
+# opgeruimd bij het 'end'-event van een later element op hetzelfde niveau.
+_OPRUIM_TAGS = frozenset({'datasources', 'worksheets', 'dashboards', 'windows', 'thumbnails',
+                          'datasource', 'worksheet', 'dashboard', 'window', 'thumbnail',
+                          'document-format-change-manifest', 'repository-location', 'preferences',
+                          'style', 'mapsources', 'actions', 'external',
+                          'referenced-extensions', 'datagraph'})
+
+def normaliseer_secties(secties):
+    """
+    Zet een sectieselectie om naar een frozenset van sectienamen.
+    Args:
+        secties (str | iterable[str] | None): Bijv. "datasources,dashboards" of ["werkbladen"].
+            Engelse namen (datasources, worksheets) worden vertaald.
+    Returns:
+        frozenset | None: De geselecteerde secties, of None voor een volledige analyse.
+    Raises:
+        ValueError: Bij een onbekende sectie.
+    """
+    if secties is None:
+        return None
+    if isinstance(secties, str):
+        secties = secties.split(',')
+    genormaliseerd = set()
+    for sectie in secties:
+        sectie = sectie.strip().lower()
+        if not sectie:
+            continue
+        sectie = _SECTIE_ALIASSEN.get(sectie, sectie)
+        if sectie not in SECTIE_TAGS:
+            raise ValueError(f"Onbekende sectie '{sectie}'. Kies uit: {', '.join(SECTIE_TAGS)}")
+        genormaliseerd.add(sectie)
+    return frozenset(genormaliseerd) or None
+
+def _vul_project_data_uit_boom(root, project_data, secties=None, meter=GEEN_METER, analyzer=None):
+    """Vult project_data op basis van een volledig geladen lxml-boom; alleen de gevraagde secties."""
+    analyzer = analyzer or STANDAARD_ANALYZER
+    if secties is None or "databronnen" in secties:
+        with meter.fase("databronnen") as meting:
+            _vul_databronnen_uit_boom(root, project_data, analyzer.xpath)
+            meting["databronnen"] = len(project_data["databronnen"])
+            meting["kolommen"] = sum(len(ds["kolommen"]) for ds in project_data["databronnen"])
+    if secties is None or "werkbladen" in secties:
+        with meter.fase("werkbladen") as meting:
+            _vul_werkbladen_uit_boom(root, project_data, analyzer.xpath)
+            meting["werkbladen"] = len(project_data["werkbladen"])
+    if secties is None or "dashboards" in secties:
+        with meter.fase("dashboards") as meting:
+            _vul_dashboards_uit_boom(root, project_data, analyzer.xpath)
+            meting["dashboards"] = len(project_data["dashboards"])
+            meting["zones"] = sum(len(dash["objecten"]) for dash in project_data["dashboards"])
+    # (Voeg hier later extractie voor Verhalen, Parameters, Extensies toe indien nodig)
+
+def _voeg_custom_sql_toe(ds_info, relatie):
+    """Neemt een <relation type="text"> op als custom SQL van de databron; dubbele (legacy) relaties één keer."""
+    sql = (relatie.text or '').strip()
+    query = {"naam": relatie.get('name'), "sql": sql, "fingerprint": sql_fingerprint(sql)}
+    if query not in ds_info["custom_sql"]:
+        ds_info["custom_sql"].append(query)
+
+def _vul_databronnen_uit_boom(root, project_data, xpath):
+    # 1. Databronnen
+    for ds_node in xpath('.//datasource')(root):
+        ds_info = {
+            "naam": ds_node.get('name', ds_node.get('caption', 'Onbekende Databron')),
+            "versie": ds_node.get('version', 'N/A'),
+            "verbindingen": [],
+            "kolommen": [],
+            "custom_sql": []
+        }
+        for conn_node in xpath('.//connection')(ds_node):
+            conn_info = {
+                "class": conn_node.get('class'),
+                "dbname": conn_node.get('dbname'),
+                "server": conn_node.get('server'),
+                "username": conn_node.get('username'),
+                # Voeg meer attributen toe indien nodig
+            }
+            ds_info["verbindingen"].append(conn_info)
+
+        for relatie_node in ds_node.iter(*_RELATIE_TAGS):
+            if relatie_node.get('type') == 'text':
+                _voeg_custom_sql_toe(ds_info, relatie_node)
+
+        for col_node in xpath('.//column')(ds_node):
+            col_data = {
+                "naam": col_node.get('name'),
+                "alias": col_node.get('alias'),
+                "datatype": col_node.get('datatype'),
+                "rol": col_node.get('role'), # dimension, measure
+                "type": col_node.get('type'), # nominal, quantitative, ordinal, temporal
+                "caption": col_node.get('caption')
+            }
+            calculation_node = next(iter(xpath('(.//calculation)[1]')(col_node)), None)
+            if calculation_node is not None:
+                col_data["is_berekend_veld"] = True
+                col_data["formule"] = calculation_node.get('formula', '').strip()
+            else:
+                col_data["is_berekend_veld"] = False
+            ds_info["kolommen"].append(col_data)
+        project_data["databronnen"].append(ds_info)
+
+def _vul_werkbladen_uit_boom(root, project_data, xpath):
+    # 2. Werkbladen
+    for ws_node in xpath('.//worksheet')(root):
+        ws_info = {
+            "naam": ws_node.get('name', 'Onbekend Werkblad'),
+            "gebruikte_databronnen": [],
+            "gebruikte_velden_direct": [],
+            "filters": [],
+            "quick_filters": 0
+        }
+        for dep_node in xpath('.//datasource-dependencies')(ws_node):
+            ds_name = dep_node.get('datasource')
+            if ds_name:
+                ws_info["gebruikte_databronnen"].append(ds_name)
+        # Velden gebruikt (vereenvoudigd)
+        for field_node in xpath('.//datasource-dependencies/column')(ws_node):
+            ws_info["gebruikte_velden_direct"].append(field_node.get('name'))
+        project_data["werkbladen"].append(ws_info)
+    # Quick filters staan als filterkaarten in het venster van het werkblad, niet in <worksheet> zelf
+    werkbladen_op_naam = {}
+    for ws_info in project_data["werkbladen"]:
+        werkbladen_op_naam.setdefault(ws_info["naam"], ws_info)
+    for window_node in xpath(".//window[@class='worksheet']")(root):
+        ws_info = werkbladen_op_naam.get(window_node.get('name'))
+        if ws_info is not None:
+            ws_info["quick_filters"] += len(xpath(".//card[@type='filter']")(window_node))
+
+def _vul_dashboards_uit_boom(root, project_data, xpath):
+    # 3. Dashboards
+    for dash_node in xpath('.//dashboard')(root):
+        dash_info = {
+            "naam": dash_node.get('name', 'Onbekend Dashboard'),
+            "objecten": []
+        }
+        for zone_node in xpath('.//zone')(dash_node):
+            obj_info = {
+                "id": zone_node.get('id'),
+                "type": zone_node.get('type-v2'), 
+                "naam_object": zone_node.get('name'), # Vaak naam van werkblad
             }
-            for conn_node in ds_node.findall('.//connection', namespaces=NAMESPACES):
-                conn_info = {
-                    "class": conn_node.get('class'),
-                    "dbname": conn_node.get('dbname'),
-                    "server": conn_node.get('server'),
-                    "username": conn_node.get('username'),
-                    # Voeg meer attributen toe indien nodig
+            dash_info["objecten"].append(obj_info)
+        project_data["dashboards"].append(dash_info)
+
+def _vul_project_data_streaming(twb_bron, project_data, secties=None, tellers=None, analyzer=None):
+    """
+    Vult project_data in één iterparse-pass met start/end events.
+
+    Alle informatie wordt bij het 'start'-event uit de attributen gelezen, zodat
+    elk element bij zijn 'end'-event direct kan worden opgeruimd. Het geheugengebruik
+    blijft daardoor vlak, ongeacht de grootte van het bestand. De volgorde en inhoud
+    van het resultaat zijn gelijk aan die van _vul_project_data_uit_boom.
+
+    Met `secties` levert lxml alleen events voor de tags die die secties nodig hebben
+    (plus _OPRUIM_TAGS om het geheugen vlak te houden); alle andere elementen komen
+    niet meer in Python terecht. Als `tellers` een dict is, wordt daarin per tag het
+    aantal verwerkte elementen bijgehouden.
+    """
+    analyzer = analyzer or STANDAARD_ANALYZER
+    if secties is None:
+        actieve_tags = None
+        event_tags = None
+    else:
+        actieve_tags = frozenset().union(*(SECTIE_TAGS[sectie] for sectie in secties))
+        event_tags = sorted(actieve_tags | _OPRUIM_TAGS)
+
+    # Stacks van geopende elementen; geneste elementen tellen mee voor al hun voorouders,
+    # net zoals een './/'-zoekopdracht vanaf elk van die voorouders dat zou doen.
+    open_databronnen = []
+    open_kolommen = []
+    open_werkbladen = []
+    open_dashboards = []
+    werkbladen_op_naam = {}
+    open_venster = None # ws_info van het geopende <window class="worksheet">
+
+    for event, elem in ET.iterparse(twb_bron, events=('start', 'end'), tag=event_tags,
+                                    huge_tree=analyzer.huge_tree):
+        tag = elem.tag
+        is_actief = actieve_tags is None or tag in actieve_tags
+        if event == 'start':
+            if tellers is not None:
+                tellers[tag] = tellers.get(tag, 0) + 1
+            if not is_actief:
+                continue
+            if tag == 'datasource':
+                ds_info = {
+                    "naam": elem.get('name', elem.get('caption', 'Onbekende Databron')),
+                    "versie": elem.get('version', 'N/A'),
+                    "verbindingen": [],
+                    "kolommen": [],
+                    "custom_sql": []
                 }
-                ds_info["verbindingen"].append(conn_info)
-            
-            for col_node in ds_node.findall('.//column', namespaces=NAMESPACES):
-                col_data = {
-                    "naam": col_node.get('name'),
-                    "alias": col_node.get('alias'),
-                    "datatype": col_node.get('datatype'),
-                    "rol": col_node.get('role'), # dimension, measure
-                    "type": col_node.get('type'), # nominal, quantitative, ordinal, temporal
-                    "caption": col_node.get('caption')
+                project_data["databronnen"].append(ds_info)
+                open_databronnen.append(ds_info)
+            elif tag == 'connection':
+                for ds_info in open_databronnen:
+                    ds_info["verbindingen"].append({
+                        "class": elem.get('class'),
+                        "dbname": elem.get('dbname'),
+                        "server": elem.get('server'),
+                        "username": elem.get('username'),
+                    })
+            elif tag == 'column':
+                col_data = None
+                if open_databronnen:
+                    col_data = {
+                        "naam": elem.get('name'),
+                        "alias": elem.get('alias'),
+                        "datatype": elem.get('datatype'),
+                        "rol": elem.get('role'),
+                        "type": elem.get('type'),
+                        "caption": elem.get('caption')
+                    }
+                    for ds_info in open_databronnen:
+                        ds_info["kolommen"].append(col_data)
+                open_kolommen.append(col_data)
+                if open_werkbladen:
+                    parent = elem.getparent()
+                    if parent is not None and parent.tag == 'datasource-dependencies':
+                        for ws_info in open_werkbladen:
+                            ws_info["gebruikte_velden_direct"].append(elem.get('name'))
+            elif tag == 'calculation':
+                # Alleen de eerste <calculation> binnen een kolom telt, zoals bij col_node.find()
+                for col_data in open_kolommen:
+                    if col_data is not None and "is_berekend_veld" not in col_data:
+                        col_data["is_berekend_veld"] = True
+                        col_data["formule"] = elem.get('formula', '').strip()
+            elif tag == 'worksheet':
+                ws_info = {
+                    "naam": elem.get('name', 'Onbekend Werkblad'),
+                    "gebruikte_databronnen": [],
+                    "gebruikte_velden_direct": [],
+                    "filters": [],
+                    "quick_filters": 0
                 }
-                calculation_node = col_node.find('.//calculation', namespaces=NAMESPACES)
-                if calculation_node is not None:
-                    col_data["is_berekend_veld"] = True
-                    col_data["formule"] = calculation_node.get('formula', '').strip()
-                else:
-                    col_data["is_berekend_veld"] = False
-                ds_info["kolommen"].append(col_data)
-            project_data["databronnen"].append(ds_info)
-
-        # 2. Werkbladen
-        for ws_node in root.findall('.//worksheet', namespaces=NAMESPACES):
-            ws_info = {
-                "naam": ws_node.get('name', 'Onbekend Werkblad'),
-                "gebruikte_databronnen": [],
-                "gebruikte_velden_direct": [],
-                "filters": []
-            }
-            for dep_node in ws_node.findall('.//datasource-dependencies', namespaces=NAMESPACES):
-                ds_name = dep_node.get('datasource')
+                project_data["werkbladen"].append(ws_info)
+                open_werkbladen.append(ws_info)
+                werkbladen_op_naam.setdefault(ws_info["naam"], ws_info)
+            elif tag == 'datasource-dependencies':
+                ds_name = elem.get('datasource')
                 if ds_name:
-                    ws_info["gebruikte_databronnen"].append(ds_name)
-            # Velden gebruikt (vereenvoudigd)
-            for field_node in ws_node.findall('.//datasource-dependencies/column', namespaces=NAMESPACES):
-                ws_info["gebruikte_velden_direct"].append(field_node.get('name'))
-            project_data["werkbladen"].append(ws_info)
-
-        # 3. Dashboards
-        for dash_node in root.findall('.//dashboard', namespaces=NAMESPACES):
-            dash_info = {
-                "naam": dash_node.get('name', 'Onbekend Dashboard'),
-                "objecten": []
-            }
-            for zone_node in dash_node.findall('.//zone', namespaces=NAMESPACES):
-                obj_info = {
-                    "id": zone_node.get('id'),
-                    "type": zone_node.get('type-v2'), 
-                    "naam_object": zone_node.get('name'), # Vaak naam van werkblad
+                    for ws_info in open_werkbladen:
+                        ws_info["gebruikte_databronnen"].append(ds_name)
+            elif tag == 'dashboard':
+                dash_info = {
+                    "naam": elem.get('name', 'Onbekend Dashboard'),
+                    "objecten": []
                 }
-                dash_info["objecten"].append(obj_info)
-            project_data["dashboards"].append(dash_info)
-        
-        # (Voeg hier later extractie voor Verhalen, Parameters, Extensies toe indien nodig)
+                project_data["dashboards"].append(dash_info)
+                open_dashboards.append(dash_info)
+            elif tag == 'zone':
+                for dash_info in open_dashboards:
+                    dash_info["objecten"].append({
+                        "id": elem.get('id'),
+                        "type": elem.get('type-v2'),
+                        "naam_object": elem.get('name'),
+                    })
+            elif tag == 'window':
+                if elem.get('class') == 'worksheet':
+                    open_venster = werkbladen_op_naam.get(elem.get('name'))
+            elif tag == 'card':
+                if open_venster is not None and elem.get('type') == 'filter':
+                    open_venster["quick_filters"] += 1
+            continue
 
-        # Na het verzamelen van alle kolommen, bepaal afhankelijkheden voor berekende velden
-        all_field_names = []
-        for ds in project_data["databronnen"]:
-            for col in ds["kolommen"]:
-                # Gebruik caption als die er is, anders naam. Dit moet consistent zijn met hoe velden in formules worden gerefereerd.
-                # Tableau gebruikt meestal de 'caption' of de 'name' (vaak [name]) in formules.
-                # We nemen aan dat de 'name' (interne naam) het meest betrouwbaar is voor matching.
-                # Velden in formules worden meestal gerefereerd als [Veldnaam] wat overeenkomt met 'name' of 'caption'.
-                # Voor nu gebruiken we 'name' als de primaire identificatie.
-                if col.get("naam"): # Zorg ervoor dat er een naam is
-                    all_field_names.append(col["naam"])
-        
-        # Verwijder duplicaten als veldnamen (zonder datasource prefix) in meerdere databronnen voorkomen
-        # Dit is een vereenvoudiging; echte afhankelijkheden kunnen datasource-specifiek zijn.
-        unique_field_names = list(set(all_field_names))
-        
-        for ds in project_data["databronnen"]:
-            for col_data in ds["kolommen"]:
-                if col_data.get("is_berekend_veld") and col_data.get("formule"):
-                    formula = col_data["formule"]
-                    col_data["complexiteit"] = score_complexity(formula)
-                    col_data["afhankelijkheden"] = extract_field_dependencies(formula, unique_field_names)
-                elif col_data.get("is_berekend_veld"): # Berekend veld maar geen formule? Geef standaard waarden.
-                    col_data["complexiteit"] = "Onbekend"
-                    col_data["afhankelijkheden"] = []
+        # 'end'-event: stacks bijwerken en het verwerkte element opruimen
+        if not is_actief:
+            pass
+        elif tag == 'datasource':
+            open_databronnen.pop()
+        elif tag == 'column':
+            col_data = open_kolommen.pop()
+            if col_data is not None and "is_berekend_veld" not in col_data:
+                col_data["is_berekend_veld"] = False
+        elif tag in _RELATIE_TAGS:
+            # De SQL staat in de tekst van het element en is pas bij het 'end'-event compleet
+            if elem.get('type') == 'text':
+                for ds_info in open_databronnen:
+                    _voeg_custom_sql_toe(ds_info, elem)
+        elif tag == 'worksheet':
+            open_werkbladen.pop()
+        elif tag == 'dashboard':
+            open_dashboards.pop()
+        elif tag == 'window':
+            open_venster = None
+
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            # Verwijder eerder afgehandelde broers/zussen zodat de boom niet blijft groeien
+            while elem.getprevious() is not None:
+                del parent[0]
+
+# Wijzigen er meer veldnamen dan dit, dan wordt niets uit een vorige analyse hergebruikt
+_MAX_GEWIJZIGDE_SLEUTELS = 256
+
+def _index_sleutels(col):
+    """De sleutels waaronder VeldIndex een kolom opneemt."""
+    if not col.get("naam"):
+        return set()
+    return {_normaliseer_veldnaam(col["naam"]), _normaliseer_veldnaam(col.get("caption") or col["naam"])}
+
+def _gewijzigde_index_sleutels(vorige, project_data, structuur_hashes):
+    """
+    De veldnamen waarvan de betekenis in de VeldIndex kan zijn veranderd ten opzichte van
+    de vorige versie, afgeleid uit het verschil in structuurhashes. Kost tijd naar rato
+    van de wijziging. Returns None als dat niet veilig kan (andere volgorde van databronnen).
+    """
+    oude_databronnen = vorige["structuur_hashes"]["secties"]["databronnen"]["entiteiten"]
+    nieuwe_databronnen = structuur_hashes["secties"]["databronnen"]["entiteiten"]
+    # Bij velden in meerdere databronnen wint de eerste; die volgorde moet dus gelijk zijn
+    if ([naam for naam in oude_databronnen if naam in nieuwe_databronnen]
+            != [naam for naam in nieuwe_databronnen if naam in oude_databronnen]):
+        return None
+    wijzigingen = vergelijk_versies(vorige, {"structuur_hashes": structuur_hashes})["secties"].get("databronnen")
+    if wijzigingen is None:
+        return set()
+
+    oud = entiteiten_op_naam(vorige.get("databronnen", []))
+    nieuw = entiteiten_op_naam(project_data["databronnen"])
+    sleutels = set()
+    for naam in wijzigingen["toegevoegd"]:
+        for col in nieuw[naam]["kolommen"]:
+            sleutels |= _index_sleutels(col)
+    for naam in wijzigingen["verwijderd"]:
+        for col in oud[naam]["kolommen"]:
+            sleutels |= _index_sleutels(col)
+    for item in wijzigingen["gewijzigd"]:
+        oude_kolommen = entiteiten_op_naam(oud[item["naam"]]["kolommen"])
+        nieuwe_kolommen = entiteiten_op_naam(nieuw[item["naam"]]["kolommen"])
+        if ([kolom for kolom in oude_kolommen if kolom in nieuwe_kolommen]
+                != [kolom for kolom in nieuwe_kolommen if kolom in oude_kolommen]):
+            # Andere kolomvolgorde: bij dubbele namen kan een ander veld als eerste worden gevonden
+            for col in nieuwe_kolommen.values():
+                sleutels |= _index_sleutels(col)
+        for kolom in item["kolommen"]["toegevoegd"]:
+            sleutels |= _index_sleutels(nieuwe_kolommen[kolom])
+        for kolom in item["kolommen"]["verwijderd"]:
+            sleutels |= _index_sleutels(oude_kolommen[kolom])
+        for kolom in item["kolommen"]["gewijzigd"]:
+            oude_sleutels = _index_sleutels(oude_kolommen[kolom])
+            nieuwe_sleutels = _index_sleutels(nieuwe_kolommen[kolom])
+            if oude_sleutels != nieuwe_sleutels:
+                sleutels |= oude_sleutels | nieuwe_sleutels
+    return sleutels
+
+def _herbruikbare_berekeningen(vorige, project_data, structuur_hashes):
+    """
+    Verzamelt de verrijking van berekende velden uit een vorige analyse die nog geldig is.
+
+    Complexiteit en functies hangen alleen van de formule af. De opgeloste afhankelijkheden
+    hangen ook van de andere velden af; die blijven geldig zolang geen enkele veldnaam
+    waarvan de betekenis in de index is gewijzigd (toegevoegd, verwijderd, hernoemd)
+    in de formuletekst voorkomt.
+    Returns:
+        dict: (databron, veldnaam, formule) -> (complexiteit, score, functies, paren).
+    """
+    vorige_hashes = vorige.get("structuur_hashes") or {}
+    if (vorige_hashes.get("analyzer_versie") != ANALYZER_VERSIE or "afhankelijkheidsgraaf" not in vorige
+            or "databronnen" not in vorige_hashes.get("secties", {})):
+        return {}
+    gewijzigd = _gewijzigde_index_sleutels(vorige, project_data, structuur_hashes)
+    if gewijzigd is None or len(gewijzigd) > _MAX_GEWIJZIGDE_SLEUTELS:
+        return {}
+
+    knopen = vorige["afhankelijkheidsgraaf"]["knopen"]
+    oude_paren = {}
+    for knoop in knopen:
+        oude_paren.setdefault((knoop["databron"], knoop["veld"]),
+                              [(knopen[dep]["databron"], knopen[dep]["veld"]) for dep in knoop["afhankelijkheden"]])
+    hergebruik = {}
+    for ds in vorige.get("databronnen", []):
+        for col in ds["kolommen"]:
+            formule = col.get("formule")
+            if not (col.get("is_berekend_veld") and formule and col.get("naam") and "complexiteit" in col):
+                continue
+            paren = oude_paren.get((ds.get("naam"), col["naam"]))
+            if paren is None:
+                continue
+            if gewijzigd:
+                genormaliseerd = formule.replace(']]', ']').casefold()
+                if any(sleutel in genormaliseerd for sleutel in gewijzigd):
+                    continue
+            hergebruik[(ds.get("naam"), col["naam"], formule)] = (
+                col["complexiteit"], col.get("complexiteit_score"), col.get("gebruikte_functies", []), paren)
+    return hergebruik
+
+def _verrijk_berekende_velden(project_data, meter=GEEN_METER, vorige=None, structuur_hashes=None):
+    """
+    Voegt complexiteit, afhankelijkheden en gebruikte functies toe aan alle berekende velden.
+    Met `vorige` (het resultaat van een eerdere versie) en de structuur_hashes van deze
+    versie worden ongewijzigde berekende velden overgenomen in plaats van opnieuw geparsed.
+    """
+    with meter.fase("afhankelijkheden") as meting:
+        _verrijk_berekende_velden_fase(project_data, meting, vorige, structuur_hashes)
+
+def _verrijk_berekende_velden_fase(project_data, meting, vorige=None, structuur_hashes=None):
+    # Eén index voor het hele werkboek: interne namen, captions en [databron].[veld]-vormen
+    index = VeldIndex.uit_databronnen(project_data["databronnen"])
+    hergebruik = {}
+    if vorige is not None and structuur_hashes is not None:
+        hergebruik = _herbruikbare_berekeningen(vorige, project_data, structuur_hashes)
+
+    berekende_velden = []
+    for ds in project_data["databronnen"]:
+        for col_data in ds["kolommen"]:
+            if col_data.get("is_berekend_veld") and col_data.get("formule"):
+                berekende_velden.append((col_data, ds.get("naam")))
+            elif col_data.get("is_berekend_veld"): # Berekend veld maar geen formule? Geef standaard waarden.
+                col_data["complexiteit"] = "Onbekend"
+                col_data["complexiteit_score"] = None
+                col_data["afhankelijkheden"] = []
+                col_data["gebruikte_functies"] = []
+
+    meting["berekende_velden"] = len(berekende_velden)
+    nieuw = [(col_data, ds_naam) for col_data, ds_naam in berekende_velden
+             if (ds_naam, col_data.get("naam"), col_data["formule"]) not in hergebruik]
+    if vorige is not None:
+        meting["hergebruikt"] = len(berekende_velden) - len(nieuw)
+    afhankelijkheden = los_afhankelijkheden_op(
+        [(col_data["formule"], ds_naam) for col_data, ds_naam in nieuw], index, als_paren=True)
+    metrieken = score_formules([col_data["formule"] for col_data, _ in nieuw])
+    berekend = {}
+    for (col_data, _), paren, formule_metriek in zip(nieuw, afhankelijkheden, metrieken):
+        # Elke formule is hierboven al geparsed; dit is een treffer in de formule-cache
+        functies = sorted(set(analyseer_formule(col_data["formule"]).functies))
+        berekend[id(col_data)] = (formule_metriek["label"], formule_metriek["score"], functies, paren)
+
+    kanten = []
+    for col_data, ds_naam in berekende_velden:
+        complexiteit, score, functies, paren = (berekend.get(id(col_data))
+                                                or hergebruik[(ds_naam, col_data.get("naam"), col_data["formule"])])
+        col_data["complexiteit"] = complexiteit
+        col_data["complexiteit_score"] = score
+        col_data["afhankelijkheden"] = list(dict.fromkeys(veldnaam for _, veldnaam in paren))
+        if col_data.get("naam"):
+            kanten.extend(((ds_naam, col_data["naam"]), tuple(doel)) for doel in paren)
+        col_data["gebruikte_functies"] = list(functies)
+
+    graaf = AfhankelijkheidsGraaf.bouw(
+        ((ds.get("naam"), col["naam"]) for ds in project_data["databronnen"]
+         for col in ds["kolommen"] if col.get("naam")),
+        kanten)
+    for cyclus in graaf.cycli:
+        logger.warning(f"Cyclische afhankelijkheid tussen berekende velden: "
+                       f"{', '.join(graaf.knopen[i][1] for i in cyclus)}")
+    project_data["afhankelijkheidsgraaf"] = graaf.naar_dict()
+    meting["kanten"] = len(kanten)
+    meting["cycli"] = len(graaf.cycli)
+
+def analyseer_tableau_bestand(twb_bestands_pad, streaming=False, bestandsnaam=None, secties=None,
+                              metrics=False, vorige=None, analyzer=None, uitvoer=None):
+    """
+    Analyseert een .twb-bestand en extraheert metadata.
+    Args:
+        twb_bestands_pad (str | file-like): Het pad naar het .twb-bestand, of een
+            binair file-like object met de XML-inhoud (bijv. een geopend zip-member).
+        streaming (bool): Gebruik één iterparse-pass die verwerkte elementen direct
+            opruimt, in plaats van de volledige boom in het geheugen te laden.
+            Aanbevolen voor zeer grote werkboeken; het resultaat is identiek.
+        bestandsnaam (str): Naam voor het resultaat en de logging. Standaard de
+            basename van het pad.
+        secties (str | iterable[str]): Beperk de analyse tot deze secties, bijv.
+            "databronnen,dashboards" (zie normaliseer_secties). De overige secties
+            blijven leeg en project_data["secties"] vermeldt wat is geanalyseerd.
+            Het meeste winst levert dit in combinatie met streaming.
+        metrics (bool | tableau_profiel.FaseMeter): Meet tijd, aantallen en geheugen per
+            fase en voeg ze toe als project_data["_metrics"]. Elke fase wordt ook als
+            gestructureerd logrecord uitgestuurd (zie tableau_profiel).
+        vorige (dict): Resultaat van een eerdere versie van hetzelfde werkboek. De
+            verrijking van ongewijzigde berekende velden wordt daaruit overgenomen;
+            het resultaat is gelijk aan dat van een volledige analyse.
+        analyzer (Analyzer): Context met parserconfiguratie en XPath-expressies.
+            Standaard STANDAARD_ANALYZER.
+        uitvoer (tableau_json.JsonSchrijver): Optioneel; elke sectie wordt daarnaar
+            geschreven zodra die af is: werkbladen en dashboards direct na het parsen,
+            databronnen en de afhankelijkheidsgraaf na de verrijking. project_data
+            blijft compleet; de aanroeper schrijft de rest met schrijf_resterend.
+    Returns:
+        dict: Een dictionary met de geëxtraheerde metadata, of None bij een fout.
+    """
+    analyzer = analyzer or STANDAARD_ANALYZER
+    secties = normaliseer_secties(secties)
+    is_pad = isinstance(twb_bestands_pad, (str, os.PathLike))
+    if bestandsnaam is None:
+        bestandsnaam = os.path.basename(twb_bestands_pad) if is_pad else getattr(twb_bestands_pad, 'name', 'onbekend.twb')
+    logger.info(f"Start gedetailleerde analyse van: {bestandsnaam}")
+    meter = maak_meter(metrics, bestandsnaam)
+    project_data = _nieuwe_project_data(bestandsnaam)
+    if secties is not None:
+        project_data["secties"] = sorted(secties)
+
+    try:
+        if streaming:
+            with meter.fase("streaming_parse") as meting:
+                # De tellers staan al tijdens het parsen in de meting, zodat de voortgang live te volgen is
+                tellers = meting["elementen_per_tag"] = {} if meter is not GEEN_METER else None
+                _vul_project_data_streaming(twb_bestands_pad, project_data, secties, tellers, analyzer)
+                if tellers is not None:
+                    meting["elementen"] = sum(tellers.values())
+                    meting["elementen_per_tag"] = dict(sorted(tellers.items(), key=lambda t: -t[1])[:20])
+        else:
+            with meter.fase("parsen") as meting:
+                tree = ET.parse(twb_bestands_pad, analyzer.parser())
+                if meter is not GEEN_METER:
+                    meting["elementen"] = sum(1 for _ in tree.getroot().iter())
+            _vul_project_data_uit_boom(tree.getroot(), project_data, secties, meter, analyzer)
+
+        verrijken = secties is None or "databronnen" in secties
+        if uitvoer is not None:
+            # Alleen de databronnen veranderen hierna nog (verrijking van de berekende velden)
+            uitvoer.schrijf_resterend(project_data, behalve={"databronnen"} if verrijken else ())
+        with meter.fase("structuur_hashes"):
+            structuur_hashes = bereken_structuur_hashes(project_data, ANALYZER_VERSIE)
+        if verrijken:
+            _verrijk_berekende_velden(project_data, meter, vorige, structuur_hashes)
+        project_data["structuur_hashes"] = structuur_hashes
+        if uitvoer is not None:
+            uitvoer.schrijf_resterend(project_data)
 
     except ET.ParseError as e:
-        logger.error(f"XML Parse Fout in {os.path.basename(twb_bestands_pad)}: {e}")
+        logger.error(f"XML Parse Fout in {bestandsnaam}: {e}")
         # Stuur de error door zodat app.py deze kan afhandelen
         raise
     except Exception as e:
         # Vang andere onverwachte fouten tijdens de analyse op
-        logger.exception(f"Algemene fout tijdens analyse van {os.path.basename(twb_bestands_pad)}: ")
+        logger.exception(f"Algemene fout tijdens analyse van {bestandsnaam}: ")
         raise # Stuur door voor generieke afhandeling in app.py
 
-    logger.info(f"Gedetailleerde analyse van {os.path.basename(twb_bestands_pad)} voltooid.")
+    if meter is not GEEN_METER:
+        project_data["_metrics"] = meter.naar_dict()
+    logger.info(f"Gedetailleerde analyse van {bestandsnaam} voltooid.")
+    return project_data
+
+def _is_zip_stream(bestand):
+    """Controleert aan de hand van de zip-signatuur of een seekable stream een .twbx-archief is."""
+    positie = bestand.tell()
+    signatuur = bestand.read(4)
+    bestand.seek(positie)
+    return signatuur in (b'PK\x03\x04', b'PK\x05\x06')
+
+def analyze_stream(bron, bestandsnaam=None, streaming=False, cache=None, secties=None, metrics=False,
+                   vorige=None, analyzer=None, uitvoer=None):
+    """
+    Analyseert een .twb of .twbx zonder tijdelijke bestanden op schijf.
+
+    Bij een .twbx wordt het .twb-member direct vanuit het zip-archief in de
+    lxml-parser gevoerd; er wordt niets uitgepakt naar schijf.
+    Args:
+        bron (str | bytes | file-like): Pad naar het bestand, de ruwe inhoud, of
+            een binair file-like object.
+        bestandsnaam (str): Oorspronkelijke bestandsnaam (optioneel, voor logging
+            en het resultaat).
+        streaming (bool): Zie analyseer_tableau_bestand.
+        cache (tableau_cache.AnalyseCache): Optionele cache; bij een treffer wordt
+            het opgeslagen resultaat teruggegeven zonder te parsen.
+        secties (str | iterable[str]): Zie analyseer_tableau_bestand.
+        metrics (bool | tableau_profiel.FaseMeter): Zie analyseer_tableau_bestand; meet
+            daarnaast de cache- en archieffases. _metrics wordt nooit gecachet.
+        vorige (dict): Zie analyseer_tableau_bestand.
+        analyzer (Analyzer): Zie analyseer_tableau_bestand.
+        uitvoer (tableau_json.JsonSchrijver): Zie analyseer_tableau_bestand. Bij een
+            cache-treffer wordt niets geschreven.
+    Returns:
+        dict: De geëxtraheerde metadata.
+    Raises:
+        zipfile.BadZipFile: Als het archief corrupt is.
+        KeyError: Als een .twbx-archief geen .twb-bestand bevat.
+        ET.ParseError: Als de XML ongeldig is.
+    """
+    secties = normaliseer_secties(secties)
+    if isinstance(bron, (str, os.PathLike)):
+        with open(bron, 'rb') as bestand:
+            return analyze_stream(bestand, bestandsnaam or os.path.basename(bron), streaming, cache, secties,
+                                  metrics, vorige, analyzer, uitvoer)
+
+    if isinstance(bron, (bytes, bytearray, memoryview)):
+        bestand = io.BytesIO(bron)
+    elif bron.seekable():
+        bestand = bron
+    else:
+        # zipfile heeft een seekable bestand nodig voor de central directory
+        bestand = io.BytesIO(bron.read())
+
+    if bestandsnaam is None:
+        bestandsnaam = os.path.basename(getattr(bron, 'name', '') or 'onbekend.twb')
+
+    meter = maak_meter(metrics, bestandsnaam)
+    if cache is None:
+        project_data = _analyseer_bestand_of_archief(bestand, bestandsnaam, streaming, secties, meter, vorige,
+                                                        analyzer, uitvoer)
+    else:
+        sleutel_opties = {"bestandsnaam": bestandsnaam}
+        if secties is not None:
+            sleutel_opties["secties"] = sorted(secties)
+        with meter.fase("cache_opzoeken") as meting:
+            sleutel = cache.sleutel(bestand, **sleutel_opties)
+            project_data = cache.get(sleutel)
+            meting["treffer"] = project_data is not None
+        if project_data is None:
+            project_data = _analyseer_bestand_of_archief(bestand, bestandsnaam, streaming, secties, meter, vorige,
+                                                        analyzer, uitvoer)
+            project_data.pop("_metrics", None)
+            with meter.fase("cache_opslaan"):
+                cache.put(sleutel, project_data)
+
+    if meter is not GEEN_METER:
+        project_data["_metrics"] = meter.naar_dict()
     return project_data
 
-def sla_op_als_json(data, uitvoer_bestands_pad):
-    """Slaat de geëxtraheerde data op als een JSON-bestand."""
+def _analyseer_bestand_of_archief(bestand, bestandsnaam, streaming, secties=None, meter=GEEN_METER,
+                                  vorige=None, analyzer=None, uitvoer=None):
+    """Analyseert een seekable stream die een .twb of een .twbx-archief bevat."""
+    if not _is_zip_stream(bestand):
+        return analyseer_tableau_bestand(bestand, streaming=streaming, bestandsnaam=bestandsnaam,
+                                         secties=secties, metrics=meter, vorige=vorige, analyzer=analyzer,
+                                         uitvoer=uitvoer)
+
+    logger.info(f".twbx archief gedetecteerd, .twb wordt in het geheugen gelezen: {bestandsnaam}")
+    try:
+        with zipfile.ZipFile(bestand, 'r') as zip_ref:
+            with meter.fase("twbx_openen") as meting:
+                twb_file_in_zip = _kies_twb_member(zip_ref)
+                meting["members"] = len(zip_ref.infolist())
+                if twb_file_in_zip is not None:
+                    meting["twb_gecomprimeerd_bytes"] = zip_ref.getinfo(twb_file_in_zip).compress_size
+                pakket = pakket_inventaris(zip_ref, twb_file_in_zip)
+            if twb_file_in_zip is None:
+                logger.error(f"Geen .twb bestand gevonden in {bestandsnaam}")
+                raise KeyError(f"Geen .twb bestand gevonden in {bestandsnaam}")
+            logger.info(f"Geselecteerd .twb bestand uit archief: {twb_file_in_zip}")
+            with zip_ref.open(twb_file_in_zip) as twb_stream:
+                project_data = analyseer_tableau_bestand(twb_stream, streaming=streaming,
+                                                         bestandsnaam=os.path.basename(twb_file_in_zip),
+                                                         secties=secties, metrics=meter, vorige=vorige,
+                                                         analyzer=analyzer, uitvoer=uitvoer)
+            project_data["pakket"] = pakket
+            if "_metrics" in project_data:
+                project_data["_metrics"] = project_data.pop("_metrics")  # metingen blijven de laatste sectie
+            return project_data
+    except zipfile.BadZipFile:
+        logger.error(f"Ongeldig of corrupt zip-archief: {bestandsnaam}")
+        raise
+
+def analyze_bytes(inhoud, bestandsnaam=None, streaming=False, cache=None, secties=None, metrics=False,
+                  vorige=None, analyzer=None):
+    """Analyseert de inhoud van een .twb of .twbx die al in het geheugen staat (zie analyze_stream)."""
+    return analyze_stream(inhoud, bestandsnaam=bestandsnaam, streaming=streaming, cache=cache,
+                          secties=secties, metrics=metrics, vorige=vorige, analyzer=analyzer)
+
+def sla_op_als_json(data, uitvoer_bestands_pad, compact=False, gzip_uitvoer=None):
+    """
+    Slaat een complete analyse op als een JSON-bestand.
+    De tekst wordt sectie voor sectie geschreven (zie tableau_json); met compact=True
+    zonder inspringing, met gzip_uitvoer=True gecomprimeerd (standaard bij een '.gz'-pad).
+    Lees het terug met tableau_json.laad_analyse_json.
+    """
     try:
-        with open(uitvoer_bestands_pad, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        schrijf_analyse_json(data, uitvoer_bestands_pad, compact=compact, gzip_uitvoer=gzip_uitvoer)
         logger.info(f"Analyse succesvol opgeslagen als: {uitvoer_bestands_pad}")
         return True
     except (IOError, PermissionError, FileNotFoundError) as e: # Meer specifieke IO errors
@@ -308,47 +1019,70 @@ def sla_op_als_json(data, uitvoer_bestands_pad):
         logger.exception(f"Algemene fout bij opslaan JSON naar {uitvoer_bestands_pad}: ")
         return False
 
-def process_tableau_file(file_path):
-    """Verwerkt een .twb of .twbx bestand."""
+def uitvoer_json_pad(file_path, output_dir=None, gzip_uitvoer=False):
+    """
+    Het pad van het *_analyse.json bestand dat process_tableau_file voor een werkboek schrijft.
+    Zonder output_dir wordt in dezelfde map als dit script opgeslagen.
+    """
+    base_name_original_file = os.path.basename(file_path) # Gebruik originele bestandsnaam voor output
+    output_json_name = os.path.splitext(base_name_original_file)[0] + "_analyse.json"
+    if gzip_uitvoer:
+        output_json_name += ".gz"
+    return os.path.join(SCRIPT_DIR if output_dir is None else output_dir, output_json_name)
+
+def process_tableau_file(file_path, streaming=False, output_dir=None, cache=None, secties=None,
+                         metrics=False, compact=False, gzip_uitvoer=False, incrementeel=False):
+    """
+    Verwerkt een .twb of .twbx bestand en schrijft de analyse als JSON.
+    Args:
+        file_path (str): Pad naar het .twb- of .twbx-bestand.
+        streaming (bool): Zie analyseer_tableau_bestand.
+        output_dir (str): Map voor het *_analyse.json bestand. Standaard de map van dit script.
+        cache (tableau_cache.AnalyseCache): Optionele cache van eerdere analyses.
+        secties (str | iterable[str]): Zie analyseer_tableau_bestand.
+        metrics (bool): Neem de metingen per fase op als _metrics in het JSON-bestand;
+            het wegschrijven zelf wordt alleen als logrecord gemeten.
+        compact (bool): Schrijf de JSON zonder inspringing.
+        gzip_uitvoer (bool): Comprimeer de uitvoer; het bestand heet dan *_analyse.json.gz.
+        incrementeel (bool): Gebruik een bestaand uitvoerbestand als vorige versie (zie
+            analyseer_tableau_bestand), zodat ongewijzigde berekende velden niet opnieuw
+            worden geanalyseerd.
+    Returns:
+        bool: True als de analyse is gelukt en opgeslagen.
+    """
     logger.info(f"Start verwerking bestand: {file_path}")
     
-    is_twbx = file_path.lower().endswith('.twbx')
-    twb_to_analyze = file_path
-    temp_dir_for_twbx = None
     analysis_successful = False 
 
     try:
-        if is_twbx:
-            logger.info(".twbx bestand gedetecteerd, bezig met uitpakken...")
-            # Genereer een uniekere tijdelijke mapnaam om conflicten te vermijden
-            base_name = os.path.basename(file_path).replace('.', '_')
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-            temp_dir_for_twbx = f"temp_tableau_extract_{base_name}_{timestamp}"
-            
-            extracted_twb = extraheer_twb_uit_twbx(file_path, temp_dir_for_twbx)
-            # extraheer_twb_uit_twbx zal nu exceptions raisen, die hieronder worden gevangen
-            twb_to_analyze = extracted_twb
-        
-        analyse_data = analyseer_tableau_bestand(twb_to_analyze)
-        # analyseer_tableau_bestand zal nu exceptions raisen
-        
+        # .twbx archieven worden in het geheugen gelezen; er worden geen tijdelijke bestanden aangemaakt
+        meter = maak_meter(metrics, os.path.basename(file_path))
+
         # Bepaal JSON output pad
-        # Sla op in dezelfde map als het script, tenzij anders geconfigureerd
-        output_dir = SCRIPT_DIR 
-        # output_dir = "." # Of een andere configureerbare map
-        # os.makedirs(output_dir, exist_ok=True) # Zorg ervoor dat de output map bestaat
-
-        base_name_original_file = os.path.basename(file_path) # Gebruik originele bestandsnaam voor output
-        output_json_name = os.path.splitext(base_name_original_file)[0] + "_analyse.json"
-        output_json_pad = os.path.join(output_dir, output_json_name)
-        
-        if sla_op_als_json(analyse_data, output_json_pad):
-            analysis_successful = True
-        else:
-            # sla_op_als_json logt zelf al de fout
-            analysis_successful = False
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True) # Zorg ervoor dat de output map bestaat
+        output_json_pad = uitvoer_json_pad(file_path, output_dir, gzip_uitvoer)
+
+        vorige = None
+        if incrementeel and os.path.exists(output_json_pad):
+            try:
+                vorige = laad_analyse_json(output_json_pad)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Vorige analyse {output_json_pad} is onleesbaar en wordt niet hergebruikt: {e}")
+
+        # Elke sectie wordt geschreven zodra de analyse die af heeft; het bestand vervangt
+        # een eventueel bestaand bestand pas als alles is geschreven
+        with analyse_json_schrijver(output_json_pad, compact=compact, gzip_uitvoer=gzip_uitvoer) as schrijver:
+            analyse_data = analyze_stream(file_path, streaming=streaming, cache=cache, secties=secties,
+                                          metrics=meter, vorige=vorige, uitvoer=schrijver)
+            # analyze_stream zal exceptions raisen, die hieronder worden gevangen
 
-    except (FileNotFoundError, zipfile.BadZipFile, ET.ParseError, KeyError, IndexError) as e:
+            with meter.fase("json_opslaan"):
+                schrijver.schrijf_resterend(analyse_data)
+        logger.info(f"Analyse succesvol opgeslagen als: {output_json_pad}")
+        analysis_successful = True
+
+    except (OSError, zipfile.BadZipFile, ET.ParseError, KeyError, IndexError) as e:
         # Deze errors zijn al gelogd in de specifiekere functies en worden hier opnieuw geraised
         # zodat app.py ze kan tonen aan de gebruiker.
         # Voor CLI gebruik, kunnen we ze hier ook loggen als dat gewenst is, maar het zou dubbel zijn.
@@ -359,17 +1093,52 @@ def process_tableau_file(file_path):
         # Vang alle andere onverwachte exceptions die mogelijk niet door de lagere functies zijn geraised/gelogd.
         logger.exception(f"Onverwachte algemene fout tijdens verwerking van {file_path}: ")
         analysis_successful = False
-    finally:
-        if temp_dir_for_twbx and os.path.exists(temp_dir_for_twbx):
-            try:
-                shutil.rmtree(temp_dir_for_twbx)
-                logger.info(f"Tijdelijke map {temp_dir_for_twbx} opgeruimd.")
-            except Exception as e:
-                logger.warning(f"Kon tijdelijke map {temp_dir_for_twbx} niet opruimen: {e}")
             
     return analysis_successful
 
-def main():
+def _maak_argument_parser():
+    """Bouwt de argument parser voor de CLI."""
+    import argparse  # lazy import: alleen de CLI heeft het nodig
+    parser = argparse.ArgumentParser(
+        prog="tableau_analyzer.py",
+        description="Analyseer Tableau werkboeken (.twb/.twbx) en schrijf de resultaten als JSON.")
+    parser.add_argument("paden", nargs="*",
+                        help="Eén of meer .twb/.twbx bestanden, mappen of glob-patronen (bijv. 'backups/**/*.twbx')")
+    parser.add_argument("--manifest",
+                        help="Tekstbestand met één pad, map of glob-patroon per regel (batchmodus)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Aantal parallelle processen in batchmodus (standaard: aantal CPU-cores)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Maximale verwerkingstijd per bestand in seconden (batchmodus; parseert altijd gestreamd)")
+    parser.add_argument("--uitvoer-map", dest="uitvoer_map", default=None,
+                        help="Map voor de *_analyse.json bestanden (standaard: de map van dit script)")
+    parser.add_argument("--samenvatting", default=None,
+                        help="Schrijf de batch-samenvatting als JSON naar dit pad")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Gebruik de geheugenzuinige single-pass parser")
+    parser.add_argument("--cache-map", dest="cache_map", default=None,
+                        help="Map voor de persistente cache van analyseresultaten")
+    parser.add_argument("--cache-max-mb", dest="cache_max_mb", type=int, default=1024,
+                        help="Maximale grootte van de cache in MB, voor alle workers samen (standaard: 1024)")
+    parser.add_argument("--alleen", "--only", dest="secties", default=None,
+                        help="Analyseer alleen deze secties, kommagescheiden: databronnen (datasources), "
+                             "werkbladen (worksheets), dashboards. Combineer met --streaming voor de meeste winst")
+    parser.add_argument("--compact", action="store_true",
+                        help="Schrijf de JSON zonder inspringing (kleiner en sneller)")
+    parser.add_argument("--gzip", dest="gzip_uitvoer", action="store_true",
+                        help="Comprimeer de uitvoer met gzip (*_analyse.json.gz)")
+    parser.add_argument("--incrementeel", action="store_true",
+                        help="Hergebruik ongewijzigde berekende velden uit een bestaand *_analyse.json in de uitvoermap")
+    parser.add_argument("--inventaris", default=None,
+                        help="Laad de resultaten ook in deze SQLite-inventaris (zie tableau_inventaris.py)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Meet tijd, aantallen en geheugen per fase en neem ze op als _metrics in de uitvoer")
+    parser.add_argument("--profile", action="store_true",
+                        help="Schrijf cProfile- en tracemalloc-rapporten (tableau_analyzer_profiel.prof/.txt) "
+                             "naar de uitvoermap; in batchmodus wordt dan in één proces gewerkt")
+    return parser
+
+def main(argv=None):
     # Configureer logger voor CLI gebruik
     # Als dit script als library wordt geïmporteerd, wil je dit misschien niet hier doen.
     logging.basicConfig(level=logging.INFO, 
@@ -379,24 +1148,60 @@ def main():
     logger.info("Tableau Analyzer CLI gestart")
     logger.info(f"Python versie: {sys.version}")
     logger.info(f"Werkmap: {os.getcwd()}")
+
+    args = _maak_argument_parser().parse_args(sys.argv[1:] if argv is None else argv)
     
-    if len(sys.argv) < 2:
+    if not args.paden and not args.manifest:
         # Fallback: als dit script per abuis als Streamlit main file wordt gestart (zoals op Streamlit Cloud),
         # start dan de echte Streamlit UI uit app.py in plaats van te stoppen met een foutmelding.
-        try:
-            import streamlit as st  # type: ignore
+        # Onder `streamlit run` is streamlit al geladen; vanaf de command line wordt het nooit geïmporteerd.
+        if "streamlit" in sys.modules:
             logger.info("Geen CLI-bestand opgegeven; start Streamlit UI vanuit app.py als fallback.")
-            from app import load_custom_css as _load_css, main as _app_main  # lazy import om import-cycli te vermijden
-            _load_css()
-            _app_main()
+            from app import start_app  # lazy import om import-cycli te vermijden
+            start_app()
             return 0
-        except Exception:
-            # Als we de Streamlit UI niet kunnen starten, val terug op de originele CLI melding
-            logger.error("Geen bestand opgegeven.")
-            logger.info("Gebruik: python3 tableau_analyzer.py <pad_naar_bestand.twb_of_twbx>")
+        logger.error("Geen bestand opgegeven.")
+        logger.info("Gebruik: python3 tableau_analyzer.py <pad_naar_bestand.twb_of_twbx> [meer paden/mappen/globs] [--manifest lijst.txt]")
+        return 1
+
+    try:
+        secties = normaliseer_secties(args.secties)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+
+    if args.profile:
+        uitvoer_map = args.uitvoer_map or SCRIPT_DIR
+        os.makedirs(uitvoer_map, exist_ok=True)
+        with profileer(os.path.join(uitvoer_map, "tableau_analyzer_profiel")):
+            return _voer_cli_uit(args, secties)
+    return _voer_cli_uit(args, secties)
+
+def _voer_cli_uit(args, secties):
+    """Verwerkt de bestanden uit de CLI-argumenten, in batchmodus of als enkel bestand."""
+    import glob
+    paden = [p.strip('"\' ') for p in args.paden]
+    is_batch = (args.manifest is not None or len(paden) > 1
+                or any(os.path.isdir(p) or glob.has_magic(p) for p in paden))
+    if is_batch:
+        from tableau_batch import verzamel_bestanden, verwerk_batch  # lazy import om import-cycli te vermijden
+        bestanden = verzamel_bestanden(paden, manifest=args.manifest)
+        if not bestanden:
+            logger.error("Geen .twb of .twbx bestanden gevonden voor de opgegeven paden.")
             return 1
+        # Een profiel meet alleen dit proces; werk daarom zonder procespool
+        workers = 1 if args.profile else args.workers
+        samenvatting = verwerk_batch(bestanden, workers=workers, timeout=args.timeout,
+                                     output_dir=args.uitvoer_map, streaming=args.streaming,
+                                     cache_map=args.cache_map, cache_max_mb=args.cache_max_mb,
+                                     secties=secties, metrics=args.metrics,
+                                     compact=args.compact, gzip_uitvoer=args.gzip_uitvoer,
+                                     inventaris=args.inventaris, incrementeel=args.incrementeel)
+        if args.samenvatting:
+            sla_op_als_json(samenvatting, args.samenvatting)
+        return 0 if samenvatting["mislukt"] == 0 else 1
         
-    target_file = os.path.abspath(sys.argv[1].strip('"\' '))
+    target_file = os.path.abspath(paden[0])
     logger.info(f"Doelbestand: {target_file}")
 
     if not os.path.exists(target_file):
@@ -407,8 +1212,20 @@ def main():
         logger.error("Ongeldig bestandstype. Alleen .twb of .twbx bestanden worden ondersteund.")
         return 1
 
+    cache = None
+    if args.cache_map:
+        from tableau_cache import AnalyseCache
+        cache = AnalyseCache(args.cache_map, max_bytes=args.cache_max_mb * 1024 * 1024)
+
     logger.info("="*50)
-    if process_tableau_file(target_file):
+    if process_tableau_file(target_file, streaming=args.streaming, output_dir=args.uitvoer_map, cache=cache,
+                            secties=secties, metrics=args.metrics, compact=args.compact,
+                            gzip_uitvoer=args.gzip_uitvoer, incrementeel=args.incrementeel):
+        if args.inventaris:
+            from tableau_inventaris import Inventaris  # lazy import: alleen nodig met --inventaris
+            with Inventaris(args.inventaris) as inventaris:
+                uitvoer = uitvoer_json_pad(target_file, args.uitvoer_map, args.gzip_uitvoer)
+                inventaris.voeg_toe(laad_analyse_json(uitvoer), sleutel=target_file)
         logger.info("="*50)
         logger.info("Verwerking succesvol afgerond.")
         return 0
@@ -418,9 +1235,5 @@ def main():
         return 1
 
 if __name__ == "__main__":
-    # Verplaats logger configuratie naar main om dubbele handlers te voorkomen als module wordt geladen
-    # De globale logger setup bovenaan het bestand zal gebruikt worden als dit als library wordt geïmporteerd.
-    # Voor CLI, kan main() de configuratie overschrijven of verfijnen.
-    # In dit geval, de basicConfig in main() zal de root logger configureren.
-    # De logger = logging.getLogger(__name__) zal deze configuratie erven.
+    # main() configureert de root logger; de logger van deze module erft die configuratie
     sys.exit(main()) 
\ No newline at end of file
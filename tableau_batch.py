@@ -0,0 +1,253 @@
+"""
+Batchverwerking van grote aantallen Tableau werkboeken.
+
+Verzamelt .twb/.twbx bestanden uit mappen, glob-patronen of een manifest en
+verwerkt ze met process_tableau_file over een procespool, met een optionele
+timeout per bestand en een samenvatting van de hele run.
+"""
+import glob
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import tableau_analyzer
+from tableau_json import laad_analyse_json
+from tableau_analyzer import process_tableau_file, uitvoer_json_pad
+
+logger = logging.getLogger(__name__)
+
+# Per worker-proces één cache-instantie, zodat de index niet per bestand opnieuw wordt geladen
+_worker_cache = None
+
+ONDERSTEUNDE_EXTENSIES = ('.twb', '.twbx')
+
+# Aantal geslaagde bestanden dat per transactie in de inventaris wordt geladen
+INVENTARIS_BLOK = 200
+
+
+class BestandTimeout(BaseException):
+    """
+    Wordt opgegooid als een bestand langer duurt dan de ingestelde timeout.
+    Erft van BaseException zodat de brede except-blokken in process_tableau_file
+    de timeout niet opvangen als een gewone verwerkingsfout.
+    """
+
+
+def _is_tableau_bestand(pad):
+    return pad.lower().endswith(ONDERSTEUNDE_EXTENSIES)
+
+
+def _lees_manifest(manifest_pad):
+    """Leest een manifest: één pad, map of glob per regel; lege regels en '#'-commentaar worden genegeerd."""
+    basis_map = os.path.dirname(os.path.abspath(manifest_pad))
+    bronnen = []
+    with open(manifest_pad, 'r', encoding='utf-8') as f:
+        for regel in f:
+            regel = regel.strip()
+            if not regel or regel.startswith('#'):
+                continue
+            # Relatieve paden zijn relatief ten opzichte van het manifest zelf
+            bronnen.append(os.path.join(basis_map, regel))
+    return bronnen
+
+
+def verzamel_bestanden(bronnen, manifest=None):
+    """
+    Zet mappen, glob-patronen en losse paden om naar een lijst van .twb/.twbx bestanden.
+    Args:
+        bronnen (list[str]): Paden, mappen (recursief doorzocht) of glob-patronen.
+        manifest (str): Optioneel pad naar een manifestbestand met extra bronnen.
+    Returns:
+        list[str]: Unieke absolute paden, in volgorde van opgave.
+    """
+    alle_bronnen = list(bronnen)
+    if manifest:
+        alle_bronnen.extend(_lees_manifest(manifest))
+
+    gevonden = []
+    gezien = set()
+
+    def _voeg_toe(pad):
+        pad = os.path.abspath(pad)
+        if pad not in gezien and _is_tableau_bestand(pad) and os.path.isfile(pad):
+            gezien.add(pad)
+            gevonden.append(pad)
+
+    for bron in alle_bronnen:
+        if glob.has_magic(bron):
+            for pad in sorted(glob.glob(bron, recursive=True)):
+                _voeg_toe(pad)
+        elif os.path.isdir(bron):
+            for map_pad, submappen, bestanden in os.walk(bron):
+                submappen.sort()
+                for naam in sorted(bestanden):
+                    _voeg_toe(os.path.join(map_pad, naam))
+        elif os.path.isfile(bron):
+            _voeg_toe(bron)
+        else:
+            logger.warning(f"Bron niet gevonden of geen Tableau bestand: {bron}")
+    return gevonden
+
+
+def _timeout_handler(signum, frame):
+    raise BestandTimeout()
+
+
+def _verwerk_bestand(pad, timeout, opties):
+    """Verwerkt één bestand (in een worker) en retourneert het resultaat als dict."""
+    gebruik_alarm = timeout is not None and hasattr(signal, 'SIGALRM')
+    vorige_handler = None
+    start = time.perf_counter()
+    resultaat = {"pad": pad, "status": "fout", "duur_s": None, "fout": None}
+    try:
+        if gebruik_alarm:
+            vorige_handler = signal.signal(signal.SIGALRM, _timeout_handler)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            if process_tableau_file(pad, cache=_worker_cache, **opties):
+                resultaat["status"] = "ok"
+                resultaat["uitvoer"] = uitvoer_json_pad(pad, opties["output_dir"], opties["gzip_uitvoer"])
+            else:
+                resultaat["fout"] = "Verwerking mislukt, zie logs"
+        finally:
+            if gebruik_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, vorige_handler)
+    except BestandTimeout:
+        resultaat["status"] = "timeout"
+        resultaat["fout"] = f"Timeout na {timeout} seconden"
+    except Exception as e:
+        resultaat["fout"] = f"{type(e).__name__}: {e}"
+    resultaat["duur_s"] = round(time.perf_counter() - start, 3)
+    return resultaat
+
+
+def _init_worker(log_niveau, cache_config):
+    """Initialiseert een worker-proces: logniveau van het hoofdproces en de gedeelde cache."""
+    global _worker_cache
+    tableau_analyzer.logger.setLevel(log_niveau)
+    _worker_cache = None
+    if cache_config is not None:
+        from tableau_cache import AnalyseCache
+        _worker_cache = AnalyseCache(*cache_config)
+
+
+def verwerk_batch(bestanden, workers=None, timeout=None, output_dir=None, streaming=False,
+                  cache_map=None, cache_max_mb=1024, secties=None, metrics=False, compact=False,
+                  gzip_uitvoer=False, inventaris=None, incrementeel=False):
+    """
+    Verwerkt een lijst bestanden parallel en retourneert een samenvatting.
+    Args:
+        bestanden (list[str]): Te verwerken .twb/.twbx bestanden.
+        workers (int): Aantal processen. Standaard os.cpu_count(); bij 1 wordt alles
+            in het huidige proces verwerkt.
+        timeout (float): Maximale verwerkingstijd per bestand in seconden. Wordt
+            afgedwongen met SIGALRM en is daardoor niet beschikbaar op Windows. De
+            handler draait alleen tussen Python-bytecodes, en ET.parse in boommodus is
+            één C-aanroep; met een timeout wordt daarom altijd gestreamd geparsed.
+            Een enkele lange C-aanroep (bijv. het uitpakken van één groot zip-lid) kan
+            de timeout nog steeds overschrijden.
+        output_dir (str): Map voor de *_analyse.json bestanden (zie process_tableau_file).
+        streaming (bool): Zie analyseer_tableau_bestand. Wordt True als `timeout` is gezet.
+        cache_map (str): Optionele map voor de gedeelde AnalyseCache van alle workers.
+        cache_max_mb (int): Maximale grootte van die cache in MB.
+        secties (str | iterable[str]): Beperk de analyse tot deze secties (zie
+            tableau_analyzer.analyseer_tableau_bestand).
+        metrics (bool): Neem per bestand de metingen per fase op als _metrics (zie process_tableau_file).
+        compact (bool): Schrijf de JSON-bestanden zonder inspringing.
+        gzip_uitvoer (bool): Comprimeer de JSON-bestanden met gzip.
+        incrementeel (bool): Hergebruik bestaande uitvoer als vorige versie (zie process_tableau_file).
+        inventaris (str): Optioneel pad van een SQLite-inventaris (zie tableau_inventaris).
+            Geslaagde resultaten worden tijdens de run in blokken geladen, met het pad
+            van het werkboek als sleutel; een eerder geladen werkboek wordt vervangen.
+    Returns:
+        dict: Aantallen geslaagd/mislukt/timeouts, totale wandtijd en per bestand
+            de status en duur, in de volgorde van `bestanden`.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(bestanden) or 1))
+    if timeout is not None and not hasattr(signal, 'SIGALRM'):
+        logger.warning("Timeouts per bestand worden op dit platform niet ondersteund en worden genegeerd.")
+    elif timeout is not None and not streaming:
+        # Alleen iterparse geeft tussen de elementen de controle terug, zodat SIGALRM op tijd afgaat
+        logger.info("Met een timeout per bestand wordt gestreamd geparsed.")
+        streaming = True
+
+    secties = tableau_analyzer.normaliseer_secties(secties)
+    opties = {"streaming": streaming, "output_dir": output_dir, "secties": secties, "metrics": metrics,
+              "compact": compact, "gzip_uitvoer": gzip_uitvoer, "incrementeel": incrementeel}
+    cache_config = (cache_map, cache_max_mb * 1024 * 1024) if cache_map else None
+    logger.info(f"Batchverwerking gestart: {len(bestanden)} bestanden, {workers} worker(s)")
+    start = time.perf_counter()
+    resultaten = {}
+    te_laden = []
+    geladen_in_inventaris = 0
+    if inventaris is not None:
+        from tableau_inventaris import Inventaris
+        inventaris = Inventaris(inventaris)
+
+    def _laad_in_inventaris():
+        nonlocal geladen_in_inventaris
+        # De workers schrijven alleen JSON; het hoofdproces is de enige schrijver van de database
+        blok = []
+        for pad, uitvoer in te_laden:
+            try:
+                blok.append((pad, laad_analyse_json(uitvoer)))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Kon {uitvoer} niet laden in de inventaris: {e}")
+        te_laden.clear()
+        try:
+            geladen_in_inventaris += inventaris.voeg_toe_veel(blok)
+        except Exception as e:
+            logger.error(f"Laden in de inventaris mislukt: {type(e).__name__}: {e}")
+
+    def _log_voortgang(resultaat):
+        logger.info(f"[{len(resultaten)}/{len(bestanden)}] {resultaat['status']}: "
+                    f"{resultaat['pad']} ({resultaat['duur_s']}s)")
+        if inventaris is not None and resultaat["status"] == "ok":
+            te_laden.append((resultaat["pad"], resultaat["uitvoer"]))
+            if len(te_laden) >= INVENTARIS_BLOK:
+                _laad_in_inventaris()
+
+    if workers == 1:
+        _init_worker(tableau_analyzer.logger.level, cache_config)
+        for pad in bestanden:
+            resultaten[pad] = _verwerk_bestand(pad, timeout, opties)
+            _log_voortgang(resultaten[pad])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(tableau_analyzer.logger.level, cache_config)) as executor:
+            futures = {executor.submit(_verwerk_bestand, pad, timeout, opties): pad for pad in bestanden}
+            for future in as_completed(futures):
+                pad = futures[future]
+                try:
+                    resultaten[pad] = future.result()
+                except Exception as e:
+                    # Bijv. BrokenProcessPool als een worker hard is gestopt (geheugen)
+                    resultaten[pad] = {"pad": pad, "status": "fout", "duur_s": None,
+                                       "fout": f"{type(e).__name__}: {e}"}
+                _log_voortgang(resultaten[pad])
+
+    if inventaris is not None:
+        _laad_in_inventaris()
+        inventaris.sluit()
+
+    per_bestand = [resultaten[pad] for pad in bestanden]
+    samenvatting = {
+        "totaal": len(per_bestand),
+        "geslaagd": sum(1 for r in per_bestand if r["status"] == "ok"),
+        "mislukt": sum(1 for r in per_bestand if r["status"] != "ok"),
+        "timeouts": sum(1 for r in per_bestand if r["status"] == "timeout"),
+        "workers": workers,
+        "wandtijd_s": round(time.perf_counter() - start, 3),
+        "bestanden": per_bestand,
+    }
+    if inventaris is not None:
+        samenvatting["in_inventaris"] = geladen_in_inventaris
+    logger.info(f"Batchverwerking voltooid: {samenvatting['geslaagd']} geslaagd, "
+                f"{samenvatting['mislukt']} mislukt (waarvan {samenvatting['timeouts']} timeouts) "
+                f"in {samenvatting['wandtijd_s']}s")
+    return samenvatting
@@ -0,0 +1,291 @@
+"""
+Caches van analyseresultaten.
+
+AnalyseCache bewaart resultaten persistent op schijf. De sleutel is een hash van de inhoud van het werkboek, de analyzer-versie en de
+opties die het resultaat beïnvloeden. Ongewijzigde werkboeken krijgen zo direct
+hun opgeslagen project_data terug in plaats van opnieuw geparsed te worden.
+Daarnaast bevat deze module een kleine TTL-cache in het geheugen voor het delen
+van analyses binnen één proces.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from tableau_analyzer import ANALYZER_VERSIE
+from tableau_json import schrijf_analyse_json
+
+logger = logging.getLogger(__name__)
+
+_LEES_BLOK = 1024 * 1024
+
+
+def sleutel_hasher(**opties):
+    """
+    Retourneert een SHA-256 object waarin de analyzer-versie en de opties al zijn verwerkt.
+    Voer daarna de inhoud van het werkboek in met update(); hexdigest() is dan gelijk aan
+    bereken_sleutel(inhoud, **opties). Handig als de inhoud binnenkomt als stroom.
+    """
+    h = hashlib.sha256()
+    h.update(ANALYZER_VERSIE.encode('utf-8'))
+    h.update(json.dumps(opties, sort_keys=True, default=str).encode('utf-8'))
+    return h
+
+
+def bereken_sleutel(bron, **opties):
+    """
+    Berekent de cache-sleutel voor een werkboek.
+    Args:
+        bron (str | bytes | file-like): Pad, ruwe inhoud of seekable binair file-like object.
+            Een file-like object wordt na het hashen teruggezet naar zijn oorspronkelijke positie.
+        **opties: Analyse-opties die het resultaat beïnvloeden; ze worden meegenomen in de sleutel.
+    Returns:
+        str: Hexadecimale SHA-256 sleutel.
+    """
+    h = sleutel_hasher(**opties)
+    if isinstance(bron, (bytes, bytearray, memoryview)):
+        h.update(bron)
+    elif isinstance(bron, (str, os.PathLike)):
+        with open(bron, 'rb') as f:
+            for blok in iter(lambda: f.read(_LEES_BLOK), b''):
+                h.update(blok)
+    else:
+        positie = bron.tell()
+        for blok in iter(lambda: bron.read(_LEES_BLOK), b''):
+            h.update(blok)
+        bron.seek(positie)
+    return h.hexdigest()
+
+
+class AnalyseCache:
+    """
+    Content-adressed cache van project_data op schijf, begrensd in grootte met LRU-verwijdering.
+
+    Elke entry is een JSON-bestand `<sleutel>.json` in `map_pad`; de modificatietijd
+    dient als LRU-tijdstempel. Meerdere processen mogen dezelfde map delen: schrijven
+    gebeurt atomisch, en de index in het geheugen wordt opnieuw uit de map gelezen
+    vlak voordat er opgeruimd wordt en verder hoogstens eens per `herscan_seconden`.
+    Zo geldt max_bytes voor alle processen samen, terwijl een put niet elke keer de
+    hele map hoeft te scannen.
+    """
+
+    def __init__(self, map_pad, max_bytes=1024 * 1024 * 1024, negeer_extract_datum=True, herscan_seconden=5.0):
+        """
+        Args:
+            map_pad (str): Map waarin de cache wordt opgeslagen (wordt aangemaakt indien nodig).
+            max_bytes (int): Maximale totale grootte van de cache in bytes.
+            negeer_extract_datum (bool): Als True (standaard) hoort het vluchtige veld
+                `extract_datum` niet bij de opgeslagen entry en krijgt elke treffer de
+                huidige tijd. Als False wordt het tijdstip van de oorspronkelijke analyse
+                teruggegeven.
+            herscan_seconden (float): Hoe vaak de map hoogstens opnieuw wordt gescand om
+                entries van andere processen mee te tellen. Tot die tijd kan de map
+                tijdelijk iets boven max_bytes uitkomen.
+        """
+        self.map_pad = map_pad
+        self.max_bytes = max_bytes
+        self.negeer_extract_datum = negeer_extract_datum
+        self.herscan_seconden = herscan_seconden
+        self._lock = threading.Lock()
+        self._index = OrderedDict() # sleutel -> grootte in bytes, oudste eerst
+        self._totaal = 0
+        os.makedirs(map_pad, exist_ok=True)
+        self._laad_index()
+
+    def _laad_index(self):
+        """Bouwt de index opnieuw op uit de map, inclusief entries en LRU-tijdstempels van andere processen."""
+        # Bij gelijke modificatietijden (grove tijdstempels van het bestandssysteem) beslist de eigen LRU-volgorde
+        rang = {sleutel: i for i, sleutel in enumerate(self._index)}
+        self._index.clear()
+        self._totaal = 0
+        self._laatste_scan = time.monotonic()
+        entries = []
+        with os.scandir(self.map_pad) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue # Net door een ander proces verwijderd
+                    sleutel = entry.name[:-5]
+                    entries.append((stat.st_mtime, rang.get(sleutel, -1), sleutel, stat.st_size))
+        for _, _, sleutel, grootte in sorted(entries):
+            self._index[sleutel] = grootte
+            self._totaal += grootte
+
+    def _pad(self, sleutel):
+        return os.path.join(self.map_pad, f"{sleutel}.json")
+
+    def sleutel(self, bron, **opties):
+        """Berekent de cache-sleutel voor een werkboek (zie bereken_sleutel)."""
+        return bereken_sleutel(bron, **opties)
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def totale_grootte(self):
+        """Totale grootte van alle entries in bytes."""
+        return self._totaal
+
+    def get(self, sleutel):
+        """Retourneert de opgeslagen project_data voor een sleutel, of None bij een misser."""
+        pad = self._pad(sleutel)
+        try:
+            with open(pad, 'r', encoding='utf-8') as f:
+                project_data = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                # Mogelijk door een ander proces verwijderd
+                if sleutel in self._index:
+                    self._totaal -= self._index.pop(sleutel)
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Onleesbare cache-entry {sleutel} wordt genegeerd: {e}")
+            return None
+
+        try:
+            os.utime(pad) # Markeer als recent gebruikt
+        except OSError:
+            pass
+        with self._lock:
+            if sleutel in self._index:
+                self._index.move_to_end(sleutel)
+
+        if self.negeer_extract_datum:
+            project_data["extract_datum"] = datetime.now().isoformat()
+        logger.info(f"Cache-treffer voor {project_data.get('bestandsnaam')} ({sleutel[:12]})")
+        return project_data
+
+    def put(self, sleutel, project_data):
+        """Slaat project_data op onder een sleutel en ruimt zo nodig de minst recent gebruikte entries op."""
+        if self.negeer_extract_datum:
+            project_data = {k: v for k, v in project_data.items() if k != "extract_datum"}
+        pad = self._pad(sleutel)
+        tijdelijk_pad = f"{pad}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            schrijf_analyse_json(project_data, tijdelijk_pad, compact=True, gzip_uitvoer=False)
+            os.replace(tijdelijk_pad, pad)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Kon cache-entry {sleutel} niet opslaan: {e}")
+            if os.path.exists(tijdelijk_pad):
+                os.remove(tijdelijk_pad)
+            return False
+
+        try:
+            grootte = os.path.getsize(pad)
+        except OSError:
+            grootte = 0
+
+        with self._lock:
+            self._totaal += grootte - self._index.pop(sleutel, 0)
+            self._index[sleutel] = grootte
+            # Andere processen (bijv. de workers van verwerk_batch) schrijven in dezelfde map;
+            # de map wordt alleen opnieuw gescand vlak voor het opruimen of als de index verouderd is
+            if self._totaal > self.max_bytes or time.monotonic() - self._laatste_scan >= self.herscan_seconden:
+                self._laad_index()
+                if sleutel in self._index:
+                    self._index.move_to_end(sleutel)
+                self._verwijder_oudste()
+        return True
+
+    def _verwijder_oudste(self):
+        """Verwijdert de minst recent gebruikte entries tot de cache binnen max_bytes valt."""
+        while self._totaal > self.max_bytes and len(self._index) > 1:
+            sleutel, grootte = self._index.popitem(last=False)
+            self._totaal -= grootte
+            try:
+                os.remove(self._pad(sleutel))
+            except FileNotFoundError:
+                pass
+            logger.info(f"Cache-entry {sleutel[:12]} verwijderd (LRU)")
+
+    def leeg(self):
+        """Verwijdert alle entries uit de cache."""
+        with self._lock:
+            for sleutel in list(self._index):
+                try:
+                    os.remove(self._pad(sleutel))
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._totaal = 0
+
+
+class GeheugenCache:
+    """
+    Thread-safe cache in het geheugen, begrensd door een TTL en een maximum aantal entries.
+
+    Bedoeld om analyses binnen één proces te delen, bijvoorbeeld tussen alle sessies
+    van de Streamlit-server. Waarden worden niet gekopieerd: alle gebruikers krijgen
+    hetzelfde object en mogen het daarom niet wijzigen.
+    """
+
+    def __init__(self, max_entries=32, ttl_seconden=3600, klok=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconden = ttl_seconden
+        self._klok = klok
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # sleutel -> (verloopt_op, waarde), oudste eerst
+        self._bezig = {} # sleutel -> lock voor een lopende berekening
+
+    def _verwijder_verlopen(self, nu):
+        for sleutel in [s for s, (verloopt_op, _) in self._entries.items() if verloopt_op <= nu]:
+            del self._entries[sleutel]
+
+    def get(self, sleutel):
+        """Retourneert de waarde voor een sleutel, of None als die ontbreekt of verlopen is."""
+        with self._lock:
+            entry = self._entries.get(sleutel)
+            if entry is None:
+                return None
+            if entry[0] <= self._klok():
+                del self._entries[sleutel]
+                return None
+            self._entries.move_to_end(sleutel)
+            return entry[1]
+
+    def put(self, sleutel, waarde):
+        """Slaat een waarde op; verlopen en minst recent gebruikte entries worden opgeruimd."""
+        with self._lock:
+            nu = self._klok()
+            self._entries.pop(sleutel, None)
+            self._entries[sleutel] = (nu + self.ttl_seconden, waarde)
+            self._verwijder_verlopen(nu)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def haal_of_bereken(self, sleutel, bereken):
+        """
+        Retourneert de waarde voor een sleutel en berekent die zo nodig met `bereken()`.
+        Gelijktijdige aanvragen voor dezelfde sleutel wachten op één berekening.
+        """
+        waarde = self.get(sleutel)
+        if waarde is not None:
+            return waarde
+        with self._lock:
+            sleutel_lock = self._bezig.setdefault(sleutel, threading.Lock())
+        with sleutel_lock:
+            try:
+                waarde = self.get(sleutel)
+                if waarde is None:
+                    waarde = bereken()
+                    self.put(sleutel, waarde)
+                return waarde
+            finally:
+                with self._lock:
+                    self._bezig.pop(sleutel, None)
+
+    def verwijder(self, sleutel):
+        """Verwijdert een entry, als die bestaat."""
+        with self._lock:
+            self._entries.pop(sleutel, None)
+
+    def __len__(self):
+        with self._lock:
+            self._verwijder_verlopen(self._klok())
+            return len(self._entries)
@@ -0,0 +1,268 @@
+"""
+Structuurhashes en verschillen tussen versies van een werkboek.
+
+Elke databron, elk werkblad en elk dashboard krijgt een hash van zijn geëxtraheerde
+inhoud; een databron is daarbij zelf weer een Merkle-knoop boven de hashes van zijn
+kolommen. Daarboven worden de entiteiten van een sectie (en de kolommen van een
+databron) in blokken van gemiddeld BLOK_GROOTTE gehasht, en daarboven liggen de
+sectiehashes en één werkboekhash. De blokgrenzen hangen alleen af van de namen, niet
+van posities, zodat een toegevoegde of verwijderde entiteit alleen het eigen blok
+verandert. Omdat alleen de
+ruwe, geëxtraheerde velden worden gehasht (niet de verrijking), zijn de hashes van
+de boom- en de streaming-parser gelijk en kunnen ze ook achteraf uit elk
+analyseresultaat worden berekend.
+
+vergelijk_versies() daalt alleen af in wat verschilt: een gelijke werkboekhash kost
+één vergelijking, een gelijke sectie wordt overgeslagen, en binnen een gewijzigde
+sectie of databron worden alleen de entiteiten van gewijzigde blokken bekeken. De
+kosten zijn dus evenredig met het aantal blokken plus de omvang van de gewijzigde
+blokken, niet met het aantal entiteiten.
+
+Gebruik:
+    python tableau_diff.py oud.twbx nieuw.twbx
+    python tableau_diff.py oud_analyse.json nieuw_analyse.json.gz --uitvoer verschillen.json
+"""
+import hashlib
+import json
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+HASH_SECTIES = ("databronnen", "werkbladen", "dashboards")
+
+# De velden van een kolom zoals de parser ze extraheert; de verrijking (complexiteit e.d.) telt niet mee
+_KOLOM_VELDEN = ("naam", "alias", "datatype", "rol", "type", "caption", "is_berekend_veld", "formule")
+
+# Gemiddeld aantal entiteiten per blok
+BLOK_GROOTTE = 32
+
+
+def _hash(*delen):
+    h = hashlib.blake2b(digest_size=16)
+    for deel in delen:
+        h.update(deel.encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def _inhoud_hash(waarde):
+    return _hash(json.dumps(waarde, sort_keys=True, ensure_ascii=False, separators=(',', ':')))
+
+
+def _unieke_namen(entiteiten, standaard):
+    """Geeft (naam, entiteit)-paren; een naam die vaker voorkomt krijgt een volgnummer (#2, #3, ...)."""
+    gezien = {}
+    for entiteit in entiteiten:
+        naam = entiteit.get("naam") or standaard
+        gezien[naam] = gezien.get(naam, 0) + 1
+        yield (naam if gezien[naam] == 1 else f"{naam}#{gezien[naam]}"), entiteit
+
+
+def _blokken(entiteit_hashes):
+    """
+    Deelt {naam: hash} in opeenvolgende blokken: [{"hash": ..., "namen": [...]}].
+    Een blok eindigt na een naam waarvan de hash deelbaar is door BLOK_GROOTTE; de
+    grenzen blijven dus staan als er elders entiteiten bijkomen, verdwijnen of wijzigen.
+    """
+    blokken = []
+    namen = []
+    delen = []
+    for naam, h in entiteit_hashes.items():
+        namen.append(naam)
+        delen.append(f"{naam}={h}")
+        if int(_hash(naam)[:8], 16) % BLOK_GROOTTE == 0:
+            blokken.append({"hash": _hash(*delen), "namen": namen})
+            namen, delen = [], []
+    if namen:
+        blokken.append({"hash": _hash(*delen), "namen": namen})
+    return blokken
+
+
+def entiteiten_op_naam(entiteiten):
+    """Indexeert databronnen, kolommen, werkbladen of dashboards op de naam die in de structuurhashes wordt gebruikt."""
+    return dict(_unieke_namen(entiteiten, "?"))
+
+
+def _databron_hashes(ds):
+    kolommen = {naam: _inhoud_hash([col.get(veld) for veld in _KOLOM_VELDEN])
+                for naam, col in _unieke_namen(ds.get("kolommen", []), "?")}
+    delen = [ds.get("naam"), ds.get("versie"), ds.get("verbindingen")]
+    if ds.get("custom_sql"):
+        # Alleen als er custom SQL is, zodat de hashes van andere databronnen gelijk blijven aan eerdere versies
+        delen.append([query.get("sql") for query in ds["custom_sql"]])
+    eigenschappen = _inhoud_hash(delen)
+    blokken = _blokken(kolommen)
+    return {
+        "hash": _hash(eigenschappen, *(blok["hash"] for blok in blokken)),
+        "eigenschappen": eigenschappen,
+        "kolommen": kolommen,
+        "blokken": blokken,
+    }
+
+
+def bereken_structuur_hashes(project_data, analyzer_versie=None):
+    """
+    Berekent de Merkle-structuur van een analyseresultaat.
+    Alleen de secties die geanalyseerd zijn (zie project_data['secties']) worden opgenomen.
+    Args:
+        project_data (dict): Een (eventueel al verrijkt) analyseresultaat.
+        analyzer_versie (str): Wordt meegeschreven, zodat een latere analyse weet of
+            de verrijking van dit resultaat herbruikbaar is.
+    Returns:
+        dict: {"werkboek": hash, "analyzer_versie": ..., "secties": {sectie: {"hash": ...,
+            "entiteiten": {naam: hash of {"hash", "eigenschappen", "kolommen", "blokken"}},
+            "blokken": [{"hash": ..., "namen": [...]}]}}}
+    """
+    geanalyseerd = project_data.get("secties") or HASH_SECTIES
+    secties = {}
+    for sectie in HASH_SECTIES:
+        if sectie not in geanalyseerd:
+            continue
+        if sectie == "databronnen":
+            entiteiten = {naam: _databron_hashes(ds)
+                          for naam, ds in _unieke_namen(project_data.get(sectie, []), "?")}
+            entiteit_hashes = {naam: e["hash"] for naam, e in entiteiten.items()}
+        else:
+            entiteiten = {naam: _inhoud_hash(e) for naam, e in _unieke_namen(project_data.get(sectie, []), "?")}
+            entiteit_hashes = entiteiten
+        blokken = _blokken(entiteit_hashes)
+        secties[sectie] = {
+            "hash": _hash(*(blok["hash"] for blok in blokken)),
+            "entiteiten": entiteiten,
+            "blokken": blokken,
+        }
+    return {
+        "werkboek": _hash(*(f"{sectie}={s['hash']}" for sectie, s in secties.items())),
+        "analyzer_versie": analyzer_versie,
+        "secties": secties,
+    }
+
+
+def _entiteit_hash(waarde):
+    return waarde["hash"] if isinstance(waarde, dict) else waarde
+
+
+def _gewijzigde_blok_namen(blokken, andere_blokken):
+    """De namen in de blokken die niet ook (met dezelfde hash) in andere_blokken voorkomen."""
+    andere = {blok["hash"] for blok in andere_blokken}
+    return [naam for blok in blokken if blok["hash"] not in andere for naam in blok["namen"]]
+
+
+def _vergelijk_namen(oud, nieuw, oude_blokken=None, nieuwe_blokken=None):
+    """
+    Toegevoegde, verwijderde en gewijzigde namen tussen twee {naam: hash}-achtige dicts.
+    Met de blokken van beide kanten worden alleen de namen in gewijzigde blokken bekeken:
+    een naam in een ongewijzigd blok staat met dezelfde hash in beide versies, want
+    namen zijn uniek binnen een sectie. Zonder blokken (uitvoer van een oudere versie)
+    worden ze eerst berekend.
+    """
+    if oude_blokken is None:
+        oude_blokken = _blokken({naam: _entiteit_hash(w) for naam, w in oud.items()})
+    if nieuwe_blokken is None:
+        nieuwe_blokken = _blokken({naam: _entiteit_hash(w) for naam, w in nieuw.items()})
+    oude_namen = _gewijzigde_blok_namen(oude_blokken, nieuwe_blokken)
+    nieuwe_namen = _gewijzigde_blok_namen(nieuwe_blokken, oude_blokken)
+    oude_kandidaten, nieuwe_kandidaten = set(oude_namen), set(nieuwe_namen)
+    return (
+        [naam for naam in nieuwe_namen if naam not in oude_kandidaten],
+        [naam for naam in oude_namen if naam not in nieuwe_kandidaten],
+        [naam for naam in nieuwe_namen
+         if naam in oude_kandidaten and _entiteit_hash(nieuw[naam]) != _entiteit_hash(oud[naam])],
+    )
+
+
+def vergelijk_versies(oud, nieuw):
+    """
+    Vergelijkt twee versies van een werkboek.
+    Args:
+        oud, nieuw (dict): Analyseresultaten. Ontbreekt 'structuur_hashes' (bijv. in
+            uitvoer van een oudere versie), dan worden de hashes eerst berekend.
+    Returns:
+        dict: {"identiek": bool, "secties": {sectie: {"toegevoegd", "verwijderd", "gewijzigd"}}}.
+            Alleen gewijzigde secties staan erin; een gewijzigde databron is een dict met
+            de toegevoegde, verwijderde en gewijzigde kolommen en of de eigenschappen
+            (versie, verbindingen, custom SQL) zijn gewijzigd. Secties die maar in één van beide
+            versies zijn geanalyseerd worden niet vergeleken.
+    """
+    oude_hashes = oud.get("structuur_hashes") or bereken_structuur_hashes(oud)
+    nieuwe_hashes = nieuw.get("structuur_hashes") or bereken_structuur_hashes(nieuw)
+    resultaat = {"identiek": True, "secties": {}}
+    if oude_hashes["werkboek"] == nieuwe_hashes["werkboek"]:
+        return resultaat
+
+    for sectie, nieuwe_sectie in nieuwe_hashes["secties"].items():
+        oude_sectie = oude_hashes["secties"].get(sectie)
+        if oude_sectie is None or oude_sectie["hash"] == nieuwe_sectie["hash"]:
+            continue
+        oude_entiteiten, nieuwe_entiteiten = oude_sectie["entiteiten"], nieuwe_sectie["entiteiten"]
+        toegevoegd, verwijderd, gewijzigd = _vergelijk_namen(oude_entiteiten, nieuwe_entiteiten,
+                                                             oude_sectie.get("blokken"), nieuwe_sectie.get("blokken"))
+        if sectie == "databronnen":
+            details = []
+            for naam in gewijzigd:
+                oude_ds, nieuwe_ds = oude_entiteiten[naam], nieuwe_entiteiten[naam]
+                k_toegevoegd, k_verwijderd, k_gewijzigd = _vergelijk_namen(
+                    oude_ds["kolommen"], nieuwe_ds["kolommen"], oude_ds.get("blokken"), nieuwe_ds.get("blokken"))
+                details.append({
+                    "naam": naam,
+                    "eigenschappen_gewijzigd": oude_ds["eigenschappen"] != nieuwe_ds["eigenschappen"],
+                    "kolommen": {"toegevoegd": k_toegevoegd, "verwijderd": k_verwijderd, "gewijzigd": k_gewijzigd},
+                })
+            gewijzigd = details
+        if toegevoegd or verwijderd or gewijzigd:
+            resultaat["secties"][sectie] = {"toegevoegd": toegevoegd, "verwijderd": verwijderd, "gewijzigd": gewijzigd}
+    # Alleen een andere volgorde van entiteiten verandert wel de hash, maar is geen inhoudelijk verschil
+    resultaat["identiek"] = not resultaat["secties"]
+    return resultaat
+
+
+def _laad_versie(pad, streaming=True):
+    """Laadt een analyseresultaat (.json/.json.gz) of analyseert een werkboek (.twb/.twbx)."""
+    if pad.lower().endswith(('.twb', '.twbx')):
+        from tableau_analyzer import analyze_stream  # lazy import: alleen nodig voor werkboeken
+        return analyze_stream(pad, streaming=streaming)
+    from tableau_json import laad_analyse_json
+    return laad_analyse_json(pad)
+
+
+def _druk_af(verschillen, uit=sys.stdout):
+    if verschillen["identiek"]:
+        print("Geen verschillen.", file=uit)
+        return
+    for sectie, wijzigingen in verschillen["secties"].items():
+        print(f"{sectie}:", file=uit)
+        for naam in wijzigingen["toegevoegd"]:
+            print(f"  + {naam}", file=uit)
+        for naam in wijzigingen["verwijderd"]:
+            print(f"  - {naam}", file=uit)
+        for item in wijzigingen["gewijzigd"]:
+            if not isinstance(item, dict):
+                print(f"  ~ {item}", file=uit)
+                continue
+            print(f"  ~ {item['naam']}" + (" (eigenschappen gewijzigd)" if item["eigenschappen_gewijzigd"] else ""),
+                  file=uit)
+            for teken, soort in (("+", "toegevoegd"), ("-", "verwijderd"), ("~", "gewijzigd")):
+                for kolom in item["kolommen"][soort]:
+                    print(f"      {teken} {kolom}", file=uit)
+
+
+def main(argv=None):
+    import argparse
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Toon de verschillen tussen twee versies van een Tableau werkboek.")
+    parser.add_argument("oud", help="Oude versie: .twb/.twbx of *_analyse.json(.gz)")
+    parser.add_argument("nieuw", help="Nieuwe versie: .twb/.twbx of *_analyse.json(.gz)")
+    parser.add_argument("--uitvoer", default=None, help="Schrijf de verschillen ook als JSON naar dit pad")
+    args = parser.parse_args(argv)
+
+    verschillen = vergelijk_versies(_laad_versie(args.oud), _laad_versie(args.nieuw))
+    _druk_af(verschillen)
+    if args.uitvoer:
+        with open(args.uitvoer, 'w', encoding='utf-8') as f:
+            json.dump(verschillen, f, indent=2, ensure_ascii=False)
+    return 0 if verschillen["identiek"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
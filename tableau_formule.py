@@ -0,0 +1,505 @@
+"""
+Analyse van Tableau formules: tokenizer, parser en complexiteitsscore.
+
+Een formule wordt in één regex-pass opgesplitst in tokens. Tekstliterals,
+datumliterals en commentaar worden als geheel herkend, zodat haakjes of
+functienamen daarin niet meetellen. De tokens worden daarna geparsed tot een
+AST, waaruit complexiteit, veldreferenties en functiegebruik in één keer worden
+afgeleid. Het resultaat per unieke formuletekst wordt in een LRU-cache bewaard,
+omdat werkboeken dezelfde berekeningen vaak in meerdere databronnen en
+bestanden hergebruiken.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Functies van de Tableau rekentaal (hoofdletters). Alleen aanroepen van deze namen tellen als functie.
+TABLEAU_FUNCTIES = frozenset("""
+    ABS ACOS ASIN ATAN ATAN2 CEILING COS COT DEGREES DIV EXP FLOOR HEXBINX HEXBINY LN LOG LOG2
+    MAX MIN PI POWER RADIANS ROUND SIGN SIN SQRT SQUARE TAN ZN
+    ASCII CHAR CONTAINS ENDSWITH FIND FINDNTH LEFT LEN LOWER LTRIM MID PROPER REPLACE RIGHT RTRIM
+    SPACE SPLIT STARTSWITH TRIM UPPER REGEXP_EXTRACT REGEXP_EXTRACT_NTH REGEXP_MATCH REGEXP_REPLACE
+    DATE DATEADD DATEDIFF DATENAME DATEPARSE DATEPART DATETIME DATETRUNC DAY ISDATE MAKEDATE
+    MAKEDATETIME MAKETIME MONTH NOW QUARTER TODAY WEEK YEAR ISOQUARTER ISOWEEK ISOWEEKDAY ISOYEAR
+    FLOAT INT STR IFNULL IIF ISNULL
+    ATTR AVG COLLECT CORR COUNT COUNTD COVAR COVARP MEDIAN PERCENTILE STDEV STDEVP SUM VAR VARP
+    FULLNAME ISFULLNAME ISMEMBEROF ISUSERNAME USERDOMAIN USERNAME USERATTRIBUTE USERATTRIBUTEINCLUDES
+    AREA BUFFER DISTANCE INTERSECTS MAKELINE MAKEPOINT OUTLINE SHAPETYPE
+    RAWSQL_BOOL RAWSQL_DATE RAWSQL_DATETIME RAWSQL_INT RAWSQL_REAL RAWSQL_SPATIAL RAWSQL_STR
+    RAWSQLAGG_BOOL RAWSQLAGG_DATE RAWSQLAGG_DATETIME RAWSQLAGG_INT RAWSQLAGG_REAL RAWSQLAGG_STR
+    FIRST INDEX LAST LOOKUP PREVIOUS_VALUE RANK RANK_DENSE RANK_MODIFIED RANK_PERCENTILE RANK_UNIQUE
+    RUNNING_AVG RUNNING_COUNT RUNNING_MAX RUNNING_MIN RUNNING_SUM SIZE TOTAL
+    WINDOW_AVG WINDOW_CORR WINDOW_COUNT WINDOW_COVAR WINDOW_COVARP WINDOW_MAX WINDOW_MEDIAN
+    WINDOW_MIN WINDOW_PERCENTILE WINDOW_STDEV WINDOW_STDEVP WINDOW_SUM WINDOW_VAR WINDOW_VARP
+    SCRIPT_BOOL SCRIPT_INT SCRIPT_REAL SCRIPT_STR
+""".split())
+
+# Tabelberekeningen: worden na de query over de resultaatset uitgerekend
+TABELBEREKENING_FUNCTIES = frozenset("""
+    FIRST INDEX LAST LOOKUP PREVIOUS_VALUE RANK RANK_DENSE RANK_MODIFIED RANK_PERCENTILE RANK_UNIQUE
+    RUNNING_AVG RUNNING_COUNT RUNNING_MAX RUNNING_MIN RUNNING_SUM SIZE TOTAL
+    WINDOW_AVG WINDOW_CORR WINDOW_COUNT WINDOW_COVAR WINDOW_COVARP WINDOW_MAX WINDOW_MEDIAN
+    WINDOW_MIN WINDOW_PERCENTILE WINDOW_STDEV WINDOW_STDEVP WINDOW_SUM WINDOW_VAR WINDOW_VARP
+    SCRIPT_BOOL SCRIPT_INT SCRIPT_REAL SCRIPT_STR
+""".split())
+
+LOD_SLEUTELWOORDEN = frozenset({"FIXED", "INCLUDE", "EXCLUDE"})
+
+_TOKEN_PATROON = re.compile(r"""
+      (?P<commentaar>//[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<tekst>"(?:[^"]|"")*(?:"|\Z)|'(?:[^']|'')*(?:'|\Z))
+    | (?P<veld>\[(?:[^\[\]]|\]\])+\](?:\.\[(?:[^\[\]]|\]\])+\])?)
+    | (?P<datum>\#[^#\n]*\#)
+    | (?P<getal>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<naam>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<operator><=|>=|<>|!=|==|&&|\|\||[-+*/%^=<>!])
+    | (?P<haakje_open>\()
+    | (?P<haakje_dicht>\))
+    | (?P<accolade_open>\{)
+    | (?P<accolade_dicht>\})
+    | (?P<komma>,)
+    | (?P<dubbelepunt>:)
+    | (?P<spatie>\s+)
+    | (?P<onbekend>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Gewichten voor de numerieke complexiteitsscore
+_GEWICHT_FUNCTIE = 1
+_GEWICHT_LOD = 3
+_GEWICHT_TABELBEREKENING = 2
+_GEWICHT_NESTING = 2   # per niveau boven de eerste
+_LENGTE_PER_PUNT = 50  # één punt per zoveel tekens
+
+
+def tokeniseer(formule):
+    """
+    Splitst een formule in tokens.
+    Returns:
+        tuple: (tokens, commentaar_lengte). tokens is een lijst (soort, tekst)-paren zonder
+            witruimte en commentaar; commentaar_lengte is het aantal tekens commentaar.
+    """
+    tokens = []
+    commentaar_lengte = 0
+    for match in _TOKEN_PATROON.finditer(formule):
+        soort = match.lastgroup
+        if soort == 'spatie':
+            continue
+        if soort == 'commentaar':
+            commentaar_lengte += match.end() - match.start()
+            continue
+        tokens.append((soort, match.group()))
+    return tokens, commentaar_lengte
+
+
+def complexiteit_label(lengte, functies, nesting_diepte, lod_expressies, tabelberekeningen):
+    """Zet de metrieken om naar het label Eenvoudig, Gemiddeld of Complex."""
+    if (lengte >= 150 or functies > 3 or nesting_diepte > 2
+            or lod_expressies > 1 or tabelberekeningen > 1):
+        return "Complex"
+    elif (lengte >= 50 or functies > 1 or nesting_diepte > 1
+            or lod_expressies > 0 or tabelberekeningen > 0):
+        return "Gemiddeld"
+    else:
+        return "Eenvoudig"
+
+
+# Maximaal aantal unieke formules waarvan de analyse bewaard blijft
+FORMULE_CACHE_GROOTTE = 8192
+
+_SLEUTELWOORDEN = frozenset({"IF", "THEN", "ELSEIF", "ELSE", "END", "CASE", "WHEN",
+                             "AND", "OR", "NOT", "IN", "TRUE", "FALSE", "NULL"})
+_VERGELIJKINGEN = frozenset({"=", "==", "!=", "<>", "<", ">", "<=", ">="})
+_VELD_DELEN = re.compile(r'\[((?:[^\[\]]|\]\])+)\](?:\.\[((?:[^\[\]]|\]\])+)\])?')
+
+# Een knoop in de AST. soort is bijv. 'functie', 'veld', 'lod', 'if', 'binair'; kinderen is een tuple.
+Knoop = namedtuple("Knoop", ["soort", "waarde", "kinderen"])
+
+
+class FormuleParseFout(ValueError):
+    """De formule voldoet niet aan de grammatica van de Tableau rekentaal."""
+
+
+def splits_veld(tekst):
+    """Zet een veldtoken '[a].[b]' om naar (databron, veld); databron is None bij '[veld]'."""
+    match = _VELD_DELEN.fullmatch(tekst)
+    if match is None:
+        return None, tekst
+    if match.group(2) is None:
+        return None, match.group(1)
+    return match.group(1), match.group(2)
+
+
+class _Parser:
+    """Recursive-descent parser voor de Tableau rekentaal, van laag naar hoog in prioriteit."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _huidig(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def _is_woord(self, *woorden):
+        soort, tekst = self._huidig()
+        return soort == 'naam' and tekst.upper() in woorden
+
+    def _is_operator(self, *operatoren):
+        soort, tekst = self._huidig()
+        return soort == 'operator' and tekst in operatoren
+
+    def _verwacht(self, soort, omschrijving):
+        if self._huidig()[0] != soort:
+            raise FormuleParseFout(f"{omschrijving} verwacht, gevonden: {self._huidig()[1]!r}")
+        self.pos += 1
+
+    def _verwacht_woord(self, woord):
+        if not self._is_woord(woord):
+            raise FormuleParseFout(f"{woord} verwacht, gevonden: {self._huidig()[1]!r}")
+        self.pos += 1
+
+    def parse(self):
+        if not self.tokens:
+            raise FormuleParseFout("Lege formule")
+        knoop = self._expressie()
+        if self.pos != len(self.tokens):
+            raise FormuleParseFout(f"Onverwacht token: {self._huidig()[1]!r}")
+        return knoop
+
+    def _expressie(self):
+        return self._of()
+
+    def _of(self):
+        links = self._en()
+        while self._is_woord("OR") or self._is_operator("||"):
+            self.pos += 1
+            links = Knoop('binair', "OR", (links, self._en()))
+        return links
+
+    def _en(self):
+        links = self._niet()
+        while self._is_woord("AND") or self._is_operator("&&"):
+            self.pos += 1
+            links = Knoop('binair', "AND", (links, self._niet()))
+        return links
+
+    def _niet(self):
+        if self._is_woord("NOT") or self._is_operator("!"):
+            self.pos += 1
+            return Knoop('unair', "NOT", (self._niet(),))
+        return self._vergelijking()
+
+    def _vergelijking(self):
+        links = self._optelling()
+        while True:
+            soort, tekst = self._huidig()
+            if soort == 'operator' and tekst in _VERGELIJKINGEN:
+                self.pos += 1
+                links = Knoop('binair', tekst, (links, self._optelling()))
+            elif self._is_woord("IN"):
+                self.pos += 1
+                self._verwacht('haakje_open', "'('")
+                links = Knoop('in', None, (links,) + self._argumenten())
+            else:
+                return links
+
+    def _optelling(self):
+        links = self._vermenigvuldiging()
+        while self._is_operator("+", "-"):
+            operator = self._huidig()[1]
+            self.pos += 1
+            links = Knoop('binair', operator, (links, self._vermenigvuldiging()))
+        return links
+
+    def _vermenigvuldiging(self):
+        links = self._macht()
+        while self._is_operator("*", "/", "%"):
+            operator = self._huidig()[1]
+            self.pos += 1
+            links = Knoop('binair', operator, (links, self._macht()))
+        return links
+
+    def _macht(self):
+        basis = self._unair()
+        if self._is_operator("^"):
+            self.pos += 1
+            return Knoop('binair', "^", (basis, self._macht()))
+        return basis
+
+    def _unair(self):
+        if self._is_operator("-", "+"):
+            operator = self._huidig()[1]
+            self.pos += 1
+            return Knoop('unair', operator, (self._unair(),))
+        return self._primair()
+
+    def _argumenten(self):
+        """Parseert een door komma's gescheiden lijst tot en met het sluitende haakje."""
+        if self._huidig()[0] == 'haakje_dicht':
+            self.pos += 1
+            return ()
+        argumenten = [self._expressie()]
+        while self._huidig()[0] == 'komma':
+            self.pos += 1
+            argumenten.append(self._expressie())
+        self._verwacht('haakje_dicht', "')'")
+        return tuple(argumenten)
+
+    def _primair(self):
+        soort, tekst = self._huidig()
+        if soort is None:
+            raise FormuleParseFout("Onverwacht einde van de formule")
+        if soort == 'veld':
+            self.pos += 1
+            return Knoop('veld', splits_veld(tekst), ())
+        if soort in ('tekst', 'getal', 'datum'):
+            self.pos += 1
+            return Knoop(soort, tekst, ())
+        if soort == 'haakje_open':
+            self.pos += 1
+            expressie = self._expressie()
+            self._verwacht('haakje_dicht', "')'")
+            return Knoop('groep', None, (expressie,))
+        if soort == 'accolade_open':
+            return self._lod()
+        if soort == 'naam':
+            woord = tekst.upper()
+            if woord == "IF":
+                return self._if()
+            if woord == "CASE":
+                return self._case()
+            if woord in ("TRUE", "FALSE", "NULL"):
+                self.pos += 1
+                return Knoop('constante', woord, ())
+            if woord not in _SLEUTELWOORDEN and self.pos + 1 < len(self.tokens) \
+                    and self.tokens[self.pos + 1][0] == 'haakje_open':
+                self.pos += 2
+                return Knoop('functie', woord, self._argumenten())
+        raise FormuleParseFout(f"Onverwacht token: {tekst!r}")
+
+    def _lod(self):
+        self.pos += 1 # '{'
+        lod_type = None
+        dimensies = []
+        if self._is_woord(*LOD_SLEUTELWOORDEN):
+            lod_type = self._huidig()[1].upper()
+            self.pos += 1
+            if self._huidig()[0] != 'dubbelepunt':
+                dimensies.append(self._expressie())
+                while self._huidig()[0] == 'komma':
+                    self.pos += 1
+                    dimensies.append(self._expressie())
+            self._verwacht('dubbelepunt', "':'")
+        expressie = self._expressie()
+        self._verwacht('accolade_dicht', "'}'")
+        return Knoop('lod', lod_type, (Knoop('dimensies', None, tuple(dimensies)), expressie))
+
+    def _if(self):
+        self.pos += 1 # IF
+        kinderen = [self._expressie()]
+        self._verwacht_woord("THEN")
+        kinderen.append(self._expressie())
+        while self._is_woord("ELSEIF"):
+            self.pos += 1
+            kinderen.append(self._expressie())
+            self._verwacht_woord("THEN")
+            kinderen.append(self._expressie())
+        heeft_else = self._is_woord("ELSE")
+        if heeft_else:
+            self.pos += 1
+            kinderen.append(self._expressie())
+        self._verwacht_woord("END")
+        return Knoop('if', heeft_else, tuple(kinderen))
+
+    def _case(self):
+        self.pos += 1 # CASE
+        kinderen = [self._expressie()]
+        while self._is_woord("WHEN"):
+            self.pos += 1
+            kinderen.append(self._expressie())
+            self._verwacht_woord("THEN")
+            kinderen.append(self._expressie())
+        heeft_else = self._is_woord("ELSE")
+        if heeft_else:
+            self.pos += 1
+            kinderen.append(self._expressie())
+        self._verwacht_woord("END")
+        return Knoop('case', heeft_else, tuple(kinderen))
+
+
+def parse_formule(formule):
+    """
+    Parseert een formule tot een AST van Knoop-tuples.
+    Raises:
+        FormuleParseFout: Als de formule niet aan de grammatica voldoet.
+    """
+    tokens, _ = tokeniseer(formule)
+    try:
+        return _Parser(tokens).parse()
+    except RecursionError:
+        raise FormuleParseFout("Formule is te diep genest om te parsen")
+
+
+class FormuleAnalyse(namedtuple("FormuleAnalyse", [
+        "ast", "fout", "referenties", "functies", "lod_types",
+        "tabelberekeningen", "nesting_diepte", "lengte"])):
+    """
+    Onveranderlijk resultaat van één formule-analyse.
+
+    ast is None als de formule niet te parsen was; fout bevat dan de reden en de
+    overige velden zijn uit de tokens afgeleid. referenties zijn unieke
+    (databron, veld)-paren in volgorde van voorkomen, functies alle aanroepen van
+    Tableau functies (hoofdletters, in volgorde, inclusief herhalingen).
+    """
+    __slots__ = ()
+
+    @property
+    def score(self):
+        return (len(self.functies) * _GEWICHT_FUNCTIE
+                + len(self.lod_types) * _GEWICHT_LOD
+                + self.tabelberekeningen * _GEWICHT_TABELBEREKENING
+                + max(0, self.nesting_diepte - 1) * _GEWICHT_NESTING
+                + self.lengte // _LENGTE_PER_PUNT)
+
+    @property
+    def label(self):
+        return complexiteit_label(self.lengte, len(self.functies), self.nesting_diepte,
+                                  len(self.lod_types), self.tabelberekeningen)
+
+    def metrieken(self):
+        """De complexiteitsmetrieken als dict (zie formule_metrieken)."""
+        return {
+            "lengte": self.lengte,
+            "functies": len(self.functies),
+            "lod_expressies": len(self.lod_types),
+            "tabelberekeningen": self.tabelberekeningen,
+            "nesting_diepte": self.nesting_diepte,
+            "score": self.score,
+            "label": self.label,
+        }
+
+
+def _analyse_uit_ast(ast, lengte):
+    referenties = {}
+    functies = []
+    lod_types = []
+    max_diepte = 0
+    stapel = [(ast, 0)]
+    while stapel:
+        knoop, diepte = stapel.pop()
+        soort = knoop.soort
+        if soort == 'veld':
+            referenties.setdefault(knoop.waarde, None)
+        elif soort in ('functie', 'groep', 'lod'):
+            diepte += 1
+            if diepte > max_diepte:
+                max_diepte = diepte
+            if soort == 'functie' and knoop.waarde in TABLEAU_FUNCTIES:
+                functies.append(knoop.waarde)
+            elif soort == 'lod':
+                lod_types.append(knoop.waarde or "TABEL")
+        elif soort == 'in':
+            # De waardenlijst staat tussen haakjes, de linkerkant niet
+            max_diepte = max(max_diepte, diepte + 1)
+            stapel.extend((kind, diepte + 1) for kind in reversed(knoop.kinderen[1:]))
+            stapel.append((knoop.kinderen[0], diepte))
+            continue
+        # Omgekeerd op de stapel zodat de kinderen in volgorde van voorkomen worden bezocht
+        stapel.extend((kind, diepte) for kind in reversed(knoop.kinderen))
+    tabelberekeningen = sum(1 for naam in functies if naam in TABELBEREKENING_FUNCTIES)
+    return FormuleAnalyse(ast, None, tuple(referenties), tuple(functies), tuple(lod_types),
+                          tabelberekeningen, max_diepte, lengte)
+
+
+def _analyse_uit_tokens(tokens, lengte, fout):
+    """Valt terug op de tokens als de formule niet te parsen is."""
+    referenties = {}
+    functies = []
+    lod_types = []
+    diepte = 0
+    max_diepte = 0
+    laatste = len(tokens) - 1
+
+    for i, (soort, tekst) in enumerate(tokens):
+        if soort == 'veld':
+            referenties.setdefault(splits_veld(tekst), None)
+        elif soort == 'naam':
+            if i < laatste and tokens[i + 1][0] == 'haakje_open':
+                naam = tekst.upper()
+                if naam in TABLEAU_FUNCTIES:
+                    functies.append(naam)
+        elif soort == 'haakje_open' or soort == 'accolade_open':
+            if soort == 'accolade_open':
+                # Accolades komen in Tableau alleen voor bij LOD-expressies ({FIXED ...} of {MAX(...)})
+                volgende = tokens[i + 1][1].upper() if i < laatste else ""
+                lod_types.append(volgende if volgende in LOD_SLEUTELWOORDEN else "TABEL")
+            diepte += 1
+            if diepte > max_diepte:
+                max_diepte = diepte
+        elif soort == 'haakje_dicht' or soort == 'accolade_dicht':
+            if diepte > 0:
+                diepte -= 1
+
+    tabelberekeningen = sum(1 for naam in functies if naam in TABELBEREKENING_FUNCTIES)
+    return FormuleAnalyse(None, fout, tuple(referenties), tuple(functies), tuple(lod_types),
+                          tabelberekeningen, max_diepte, lengte)
+
+
+@lru_cache(maxsize=FORMULE_CACHE_GROOTTE)
+def analyseer_formule(formule):
+    """
+    Analyseert een formule één keer: tokeniseren, parsen en alle afgeleide gegevens.
+
+    Het resultaat wordt per formuletekst in een LRU-cache bewaard; herhaalde
+    aanroepen met dezelfde tekst (ook vanuit andere databronnen of werkboeken in
+    hetzelfde proces) zijn cache-treffers.
+    Returns:
+        FormuleAnalyse: Onveranderlijk resultaat; ook bruikbaar als de formule niet te parsen is.
+    """
+    tokens, commentaar_lengte = tokeniseer(formule)
+    lengte = len(formule.strip()) - commentaar_lengte
+    try:
+        ast = _Parser(tokens).parse()
+    except FormuleParseFout as e:
+        return _analyse_uit_tokens(tokens, lengte, str(e))
+    except RecursionError:
+        return _analyse_uit_tokens(tokens, lengte, "Formule is te diep genest om te parsen")
+    return _analyse_uit_ast(ast, lengte)
+
+
+def formule_cache_info():
+    """Statistieken van de formule-cache (hits, misses, maxsize, currsize)."""
+    return analyseer_formule.cache_info()
+
+
+def wis_formule_cache():
+    """Leegt de formule-cache."""
+    analyseer_formule.cache_clear()
+
+
+def formule_metrieken(formule):
+    """
+    Bepaalt de complexiteit van een formule (via de gecachte analyseer_formule).
+    Returns:
+        dict: lengte (zonder commentaar), functies, lod_expressies, tabelberekeningen,
+            nesting_diepte, score en label.
+    """
+    return analyseer_formule(formule).metrieken()
+
+
+def score_formules(formules):
+    """
+    Scoort een reeks formules in één keer; identieke formules worden maar één keer geanalyseerd.
+    Returns:
+        list[dict]: De metrieken per formule (zie formule_metrieken), in dezelfde volgorde.
+            Identieke formules delen hetzelfde dict.
+    """
+    gescoord = {}
+    resultaat = []
+    for formule in formules:
+        metrieken = gescoord.get(formule)
+        if metrieken is None:
+            metrieken = gescoord[formule] = formule_metrieken(formule)
+        resultaat.append(metrieken)
+    return resultaat
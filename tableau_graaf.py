@@ -0,0 +1,250 @@
+"""
+Afhankelijkheidsgraaf van de velden in een werkboek.
+
+Elk veld krijgt een integer id; een kant van A naar B betekent dat de formule van
+A het veld B gebruikt. Sterk samenhangende componenten (Tarjan) leveren de cycli
+en een topologische volgorde op. De transitieve afhankelijkheden en de impact
+worden pas bij de eerste vraag per component als bitset (een Python int)
+opgebouwd, zodat een analyse die ze niet nodig heeft er ook niet voor betaalt.
+"""
+
+
+def _bits_naar_ids(bits):
+    """Zet een bitset om naar een gesorteerde lijst ids."""
+    ids = []
+    while bits:
+        laagste = bits & -bits
+        ids.append(laagste.bit_length() - 1)
+        bits ^= laagste
+    return ids
+
+
+def _sterke_componenten(aantal, buren):
+    """
+    Iteratieve Tarjan. Componenten komen in omgekeerde topologische volgorde vrij:
+    een component wordt pas uitgegeven als alles wat hij bereikt al is uitgegeven.
+    Returns:
+        list[list[int]]: De componenten, afhankelijkheden eerst.
+    """
+    index = [None] * aantal
+    laagste = [0] * aantal
+    op_stapel = [False] * aantal
+    stapel = []
+    componenten = []
+    teller = 0
+
+    for start in range(aantal):
+        if index[start] is not None:
+            continue
+        werk = [(start, 0)]
+        while werk:
+            knoop, positie = werk.pop()
+            if positie == 0:
+                index[knoop] = laagste[knoop] = teller
+                teller += 1
+                stapel.append(knoop)
+                op_stapel[knoop] = True
+            else:
+                # Terug van het kind op positie - 1
+                kind = buren[knoop][positie - 1]
+                laagste[knoop] = min(laagste[knoop], laagste[kind])
+
+            for i in range(positie, len(buren[knoop])):
+                kind = buren[knoop][i]
+                if index[kind] is None:
+                    werk.append((knoop, i + 1))
+                    werk.append((kind, 0))
+                    break
+                if op_stapel[kind]:
+                    laagste[knoop] = min(laagste[knoop], index[kind])
+            else:
+                if laagste[knoop] == index[knoop]:
+                    component = []
+                    while True:
+                        lid = stapel.pop()
+                        op_stapel[lid] = False
+                        component.append(lid)
+                        if lid == knoop:
+                            break
+                    componenten.append(sorted(component))
+    return componenten
+
+
+class AfhankelijkheidsGraaf:
+    """
+    Compacte, integer-geïndexeerde graaf van veldafhankelijkheden.
+
+    knopen[i] is het (databron, veld)-paar van knoop i; afhankelijkheden[i] de ids
+    van de velden die knoop i direct gebruikt. Topologische volgorde, diepte en
+    cycli worden bij het aanmaken berekend; transitieve afhankelijkheden en de
+    omgekeerde richting (impact) pas bij de eerste vraag.
+    """
+
+    def __init__(self, knopen, afhankelijkheden):
+        """
+        Args:
+            knopen (list[tuple[str, str]]): (databron, veld) per id.
+            afhankelijkheden (list[list[int]]): Per id de ids van de direct gebruikte velden.
+        """
+        self.knopen = [tuple(knoop) for knoop in knopen]
+        self.afhankelijkheden = [list(dict.fromkeys(deps)) for deps in afhankelijkheden]
+        self._op_naam = {}
+        for i, (databron, veld) in enumerate(self.knopen):
+            self._op_naam.setdefault(veld, []).append(i)
+        self._afhankelijken = None
+        self._transitief = None
+        self._impact = None
+        self._bereken()
+
+    @classmethod
+    def bouw(cls, knopen, kanten):
+        """
+        Bouwt een graaf uit (databron, veld)-paren en kanten tussen die paren.
+        Args:
+            knopen (iterable[tuple[str, str]]): Alle velden; dubbele paren worden samengevoegd.
+            kanten (iterable[tuple[tuple, tuple]]): (gebruiker, gebruikt)-paren. Onbekende
+                paren worden als extra knoop toegevoegd.
+        """
+        ids = {}
+        for knoop in knopen:
+            ids.setdefault(tuple(knoop), len(ids))
+        paren = []
+        for van, naar in kanten:
+            paren.append((ids.setdefault(tuple(van), len(ids)), ids.setdefault(tuple(naar), len(ids))))
+        afhankelijkheden = [[] for _ in ids]
+        for van, naar in paren:
+            afhankelijkheden[van].append(naar)
+        return cls(list(ids), afhankelijkheden)
+
+    @classmethod
+    def uit_project_data(cls, project_data):
+        """
+        Bouwt de graaf uit een analyseresultaat, bijvoorbeeld een ingelezen *_analyse.json.
+        Gebruikt de sectie 'afhankelijkheidsgraaf' als die aanwezig is; anders worden de
+        'afhankelijkheden' van de kolommen opgelost, met voorkeur voor de eigen databron.
+        """
+        sectie = project_data.get("afhankelijkheidsgraaf")
+        if sectie is not None:
+            return cls([(k["databron"], k["veld"]) for k in sectie["knopen"]],
+                       [k["afhankelijkheden"] for k in sectie["knopen"]])
+
+        knopen = [(ds.get("naam"), col["naam"])
+                  for ds in project_data.get("databronnen", []) for col in ds["kolommen"] if col.get("naam")]
+        per_veld = {}
+        for knoop in knopen:
+            per_veld.setdefault(knoop[1], []).append(knoop)
+        kanten = []
+        for ds in project_data.get("databronnen", []):
+            for col in ds["kolommen"]:
+                for dep in col.get("afhankelijkheden") or []:
+                    kandidaten = per_veld.get(dep, [])
+                    doel = next((k for k in kandidaten if k[0] == ds.get("naam")),
+                                kandidaten[0] if kandidaten else None)
+                    if doel is not None:
+                        kanten.append(((ds.get("naam"), col["naam"]), doel))
+        return cls.bouw(knopen, kanten)
+
+    def _bereken(self):
+        componenten = _sterke_componenten(len(self.knopen), self.afhankelijkheden)
+        component_van = [0] * len(self.knopen)
+        for c, component in enumerate(componenten):
+            for knoop in component:
+                component_van[knoop] = c
+
+        self.cycli = [component for component in componenten
+                      if len(component) > 1 or component[0] in self.afhankelijkheden[component[0]]]
+        self.topologische_volgorde = [knoop for component in componenten for knoop in component]
+
+        # Componenten komen afhankelijkheden-eerst, dus de diepte van alles wat een component gebruikt is al bekend
+        self.dieptes = [0] * len(self.knopen)
+        for c, component in enumerate(componenten):
+            diepte = 0
+            heeft_afhankelijkheden = False
+            for knoop in component:
+                for dep in self.afhankelijkheden[knoop]:
+                    heeft_afhankelijkheden = True
+                    if component_van[dep] != c:
+                        diepte = max(diepte, self.dieptes[dep])
+            if heeft_afhankelijkheden:
+                for knoop in component:
+                    self.dieptes[knoop] = diepte + 1
+        self._componenten = componenten
+
+    def id_van(self, veld, databron=None):
+        """Retourneert het id van een veld (interne naam), of None. Zonder databron de eerste treffer."""
+        for i in self._op_naam.get(veld, ()):
+            if databron is None or self.knopen[i][0] == databron:
+                return i
+        return None
+
+    def transitieve_afhankelijkheden(self, knoop_id):
+        """Alle ids die knoop_id direct of indirect gebruikt, oplopend gesorteerd."""
+        if self._transitief is None:
+            transitief = [0] * len(self.knopen)
+            # Afhankelijkheden-eerst: alles wat een component gebruikt is dan al verwerkt
+            for component in self._componenten:
+                bits = 0
+                for knoop in component:
+                    for dep in self.afhankelijkheden[knoop]:
+                        bits |= (1 << dep) | transitief[dep]
+                # Binnen een cyclus gebruiken alle leden elkaar en delen ze dus dezelfde afhankelijkheden
+                for knoop in component:
+                    transitief[knoop] = bits
+            self._transitief = transitief
+        return _bits_naar_ids(self._transitief[knoop_id])
+
+    def _bouw_afhankelijken(self):
+        if self._afhankelijken is None:
+            self._afhankelijken = [[] for _ in self.knopen]
+            for van, deps in enumerate(self.afhankelijkheden):
+                for naar in deps:
+                    self._afhankelijken[naar].append(van)
+        return self._afhankelijken
+
+    def afhankelijken(self, knoop_id):
+        """De ids van de velden die knoop_id direct gebruiken."""
+        return list(self._bouw_afhankelijken()[knoop_id])
+
+    def impact(self, knoop_id):
+        """
+        Alle ids van velden die knoop_id direct of indirect gebruiken:
+        wat er geraakt wordt als dit veld wijzigt. Oplopend gesorteerd.
+        """
+        if self._impact is None:
+            afhankelijken = self._bouw_afhankelijken()
+            impact = [0] * len(self.knopen)
+            # Gebruikers-eerst: alle gebruikers van een component zijn dan al verwerkt
+            for component in reversed(self._componenten):
+                bits = 0
+                for knoop in component:
+                    for gebruiker in afhankelijken[knoop]:
+                        bits |= (1 << gebruiker) | impact[gebruiker]
+                for knoop in component:
+                    impact[knoop] = bits
+            self._impact = impact
+        return _bits_naar_ids(self._impact[knoop_id])
+
+    def naar_dict(self):
+        """
+        Serialiseerbare vorm voor de sectie 'afhankelijkheidsgraaf' van project_data.
+        Alleen de directe kanten, diepte, topologische volgorde en cycli: lineair in de
+        omvang van de graaf. De transitieve afhankelijkheden (kwadratisch bij lange
+        ketens) vraag je op na AfhankelijkheidsGraaf.uit_project_data.
+        """
+        return {
+            "knopen": [
+                {
+                    "id": i,
+                    "databron": databron,
+                    "veld": veld,
+                    "afhankelijkheden": self.afhankelijkheden[i],
+                    "diepte": self.dieptes[i],
+                }
+                for i, (databron, veld) in enumerate(self.knopen)
+            ],
+            "topologische_volgorde": self.topologische_volgorde,
+            "cycli": self.cycli,
+        }
+
+    def __len__(self):
+        return len(self.knopen)
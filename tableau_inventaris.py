@@ -0,0 +1,424 @@
+"""
+Inventaris van analyseresultaten in SQLite.
+
+Laadt project_data van veel werkboeken in een geïndexeerd, relationeel schema
+(werkboeken, databronnen, verbindingen, custom SQL, kolommen, berekende velden,
+werkbladen, dashboardzones en de bestanden in .twbx-pakketten), zodat vragen over
+de hele vloot ("welke werkboeken gebruiken server X?", "welke databronnen hebben
+meer dan 500 kolommen?", "welke pakketten zijn groter dan 1 GB?") in milliseconden
+beantwoord worden zonder de *_analyse.json bestanden opnieuw in te lezen.
+
+Een werkboek wordt geïdentificeerd door een sleutel (standaard de bestandsnaam, in
+batchmodus het pad van het werkboek). Opnieuw laden van dezelfde sleutel vervangt
+alle rijen van dat werkboek in één transactie.
+
+Gebruik:
+    python tableau_inventaris.py inventaris.sqlite resultaten/*_analyse.json
+    python tableau_inventaris.py inventaris.sqlite --sql "SELECT * FROM verbindingen WHERE server = 'prod01'"
+    python tableau_inventaris.py inventaris.sqlite --grootste-pakketten 20
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from tableau_json import laad_analyse_json
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSIE = 3
+
+# Alle kindtabellen verwijzen met ON DELETE CASCADE naar werkboeken, zodat vervangen
+# of verwijderen van een werkboek één DELETE is die via de werkboek_id-indexen loopt.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS werkboeken (
+    id INTEGER PRIMARY KEY,
+    sleutel TEXT NOT NULL UNIQUE,
+    bestandsnaam TEXT,
+    extract_datum TEXT,
+    geladen_op TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS databronnen (
+    id INTEGER PRIMARY KEY,
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    naam TEXT,
+    versie TEXT,
+    aantal_kolommen INTEGER NOT NULL,
+    aantal_berekende_velden INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS verbindingen (
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    databron_id INTEGER NOT NULL,
+    klasse TEXT,
+    dbname TEXT,
+    server TEXT,
+    gebruikersnaam TEXT
+);
+CREATE TABLE IF NOT EXISTS custom_sql (
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    databron_id INTEGER NOT NULL,
+    naam TEXT,
+    fingerprint TEXT,
+    sql TEXT
+);
+CREATE TABLE IF NOT EXISTS kolommen (
+    id INTEGER PRIMARY KEY,
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    databron_id INTEGER NOT NULL,
+    naam TEXT,
+    caption TEXT,
+    alias TEXT,
+    datatype TEXT,
+    rol TEXT,
+    type TEXT,
+    is_berekend_veld INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS berekende_velden (
+    kolom_id INTEGER PRIMARY KEY,
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    formule TEXT,
+    complexiteit TEXT,
+    complexiteit_score REAL,
+    afhankelijkheden TEXT -- JSON-lijst van veldnamen
+);
+CREATE TABLE IF NOT EXISTS berekening_functies (
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    kolom_id INTEGER NOT NULL,
+    functie TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS werkbladen (
+    id INTEGER PRIMARY KEY,
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    naam TEXT
+);
+CREATE TABLE IF NOT EXISTS werkblad_databronnen (
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    werkblad_id INTEGER NOT NULL,
+    databron TEXT
+);
+CREATE TABLE IF NOT EXISTS werkblad_velden (
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    werkblad_id INTEGER NOT NULL,
+    veld TEXT
+);
+CREATE TABLE IF NOT EXISTS dashboards (
+    id INTEGER PRIMARY KEY,
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    naam TEXT
+);
+CREATE TABLE IF NOT EXISTS dashboard_zones (
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    dashboard_id INTEGER NOT NULL,
+    zone_id TEXT,
+    type TEXT,
+    naam_object TEXT
+);
+CREATE TABLE IF NOT EXISTS pakket_bestanden (
+    werkboek_id INTEGER NOT NULL REFERENCES werkboeken(id) ON DELETE CASCADE,
+    naam TEXT,
+    type TEXT,
+    gecomprimeerd_bytes INTEGER NOT NULL,
+    ongecomprimeerd_bytes INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_databronnen_werkboek ON databronnen(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_databronnen_naam ON databronnen(naam);
+CREATE INDEX IF NOT EXISTS idx_databronnen_kolommen ON databronnen(aantal_kolommen);
+CREATE INDEX IF NOT EXISTS idx_verbindingen_werkboek ON verbindingen(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_verbindingen_databron ON verbindingen(databron_id);
+CREATE INDEX IF NOT EXISTS idx_verbindingen_server ON verbindingen(server);
+CREATE INDEX IF NOT EXISTS idx_verbindingen_dbname ON verbindingen(dbname);
+CREATE INDEX IF NOT EXISTS idx_custom_sql_werkboek ON custom_sql(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_custom_sql_fingerprint ON custom_sql(fingerprint);
+CREATE INDEX IF NOT EXISTS idx_kolommen_werkboek ON kolommen(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_kolommen_databron ON kolommen(databron_id);
+CREATE INDEX IF NOT EXISTS idx_kolommen_naam ON kolommen(naam);
+CREATE INDEX IF NOT EXISTS idx_berekende_velden_werkboek ON berekende_velden(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_berekende_velden_complexiteit ON berekende_velden(complexiteit);
+CREATE INDEX IF NOT EXISTS idx_berekening_functies_werkboek ON berekening_functies(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_berekening_functies_functie ON berekening_functies(functie);
+CREATE INDEX IF NOT EXISTS idx_werkbladen_werkboek ON werkbladen(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_werkblad_databronnen_werkboek ON werkblad_databronnen(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_werkblad_databronnen_databron ON werkblad_databronnen(databron);
+CREATE INDEX IF NOT EXISTS idx_werkblad_velden_werkboek ON werkblad_velden(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_werkblad_velden_veld ON werkblad_velden(veld);
+CREATE INDEX IF NOT EXISTS idx_dashboards_werkboek ON dashboards(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_dashboard_zones_werkboek ON dashboard_zones(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_dashboard_zones_object ON dashboard_zones(naam_object);
+CREATE INDEX IF NOT EXISTS idx_pakket_bestanden_werkboek ON pakket_bestanden(werkboek_id);
+CREATE INDEX IF NOT EXISTS idx_pakket_bestanden_type ON pakket_bestanden(type);
+"""
+
+# Tabellen met een eigen id; de ids worden bij het laden vooraf uitgedeeld zodat
+# alle rijen met executemany kunnen worden ingevoegd
+_TABELLEN_MET_ID = ("werkboeken", "databronnen", "kolommen", "werkbladen", "dashboards")
+
+_INVOEG_SQL = {
+    "werkboeken": "INSERT INTO werkboeken (id, sleutel, bestandsnaam, extract_datum, geladen_op) "
+                  "VALUES (?, ?, ?, ?, ?)",
+    "databronnen": "INSERT INTO databronnen VALUES (?, ?, ?, ?, ?, ?)",
+    "verbindingen": "INSERT INTO verbindingen VALUES (?, ?, ?, ?, ?, ?)",
+    "custom_sql": "INSERT INTO custom_sql VALUES (?, ?, ?, ?, ?)",
+    "kolommen": "INSERT INTO kolommen VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "berekende_velden": "INSERT INTO berekende_velden VALUES (?, ?, ?, ?, ?, ?)",
+    "berekening_functies": "INSERT INTO berekening_functies VALUES (?, ?, ?)",
+    "werkbladen": "INSERT INTO werkbladen VALUES (?, ?, ?)",
+    "werkblad_databronnen": "INSERT INTO werkblad_databronnen VALUES (?, ?, ?)",
+    "werkblad_velden": "INSERT INTO werkblad_velden VALUES (?, ?, ?)",
+    "dashboards": "INSERT INTO dashboards VALUES (?, ?, ?)",
+    "dashboard_zones": "INSERT INTO dashboard_zones VALUES (?, ?, ?, ?, ?)",
+    "pakket_bestanden": "INSERT INTO pakket_bestanden VALUES (?, ?, ?, ?, ?)",
+}
+
+
+class Inventaris:
+    """
+    SQLite-inventaris van analyseresultaten.
+
+    Bruikbaar als context manager. Eén Inventaris hoort bij één thread; meerdere
+    processen mogen hetzelfde bestand openen (WAL), schrijven gebeurt dan om de beurt.
+    """
+
+    def __init__(self, pad):
+        """
+        Args:
+            pad (str): Pad van het SQLite-bestand (wordt aangemaakt indien nodig), of ':memory:'.
+        """
+        self.pad = pad
+        # Autocommit; transacties worden expliciet met BEGIN IMMEDIATE geopend
+        self._verbinding = sqlite3.connect(pad, isolation_level=None, timeout=30)
+        self._verbinding.row_factory = sqlite3.Row
+        self._verbinding.execute("PRAGMA foreign_keys = ON")
+        if pad != ':memory:':
+            self._verbinding.execute("PRAGMA journal_mode = WAL")
+        self._verbinding.execute("PRAGMA synchronous = NORMAL")
+        self._verbinding.executescript(_SCHEMA)
+        self._verbinding.execute(f"PRAGMA user_version = {SCHEMA_VERSIE}")
+
+    def sluit(self):
+        self._verbinding.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sluit()
+
+    def voeg_toe(self, project_data, sleutel=None):
+        """Laadt of vervangt één werkboek. Zie voeg_toe_veel."""
+        return self.voeg_toe_veel([(sleutel, project_data)])
+
+    def voeg_toe_veel(self, resultaten):
+        """
+        Laadt of vervangt een reeks werkboeken in één transactie.
+        Args:
+            resultaten (iterable[tuple[str | None, dict]]): (sleutel, project_data)-paren.
+                Zonder sleutel wordt project_data['bestandsnaam'] gebruikt. Een bestaande
+                sleutel wordt met al zijn rijen vervangen.
+        Returns:
+            int: Het aantal geladen werkboeken.
+        """
+        resultaten = list(resultaten)
+        if not resultaten:
+            return 0
+        verbinding = self._verbinding
+        verbinding.execute("BEGIN IMMEDIATE")
+        try:
+            volgende_id = {tabel: verbinding.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabel}").fetchone()[0]
+                           for tabel in _TABELLEN_MET_ID}
+            rijen = {tabel: [] for tabel in _INVOEG_SQL}
+            sleutels = {}
+            for sleutel, project_data in resultaten:
+                sleutel = sleutel or project_data.get("bestandsnaam")
+                if sleutel is None:
+                    raise ValueError("Werkboek zonder sleutel en zonder bestandsnaam")
+                # Een sleutel die twee keer in dezelfde aanroep voorkomt: de laatste wint
+                sleutels[sleutel] = project_data
+            geladen_op = datetime.now().isoformat()
+            for sleutel, project_data in sleutels.items():
+                _voeg_rijen_toe(rijen, volgende_id, sleutel, project_data, geladen_op)
+
+            verbinding.executemany("DELETE FROM werkboeken WHERE sleutel = ?", [(s,) for s in sleutels])
+            for tabel, sql in _INVOEG_SQL.items():
+                if rijen[tabel]:
+                    verbinding.executemany(sql, rijen[tabel])
+            verbinding.execute("COMMIT")
+        except BaseException:
+            verbinding.execute("ROLLBACK")
+            raise
+        logger.info(f"{len(sleutels)} werkboek(en) geladen in inventaris {self.pad}")
+        return len(sleutels)
+
+    def laad_bestanden(self, paden, blokgrootte=500):
+        """
+        Laadt *_analyse.json(.gz) bestanden, per blok van `blokgrootte` in één transactie.
+        Onleesbare bestanden worden gelogd en overgeslagen.
+        Returns:
+            int: Het aantal geladen werkboeken.
+        """
+        geladen = 0
+        blok = []
+        for pad in paden:
+            try:
+                blok.append((None, laad_analyse_json(pad)))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Kon {pad} niet laden in de inventaris: {e}")
+                continue
+            if len(blok) >= blokgrootte:
+                geladen += self.voeg_toe_veel(blok)
+                blok = []
+        return geladen + self.voeg_toe_veel(blok)
+
+    def verwijder(self, sleutel):
+        """Verwijdert een werkboek met al zijn rijen. Returns True als het bestond."""
+        return self._verbinding.execute("DELETE FROM werkboeken WHERE sleutel = ?", (sleutel,)).rowcount > 0
+
+    def query(self, sql, parameters=()):
+        """Voert een willekeurige SELECT uit en retourneert de rijen als dicts."""
+        return [dict(rij) for rij in self._verbinding.execute(sql, parameters)]
+
+    def werkboeken_met_server(self, server):
+        """Werkboeken met minstens één verbinding naar `server`, met de betrokken databronnen."""
+        return self.query(
+            "SELECT w.sleutel, w.bestandsnaam, d.naam AS databron, v.klasse, v.dbname "
+            "FROM verbindingen v JOIN databronnen d ON d.id = v.databron_id "
+            "JOIN werkboeken w ON w.id = v.werkboek_id "
+            "WHERE v.server = ? ORDER BY w.sleutel, d.naam", (server,))
+
+    def databronnen_met_minimaal(self, aantal_kolommen):
+        """Databronnen met minstens `aantal_kolommen` kolommen, de grootste eerst."""
+        return self.query(
+            "SELECT w.sleutel, w.bestandsnaam, d.naam AS databron, d.aantal_kolommen, d.aantal_berekende_velden "
+            "FROM databronnen d JOIN werkboeken w ON w.id = d.werkboek_id "
+            "WHERE d.aantal_kolommen >= ? ORDER BY d.aantal_kolommen DESC, w.sleutel", (aantal_kolommen,))
+
+    def grootste_pakketten(self, limiet=20):
+        """
+        De grootste .twbx-pakketten van de vloot, met de gecomprimeerde grootte per type
+        (bijv. hyper, png, csv) in MB. Werkboeken zonder pakket (.twb) tellen niet mee.
+        """
+        werkboeken = self.query(
+            "SELECT w.id, w.sleutel, w.bestandsnaam, COUNT(*) AS bestanden, "
+            "ROUND(SUM(p.gecomprimeerd_bytes) / 1048576.0, 1) AS gecomprimeerd_mb, "
+            "ROUND(SUM(p.ongecomprimeerd_bytes) / 1048576.0, 1) AS ongecomprimeerd_mb "
+            "FROM pakket_bestanden p JOIN werkboeken w ON w.id = p.werkboek_id "
+            "GROUP BY w.id ORDER BY SUM(p.gecomprimeerd_bytes) DESC, w.sleutel LIMIT ?", (limiet,))
+        for werkboek in werkboeken:
+            werkboek["per_type_mb"] = {rij["type"]: rij["mb"] for rij in self.query(
+                "SELECT type, ROUND(SUM(gecomprimeerd_bytes) / 1048576.0, 1) AS mb FROM pakket_bestanden "
+                "WHERE werkboek_id = ? GROUP BY type ORDER BY SUM(gecomprimeerd_bytes) DESC", (werkboek.pop("id"),))}
+        return werkboeken
+
+    def dubbele_queries(self, min_werkboeken=2):
+        """
+        Custom SQL-fingerprints die in minstens `min_werkboeken` werkboeken voorkomen, de
+        meest gedeelde eerst. Vergelijkbare (niet identieke) queries vindt tableau_sql.sql_rapport.
+        """
+        return self.query(
+            "SELECT q.fingerprint, COUNT(*) AS aantal, COUNT(DISTINCT q.werkboek_id) AS werkboeken, "
+            "MIN(q.sql) AS sql, "
+            "(SELECT GROUP_CONCAT(DISTINCT v.server) FROM custom_sql q2 "
+            " JOIN verbindingen v ON v.databron_id = q2.databron_id "
+            " WHERE q2.fingerprint = q.fingerprint AND v.klasse != 'federated') AS servers "
+            "FROM custom_sql q GROUP BY q.fingerprint HAVING COUNT(DISTINCT q.werkboek_id) >= ? "
+            "ORDER BY werkboeken DESC, aantal DESC, q.fingerprint", (min_werkboeken,))
+
+    def aantallen(self):
+        """Het aantal rijen per tabel."""
+        return {tabel: self._verbinding.execute(f"SELECT COUNT(*) FROM {tabel}").fetchone()[0]
+                for tabel in _INVOEG_SQL}
+
+
+def _nieuw_id(volgende_id, tabel):
+    nieuw = volgende_id[tabel]
+    volgende_id[tabel] += 1
+    return nieuw
+
+
+def _voeg_rijen_toe(rijen, volgende_id, sleutel, project_data, geladen_op):
+    """Zet één project_data om naar rijen per tabel."""
+    werkboek_id = _nieuw_id(volgende_id, "werkboeken")
+    rijen["werkboeken"].append((werkboek_id, sleutel, project_data.get("bestandsnaam"),
+                                project_data.get("extract_datum"), geladen_op))
+
+    for ds in project_data.get("databronnen", []):
+        databron_id = _nieuw_id(volgende_id, "databronnen")
+        kolommen = ds.get("kolommen", [])
+        rijen["databronnen"].append((databron_id, werkboek_id, ds.get("naam"), ds.get("versie"), len(kolommen),
+                                     sum(1 for col in kolommen if col.get("is_berekend_veld"))))
+        for conn in ds.get("verbindingen", []):
+            rijen["verbindingen"].append((werkboek_id, databron_id, conn.get("class"), conn.get("dbname"),
+                                          conn.get("server"), conn.get("username")))
+        for query in ds.get("custom_sql") or []:
+            rijen["custom_sql"].append((werkboek_id, databron_id, query.get("naam"), query.get("fingerprint"),
+                                        query.get("sql")))
+        for col in kolommen:
+            kolom_id = _nieuw_id(volgende_id, "kolommen")
+            is_berekend = bool(col.get("is_berekend_veld"))
+            rijen["kolommen"].append((kolom_id, werkboek_id, databron_id, col.get("naam"), col.get("caption"),
+                                      col.get("alias"), col.get("datatype"), col.get("rol"), col.get("type"),
+                                      int(is_berekend)))
+            if is_berekend:
+                rijen["berekende_velden"].append((
+                    kolom_id, werkboek_id, col.get("formule"), col.get("complexiteit"),
+                    col.get("complexiteit_score"), json.dumps(col.get("afhankelijkheden") or [], ensure_ascii=False)))
+                for functie in col.get("gebruikte_functies") or []:
+                    rijen["berekening_functies"].append((werkboek_id, kolom_id, functie))
+
+    for ws in project_data.get("werkbladen", []):
+        werkblad_id = _nieuw_id(volgende_id, "werkbladen")
+        rijen["werkbladen"].append((werkblad_id, werkboek_id, ws.get("naam")))
+        for databron in dict.fromkeys(ws.get("gebruikte_databronnen", [])):
+            rijen["werkblad_databronnen"].append((werkboek_id, werkblad_id, databron))
+        for veld in dict.fromkeys(ws.get("gebruikte_velden_direct", [])):
+            rijen["werkblad_velden"].append((werkboek_id, werkblad_id, veld))
+
+    for dash in project_data.get("dashboards", []):
+        dashboard_id = _nieuw_id(volgende_id, "dashboards")
+        rijen["dashboards"].append((dashboard_id, werkboek_id, dash.get("naam")))
+        for zone in dash.get("objecten", []):
+            rijen["dashboard_zones"].append((werkboek_id, dashboard_id, zone.get("id"), zone.get("type"),
+                                             zone.get("naam_object")))
+
+    for bestand in (project_data.get("pakket") or {}).get("bestanden", []):
+        rijen["pakket_bestanden"].append((werkboek_id, bestand.get("naam"), bestand.get("type"),
+                                          bestand.get("gecomprimeerd_bytes", 0), bestand.get("ongecomprimeerd_bytes", 0)))
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Laad analyseresultaten in een SQLite-inventaris en bevraag die.")
+    parser.add_argument("database", help="Pad van het SQLite-bestand")
+    parser.add_argument("bestanden", nargs="*", help="*_analyse.json(.gz) bestanden, mappen of glob-patronen")
+    parser.add_argument("--sql", default=None, help="Voer deze query uit en toon het resultaat als JSON-regels")
+    parser.add_argument("--grootste-pakketten", type=int, default=None, metavar="N",
+                        help="Toon de N grootste .twbx-pakketten met hun grootte per type als JSON-regels")
+    args = parser.parse_args(argv)
+
+    paden = []
+    for bron in args.bestanden:
+        if os.path.isdir(bron):
+            paden.extend(sorted(glob.glob(os.path.join(bron, "**", "*_analyse.json*"), recursive=True)))
+        elif glob.has_magic(bron):
+            paden.extend(sorted(glob.glob(bron, recursive=True)))
+        else:
+            paden.append(bron)
+
+    with Inventaris(args.database) as inventaris:
+        if paden:
+            inventaris.laad_bestanden(paden)
+        if args.sql or args.grootste_pakketten:
+            rijen = inventaris.query(args.sql) if args.sql else inventaris.grootste_pakketten(args.grootste_pakketten)
+            for rij in rijen:
+                print(json.dumps(rij, ensure_ascii=False))
+        else:
+            print(json.dumps(inventaris.aantallen(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Schrijven en lezen van analyseresultaten als JSON.
+
+JsonSchrijver schrijft een resultaat sectie voor sectie naar een bestand, en grote
+lijsten element voor element, zodat de volledige JSON-tekst nooit in het geheugen
+staat. De analyzer geeft elke sectie aan de schrijver zodra die af is (zie
+analyse_json_schrijver en process_tableau_file), zodat het coderen gelijk oploopt
+met de analyse. Elk element wordt met json.dumps gecodeerd; in compacte modus gebruikt dat
+de C-encoder, die vele malen sneller is dan json.dump met indent. De ingesprongen
+modus levert exact dezelfde tekst op als json.dump(..., indent=4).
+Bestanden kunnen optioneel met gzip worden gecomprimeerd; laad_analyse_json leest
+beide varianten.
+Voor het bekijken van grote resultaten zoekt knoop_op_pad één knoop op en geeft
+voorbeeld() daarvan een ingekorte weergave van één niveau diep.
+"""
+import gzip
+import json
+import os
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+GZIP_SIGNATUUR = b'\x1f\x8b'
+
+# Tot deze nestingdiepte worden dicts en lijsten per element geschreven; daaronder in één keer
+_STROOM_DIEPTE = 3
+_INSPRINGING = 4
+
+
+def _open_tekst(pad, gzip_uitvoer):
+    if gzip_uitvoer:
+        # Niveau 6 is nauwelijks groter dan 9, maar een stuk sneller
+        return gzip.open(pad, 'wt', encoding='utf-8', compresslevel=6)
+    return open(pad, 'w', encoding='utf-8')
+
+
+class JsonSchrijver:
+    """
+    Schrijft een JSON-object incrementeel naar een tekststroom.
+
+    Gebruik:
+        schrijver = JsonSchrijver(f, compact=True)
+        schrijver.begin()
+        schrijver.schrijf_sectie("databronnen", databronnen)
+        ...
+        schrijver.einde()
+
+    De sleutels die al zijn geschreven staan in `geschreven`; schrijf_resterend schrijft
+    de rest van een resultaat.
+    """
+
+    def __init__(self, stroom, compact=False):
+        self._stroom = stroom
+        self.compact = compact
+        self._secties = 0
+        self.geschreven = set()
+        if compact:
+            self._dumps_opties = {"ensure_ascii": False, "separators": (',', ':')}
+            self._sleutel_scheiding = ":"
+        else:
+            self._dumps_opties = {"ensure_ascii": False, "indent": _INSPRINGING}
+            self._sleutel_scheiding = ": "
+
+    def begin(self):
+        self._stroom.write("{")
+
+    def schrijf_sectie(self, sleutel, waarde):
+        """Schrijft één sleutel van het hoofdobject, direct nadat die beschikbaar is."""
+        if self._secties:
+            self._stroom.write(",")
+        self._secties += 1
+        self.geschreven.add(sleutel)
+        self._nieuwe_regel(1)
+        self._stroom.write(json.dumps(str(sleutel), ensure_ascii=False) + self._sleutel_scheiding)
+        self._schrijf(waarde, 1)
+
+    def schrijf_resterend(self, data, behalve=()):
+        """Schrijft de secties van `data` die nog niet zijn geschreven, in hun volgorde; `behalve` nog niet."""
+        for sleutel, waarde in data.items():
+            if sleutel not in self.geschreven and sleutel not in behalve:
+                self.schrijf_sectie(sleutel, waarde)
+
+    def einde(self):
+        if self._secties:
+            self._nieuwe_regel(0)
+        self._stroom.write("}")
+
+    def _nieuwe_regel(self, niveau):
+        if not self.compact:
+            self._stroom.write("\n" + " " * (_INSPRINGING * niveau))
+
+    def _schrijf(self, waarde, niveau):
+        schrijf = self._stroom.write
+        if niveau < _STROOM_DIEPTE and isinstance(waarde, (dict, list)) and waarde:
+            is_dict = isinstance(waarde, dict)
+            schrijf("{" if is_dict else "[")
+            for i, item in enumerate(waarde.items() if is_dict else waarde):
+                if i:
+                    schrijf(",")
+                self._nieuwe_regel(niveau + 1)
+                if is_dict:
+                    sleutel, item = item
+                    schrijf(json.dumps(str(sleutel), ensure_ascii=False) + self._sleutel_scheiding)
+                self._schrijf(item, niveau + 1)
+            self._nieuwe_regel(niveau)
+            schrijf("}" if is_dict else "]")
+            return
+
+        tekst = json.dumps(waarde, **self._dumps_opties)
+        if not self.compact and niveau:
+            # Strings bevatten nooit een letterlijke newline (die wordt als \n geëscapet)
+            tekst = tekst.replace("\n", "\n" + " " * (_INSPRINGING * niveau))
+        schrijf(tekst)
+
+
+@contextmanager
+def analyse_json_schrijver(pad, compact=False, gzip_uitvoer=None):
+    """
+    Een JsonSchrijver op een tijdelijk bestand naast `pad`, voor secties die één voor één
+    beschikbaar komen. Pas als het blok zonder fout eindigt, wordt het object afgesloten
+    en vervangt het bestand `pad`; bij een fout (ook een timeout of annulering) blijft een
+    bestaand bestand ongewijzigd en wordt het tijdelijke bestand verwijderd.
+    Args:
+        pad (str): Doelpad.
+        compact (bool): Zonder inspringing en witruimte (veel kleiner en sneller).
+        gzip_uitvoer (bool): Comprimeer met gzip. Standaard als het pad op '.gz' eindigt.
+    """
+    if gzip_uitvoer is None:
+        gzip_uitvoer = str(pad).endswith('.gz')
+    tijdelijk_pad = f"{pad}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with _open_tekst(tijdelijk_pad, gzip_uitvoer) as f:
+            schrijver = JsonSchrijver(f, compact=compact)
+            schrijver.begin()
+            yield schrijver
+            schrijver.einde()
+        os.replace(tijdelijk_pad, pad)
+    except BaseException:
+        if os.path.exists(tijdelijk_pad):
+            os.remove(tijdelijk_pad)
+        raise
+
+
+def schrijf_analyse_json(data, pad, compact=False, gzip_uitvoer=None):
+    """
+    Schrijft een analyseresultaat dat al compleet is incrementeel naar een bestand.
+    Args:
+        data (dict): Het resultaat, bijv. project_data.
+        pad (str): Doelpad.
+        compact (bool): Zonder inspringing en witruimte (veel kleiner en sneller).
+        gzip_uitvoer (bool): Comprimeer met gzip. Standaard als het pad op '.gz' eindigt.
+    """
+    with analyse_json_schrijver(pad, compact=compact, gzip_uitvoer=gzip_uitvoer) as schrijver:
+        schrijver.schrijf_resterend(data)
+
+
+def laad_analyse_json(pad):
+    """Leest een analyseresultaat dat met schrijf_analyse_json is geschreven, met of zonder gzip."""
+    with open(pad, 'rb') as f:
+        is_gzip = f.read(2) == GZIP_SIGNATUUR
+    if is_gzip:
+        with gzip.open(pad, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    with open(pad, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_pad(tekst):
+    """Zet een pad als 'databronnen/0/kolommen' om naar ["databronnen", 0, "kolommen"]."""
+    return [int(deel) if deel.isdigit() else deel for deel in tekst.strip().split('/') if deel]
+
+
+def knoop_op_pad(data, pad):
+    """
+    Zoekt een knoop op in een analyseresultaat.
+    Args:
+        data (dict | list): Het resultaat, bijv. project_data.
+        pad (list): Sleutels en lijstindexen, bijv. ["databronnen", 0, "kolommen"].
+    Raises:
+        KeyError, IndexError, ValueError: Als het pad niet bestaat.
+    """
+    knoop = data
+    for deel in pad:
+        if isinstance(knoop, list):
+            knoop = knoop[int(deel)]
+        elif isinstance(knoop, dict):
+            knoop = knoop[deel]
+        else:
+            raise KeyError(deel)
+    return knoop
+
+
+def voorbeeld(waarde, start=0, max_items=50, max_tekst=200):
+    """
+    Een ingekorte weergave van één knoop, zonder de hele boom te kopiëren of te coderen.
+    Van een dict of lijst worden maximaal max_items kinderen vanaf `start` getoond (een
+    lijst als dict op index, zodat de posities zichtbaar blijven); geneste dicts en
+    lijsten worden vervangen door een omschrijving als "[… 1200 items]" en lange strings
+    ingekort tot max_tekst tekens.
+    """
+    def _kort(w):
+        if isinstance(w, dict):
+            return f"{{… {len(w)} sleutels}}"
+        if isinstance(w, list):
+            return f"[… {len(w)} items]"
+        if isinstance(w, str) and len(w) > max_tekst:
+            return f"{w[:max_tekst]}… (+{len(w) - max_tekst} tekens)"
+        return w
+
+    if isinstance(waarde, dict):
+        return {sleutel: _kort(w) for sleutel, w in islice(waarde.items(), start, start + max_items)}
+    if isinstance(waarde, list):
+        return {str(i): _kort(w) for i, w in enumerate(waarde[start:start + max_items], start)}
+    return _kort(waarde)
@@ -0,0 +1,300 @@
+"""
+Prestatielinter: patronen in een werkboek die op Tableau Server traag zijn.
+
+De regels werken op het analyseresultaat (project_data) en hebben dus geen eigen
+parse nodig; ze werken ook op een ingelezen *_analyse.json en in de Streamlit-app:
+
+- veel_fixed_lod: veel FIXED LOD-expressies (elk een eigen subquery)
+- countd_op_grote_databron: COUNTD op een live of grote databron
+- tekst_zware_rijberekening: berekeningen per rij met veel tekstfuncties
+- geneste_tabelberekening: tabelberekeningen binnen of bovenop andere tabelberekeningen
+- veel_quick_filters: veel filterkaarten op een werkblad of een dashboard
+- live_zonder_extract: databronnen met een live databaseverbinding en geen extract
+- veel_zones: dashboards met zeer veel zones
+
+Elke bevinding heeft een ernst (laag, middel, hoog). De risicoscore van een
+werkboek is de som van de gewichten van zijn bevindingen, per regel begrensd, zodat
+werkboeken over de hele vloot op risico kunnen worden gerangschikt. Een *_analyse.json
+van vóór analyzer-versie 1.11.0 bevat geen quick filters per werkblad; daarvoor vervalt
+alleen die regel.
+
+Gebruik:
+    python tableau_linter.py backups/*.twbx resultaten/*_analyse.json --top 20 --uitvoer lint.json
+"""
+import json
+import logging
+import sys
+
+from tableau_analyzer import analyze_stream
+from tableau_formule import TABELBEREKENING_FUNCTIES, analyseer_formule
+from tableau_json import laad_analyse_json
+
+logger = logging.getLogger(__name__)
+
+ERNST_GEWICHT = {"laag": 1, "middel": 3, "hoog": 8}
+
+# Grenzen van de regels; per aanroep te overschrijven met lint_werkboek(..., drempels={...})
+STANDAARD_DREMPELS = {
+    "fixed_lod_middel": 10,
+    "fixed_lod_hoog": 30,
+    "grote_databron_kolommen": 200,
+    "groot_extract_mb": 100,
+    "tekstfuncties_per_rij": 3,
+    "quick_filters_middel": 5,
+    "quick_filters_hoog": 10,
+    "dashboard_filters_middel": 6,
+    "dashboard_filters_hoog": 12,
+    "zones_middel": 50,
+    "zones_hoog": 100,
+    # Eén regel draagt maximaal zoveel bij aan de risicoscore, hoeveel velden er ook onder vallen
+    "max_score_per_regel": 20,
+    # Risicoscore vanaf waar een werkboek als middel of hoog risico geldt
+    "risico_middel": 8,
+    "risico_hoog": 20,
+}
+
+AGGREGATIE_FUNCTIES = frozenset("""
+    ATTR AVG COLLECT CORR COUNT COUNTD COVAR COVARP MEDIAN PERCENTILE STDEV STDEVP SUM VAR VARP
+    MIN MAX RAWSQLAGG_BOOL RAWSQLAGG_DATE RAWSQLAGG_DATETIME RAWSQLAGG_INT RAWSQLAGG_REAL RAWSQLAGG_STR
+""".split())
+
+TEKST_FUNCTIES = frozenset("""
+    ASCII CHAR CONTAINS ENDSWITH FIND FINDNTH LEFT LEN LOWER LTRIM MID PROPER REPLACE RIGHT RTRIM
+    SPACE SPLIT STARTSWITH TRIM UPPER REGEXP_EXTRACT REGEXP_EXTRACT_NTH REGEXP_MATCH REGEXP_REPLACE STR
+""".split())
+
+# Verbindingsklassen van extracts, en van bestanden waarvoor een live verbinding geen databaselast geeft
+_EXTRACT_KLASSEN = frozenset({"hyper", "dataengine"})
+_BESTAND_KLASSEN = frozenset({"excel", "excel-direct", "textscan", "csv", "ogrdirect", "pdf", "json",
+                              "google-sheets", "statfile"})
+
+
+def _bevinding(regel, ernst, object_type, naam, bericht, **details):
+    bevinding = {"regel": regel, "ernst": ernst, "object_type": object_type, "object": naam, "bericht": bericht}
+    bevinding.update(details)
+    return bevinding
+
+
+def _berekende_velden(project_data):
+    """(databron, kolom, FormuleAnalyse) voor elk berekend veld met een formule."""
+    for ds in project_data.get("databronnen", []):
+        for col in ds.get("kolommen", []):
+            if col.get("is_berekend_veld") and col.get("formule"):
+                yield ds, col, analyseer_formule(col["formule"])
+
+
+def _heeft_geneste_tabelberekening(ast):
+    """True als een tabelberekening in de AST een andere tabelberekening als argument heeft."""
+    stapel = [(ast, False)]
+    while stapel:
+        knoop, binnen_tabelberekening = stapel.pop()
+        is_tabelberekening = knoop.soort == 'functie' and knoop.waarde in TABELBEREKENING_FUNCTIES
+        if is_tabelberekening and binnen_tabelberekening:
+            return True
+        stapel.extend((kind, binnen_tabelberekening or is_tabelberekening) for kind in knoop.kinderen)
+    return False
+
+
+def _extract_mb(ds, pakket_grootten):
+    """De (uitgepakte) grootte van het extract van een databron in MB, als het pakket dat bevat."""
+    totaal = 0
+    for conn in ds.get("verbindingen", []):
+        if conn.get("class") in _EXTRACT_KLASSEN and conn.get("dbname"):
+            totaal += pakket_grootten.get(conn["dbname"].replace('\\', '/'), 0)
+    return totaal / (1024 * 1024)
+
+
+def _live_verbindingen(ds):
+    return [conn for conn in ds.get("verbindingen", [])
+            if conn.get("class") and conn["class"] != "federated"
+            and conn["class"] not in _EXTRACT_KLASSEN and conn["class"] not in _BESTAND_KLASSEN]
+
+
+def _regels_databronnen(project_data, drempels, pakket_grootten):
+    bevindingen = []
+    for ds in project_data.get("databronnen", []):
+        live = _live_verbindingen(ds)
+        heeft_extract = any(conn.get("class") in _EXTRACT_KLASSEN for conn in ds.get("verbindingen", []))
+        if live and not heeft_extract:
+            servers = sorted({f"{conn['class']}:{conn.get('server') or ''}" for conn in live})
+            bevindingen.append(_bevinding(
+                "live_zonder_extract", "middel", "databron", ds.get("naam"),
+                "Live databaseverbinding zonder extract; elke interactie is een query op de database.",
+                servers=servers))
+
+        countd_velden = [col.get("naam") for col in ds.get("kolommen", [])
+                         if col.get("is_berekend_veld") and col.get("formule")
+                         and "COUNTD" in analyseer_formule(col["formule"]).functies]
+        if not countd_velden:
+            continue
+        extract_mb = _extract_mb(ds, pakket_grootten)
+        if extract_mb >= drempels["groot_extract_mb"]:
+            ernst, reden = "hoog", f"een extract van {extract_mb:.0f} MB"
+        elif live and not heeft_extract:
+            ernst, reden = "middel", "een live verbinding"
+        elif len(ds.get("kolommen", [])) >= drempels["grote_databron_kolommen"]:
+            ernst, reden = "middel", f"{len(ds['kolommen'])} kolommen"
+        else:
+            continue
+        bevindingen.append(_bevinding(
+            "countd_op_grote_databron", ernst, "databron", ds.get("naam"),
+            f"COUNTD in {len(countd_velden)} berekend(e) veld(en) op een databron met {reden}.",
+            velden=countd_velden))
+    return bevindingen
+
+
+def _regels_berekeningen(project_data, drempels):
+    bevindingen = []
+    fixed_velden = []
+    tabelberekening_velden = {}
+    for ds, col, analyse in _berekende_velden(project_data):
+        if analyse.tabelberekeningen:
+            tabelberekening_velden[(ds.get("naam"), col.get("naam"))] = (col, analyse)
+        fixed = analyse.lod_types.count("FIXED")
+        if fixed:
+            fixed_velden.append((col.get("naam"), fixed))
+
+        functies = analyse.functies
+        is_rijniveau = (not analyse.lod_types and not analyse.tabelberekeningen
+                        and not any(f in AGGREGATIE_FUNCTIES for f in functies))
+        tekstfuncties = [f for f in functies if f in TEKST_FUNCTIES]
+        if is_rijniveau and len(tekstfuncties) >= drempels["tekstfuncties_per_rij"]:
+            met_regex = any(f.startswith("REGEXP_") for f in tekstfuncties)
+            bevindingen.append(_bevinding(
+                "tekst_zware_rijberekening", "middel" if met_regex else "laag", "veld", col.get("naam"),
+                f"Berekening per rij met {len(tekstfuncties)} tekstfuncties"
+                + (" waaronder reguliere expressies" if met_regex else "") + "; wordt voor elke rij uitgevoerd.",
+                databron=ds.get("naam"), functies=sorted(set(tekstfuncties))))
+
+    totaal_fixed = sum(aantal for _, aantal in fixed_velden)
+    if totaal_fixed >= drempels["fixed_lod_middel"]:
+        bevindingen.append(_bevinding(
+            "veel_fixed_lod", "hoog" if totaal_fixed >= drempels["fixed_lod_hoog"] else "middel",
+            "werkboek", project_data.get("bestandsnaam"),
+            f"{totaal_fixed} FIXED LOD-expressies in {len(fixed_velden)} velden; elke expressie is een eigen subquery.",
+            velden=[naam for naam, _ in sorted(fixed_velden, key=lambda v: -v[1])[:10]]))
+
+    for (ds_naam, veld), (col, analyse) in tabelberekening_velden.items():
+        genest_in_formule = analyse.ast is not None and _heeft_geneste_tabelberekening(analyse.ast)
+        bovenop = [afh for afh in col.get("afhankelijkheden") or []
+                   if (ds_naam, afh) in tabelberekening_velden and afh != veld]
+        if genest_in_formule or bovenop:
+            bericht = ("Tabelberekening genest in een andere tabelberekening" if genest_in_formule
+                       else f"Tabelberekening bovenop andere tabelberekening(en): {', '.join(bovenop)}")
+            bevindingen.append(_bevinding(
+                "geneste_tabelberekening", "middel", "veld", veld,
+                bericht + "; wordt na de query in Tableau uitgerekend over de hele resultaatset.",
+                databron=ds_naam))
+    return bevindingen
+
+
+def _regels_filters_en_zones(project_data, drempels):
+    bevindingen = []
+    for ws in project_data.get("werkbladen", []):
+        aantal = ws.get("quick_filters") or 0
+        if aantal >= drempels["quick_filters_middel"]:
+            bevindingen.append(_bevinding(
+                "veel_quick_filters", "hoog" if aantal >= drempels["quick_filters_hoog"] else "middel",
+                "werkblad", ws.get("naam"),
+                f"{aantal} quick filters; elk filter vraagt zijn eigen lijst met waarden op.", aantal=aantal))
+
+    for dash in project_data.get("dashboards", []):
+        objecten = dash.get("objecten") or []
+        filters = sum(1 for obj in objecten if obj.get("type") == "filter")
+        if filters >= drempels["dashboard_filters_middel"]:
+            bevindingen.append(_bevinding(
+                "veel_quick_filters", "hoog" if filters >= drempels["dashboard_filters_hoog"] else "middel",
+                "dashboard", dash.get("naam"),
+                f"{filters} quick filters op het dashboard.", aantal=filters))
+        if len(objecten) >= drempels["zones_middel"]:
+            bevindingen.append(_bevinding(
+                "veel_zones", "hoog" if len(objecten) >= drempels["zones_hoog"] else "middel",
+                "dashboard", dash.get("naam"),
+                f"{len(objecten)} zones; elke zone moet worden opgebouwd en gerenderd.", aantal=len(objecten)))
+    return bevindingen
+
+
+def lint_werkboek(project_data, drempels=None):
+    """
+    Past alle regels toe op één werkboek.
+    Args:
+        project_data (dict): Een verrijkt analyseresultaat.
+        drempels (dict): Overschrijft waarden uit STANDAARD_DREMPELS.
+    Returns:
+        dict: bestandsnaam, risicoscore, risico (laag/middel/hoog), aantallen per
+            ernst, of de quick filters per werkblad bekend waren en de bevindingen
+            (ernstigste eerst).
+    """
+    drempels = dict(STANDAARD_DREMPELS, **(drempels or {}))
+    pakket_grootten = {bestand["naam"]: bestand["ongecomprimeerd_bytes"]
+                       for bestand in (project_data.get("pakket") or {}).get("bestanden", [])}
+    bevindingen = (_regels_databronnen(project_data, drempels, pakket_grootten)
+                   + _regels_berekeningen(project_data, drempels)
+                   + _regels_filters_en_zones(project_data, drempels))
+    bevindingen.sort(key=lambda b: -ERNST_GEWICHT[b["ernst"]])
+    per_regel = {}
+    for bevinding in bevindingen:
+        per_regel[bevinding["regel"]] = per_regel.get(bevinding["regel"], 0) + ERNST_GEWICHT[bevinding["ernst"]]
+    score = sum(min(gewicht, drempels["max_score_per_regel"]) for gewicht in per_regel.values())
+    if score >= drempels["risico_hoog"]:
+        risico = "hoog"
+    elif score >= drempels["risico_middel"]:
+        risico = "middel"
+    else:
+        risico = "laag"
+    return {
+        "bestandsnaam": project_data.get("bestandsnaam"),
+        "risicoscore": score,
+        "risico": risico,
+        "per_ernst": {ernst: sum(1 for b in bevindingen if b["ernst"] == ernst) for ernst in ERNST_GEWICHT},
+        "quick_filters_per_werkblad": all("quick_filters" in ws for ws in project_data.get("werkbladen", [])),
+        "bevindingen": bevindingen,
+    }
+
+
+def lint_bestand(pad, drempels=None, streaming=True):
+    """Lint een .twb/.twbx (na een analyse) of een *_analyse.json(.gz)."""
+    if pad.lower().endswith(('.twb', '.twbx')):
+        return lint_werkboek(analyze_stream(pad, streaming=streaming), drempels)
+    return lint_werkboek(laad_analyse_json(pad), drempels)
+
+
+def rangschik(rapporten):
+    """Sorteert lintrapporten van veel werkboeken op risicoscore, het hoogste risico eerst."""
+    return sorted(rapporten, key=lambda r: (-r["risicoscore"], r.get("bestandsnaam") or ""))
+
+
+def main(argv=None):
+    import argparse
+    import glob
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Zoek patronen in Tableau werkboeken die op Server traag zijn.")
+    parser.add_argument("bestanden", nargs="+", help=".twb/.twbx of *_analyse.json(.gz) bestanden of glob-patronen")
+    parser.add_argument("--top", type=int, default=None, help="Toon alleen de N werkboeken met het hoogste risico")
+    parser.add_argument("--uitvoer", default=None, help="Schrijf alle rapporten als JSON naar dit pad")
+    args = parser.parse_args(argv)
+
+    paden = [pad for bron in args.bestanden for pad in (sorted(glob.glob(bron)) if glob.has_magic(bron) else [bron])]
+    rapporten = []
+    for pad in paden:
+        try:
+            rapport = lint_bestand(pad)
+        except Exception as e:
+            logger.warning(f"Kon {pad} niet linten: {type(e).__name__}: {e}")
+            continue
+        rapport["pad"] = pad
+        rapporten.append(rapport)
+    rapporten = rangschik(rapporten)
+
+    for rapport in rapporten[:args.top]:
+        print(f"{rapport['risicoscore']:>4}  {rapport['risico']:<6}  {rapport['pad']}")
+        for bevinding in rapport["bevindingen"]:
+            print(f"        [{bevinding['ernst']}] {bevinding['regel']}: {bevinding['object']} - {bevinding['bericht']}")
+    if args.uitvoer:
+        with open(args.uitvoer, 'w', encoding='utf-8') as f:
+            json.dump(rapporten, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
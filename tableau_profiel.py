@@ -0,0 +1,147 @@
+"""
+Instrumentatie van de analyse: tijd, aantallen en geheugen per fase.
+
+FaseMeter registreert per fase (namespaces, parsen, databronnen, ...) de wandtijd,
+de groei van het piek-RSS, de Python-piek (als tracemalloc actief is) en door de
+fase zelf aangeleverde aantallen. Elke afgeronde fase wordt ook als gestructureerd
+logrecord uitgestuurd: het attribuut `analyse_fase` op het LogRecord bevat de meting.
+Met profileer() worden daarnaast cProfile- en tracemalloc-rapporten weggeschreven.
+cProfile, pstats en tracemalloc worden pas geladen als er echt gemeten wordt, zodat
+een analyse zonder instrumentatie er bij het opstarten niet voor betaalt.
+"""
+import logging
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# FaseMeter zet de tracemalloc-piek per fase terug; de hoogste waarde daarvoor wordt hier bewaard
+_python_piek_voor_reset = 0
+
+
+def _piek_rss_mb():
+    """Hoogwatermerk van het resident geheugen van dit proces in MB, of None als dat niet beschikbaar is."""
+    if resource is None:
+        return None
+    piek = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux rapporteert KB, macOS bytes
+    return round(piek / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class FaseMeter:
+    """Verzamelt metingen per fase van één analyse."""
+
+    def __init__(self, bestandsnaam=None):
+        self.bestandsnaam = bestandsnaam
+        self.fases = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def fase(self, naam):
+        """
+        Meet één fase. De context levert een dict op waarin de fase aantallen kan
+        bijhouden, bijv. `meting["elementen"] = 1200`.
+        """
+        global _python_piek_voor_reset
+        import tracemalloc
+        meting = {"fase": naam}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            _python_piek_voor_reset = max(_python_piek_voor_reset, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        rss_voor = _piek_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield meting
+        finally:
+            meting["duur_s"] = round(time.perf_counter() - start, 4)
+            rss_na = _piek_rss_mb()
+            if rss_na is not None:
+                meting["piek_rss_mb"] = rss_na
+                meting["rss_groei_mb"] = round(rss_na - rss_voor, 1)
+            if tracing:
+                meting["python_piek_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            self.fases.append(meting)
+            logger.info(f"Fase '{naam}' van {self.bestandsnaam} in {meting['duur_s']}s",
+                        extra={"analyse_fase": dict(meting, bestandsnaam=self.bestandsnaam)})
+
+    def naar_dict(self):
+        """De metingen als serialiseerbare sectie voor project_data['_metrics']."""
+        return {
+            "fases": [dict(meting) for meting in self.fases],
+            "totaal_s": round(time.perf_counter() - self._start, 4),
+            "piek_rss_mb": _piek_rss_mb(),
+        }
+
+
+class _GeenMeter:
+    """Vervanger van FaseMeter als instrumentatie uit staat; kost vrijwel niets."""
+
+    bestandsnaam = None
+    fases = ()
+
+    def fase(self, naam):
+        return nullcontext({})
+
+
+GEEN_METER = _GeenMeter()
+
+
+def maak_meter(metrics, bestandsnaam=None):
+    """
+    Zet de `metrics`-parameter van de analysefuncties om naar een meter.
+    Args:
+        metrics (bool | FaseMeter): True voor een nieuwe meter, een bestaande meter om
+            fases aan toe te voegen, of False/None/GEEN_METER voor geen instrumentatie.
+    """
+    if isinstance(metrics, FaseMeter):
+        if metrics.bestandsnaam is None:
+            metrics.bestandsnaam = bestandsnaam
+        return metrics
+    if not metrics or metrics is GEEN_METER:
+        return GEEN_METER
+    return FaseMeter(bestandsnaam)
+
+
+@contextmanager
+def profileer(uitvoer_prefix, top=40):
+    """
+    Profileert het blok met cProfile en tracemalloc.
+    Schrijft `<prefix>.prof` (te openen met pstats of snakeviz) en `<prefix>.txt` met
+    de duurste functies (cumulatief) en de grootste allocatieplekken.
+    """
+    global _python_piek_voor_reset
+    import cProfile
+    import pstats
+    import tracemalloc
+    profiler = cProfile.Profile()
+    _python_piek_voor_reset = 0
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(10)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        python_piek = max(tracemalloc.get_traced_memory()[1], _python_piek_voor_reset)
+        if not was_tracing:
+            tracemalloc.stop()
+
+        profiler.dump_stats(f"{uitvoer_prefix}.prof")
+        with open(f"{uitvoer_prefix}.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Python piekgeheugen (tracemalloc): {python_piek / (1024 * 1024):.1f} MB\n")
+            f.write(f"Piek RSS: {_piek_rss_mb()} MB\n\n")
+            f.write("== cProfile, gesorteerd op cumulatieve tijd ==\n")
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(top)
+            f.write("\n== tracemalloc, grootste allocatieplekken ==\n")
+            for statistiek in snapshot.statistics("lineno")[:top]:
+                f.write(f"{statistiek}\n")
+        logger.info(f"Profiel opgeslagen in {uitvoer_prefix}.prof en {uitvoer_prefix}.txt")
@@ -0,0 +1,510 @@
+"""
+Lokale HTTP-service voor analyses.
+
+Eén langlopend proces neemt werkboeken aan via HTTP en analyseert ze met een vaste
+pool van workers, zodat aanroepers niet per werkboek een interpreter hoeven te
+starten en tableau_analyzer, lxml e.d. hoeven te importeren. Alleen de stdlib wordt
+gebruikt.
+
+Endpoints:
+    POST /analyseer?bestandsnaam=Book1.twbx[&secties=databronnen,werkbladen][&streaming=0]
+        De body is het ruwe werkboek (Content-Length of chunked). De upload wordt in
+        blokken naar een tijdelijk bestand geschreven en tegelijk gehasht; het
+        volledige bestand staat dus nooit in het geheugen. Antwoord 202 met het id van
+        de taak, of 200 als een identieke aanvraag al klaar is. Het id is de
+        inhoudshash (gelijk aan de sleutel van tableau_cache.AnalyseCache), dus
+        dezelfde upload levert altijd dezelfde taak op. Is de wachtrij vol, dan volgt
+        503 met Retry-After.
+    GET /status/<id>
+        Status van de taak: wachtend, bezig, klaar of fout.
+    GET /resultaat/<id>[?wacht=30]
+        Het analyseresultaat als compacte JSON (200), 202 zolang de taak nog loopt, of
+        500 met de foutmelding. Met `wacht` blokkeert het verzoek maximaal zoveel
+        seconden tot de taak klaar is.
+    GET /gezondheid
+        Bezetting van de wachtrij en de workers.
+
+Gebruik:
+    python tableau_service.py --poort 8765 --workers 4 --max-wachtrij 32 --cache-map ./cache
+
+    curl --data-binary @Book1.twbx "http://127.0.0.1:8765/analyseer?bestandsnaam=Book1.twbx"
+    curl "http://127.0.0.1:8765/resultaat/<id>?wacht=60"
+
+Vanuit asyncio kan de server in een thread draaien:
+    await asyncio.to_thread(server.serve_forever)
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import tableau_analyzer
+from tableau_analyzer import analyze_stream, normaliseer_secties
+from tableau_cache import sleutel_hasher
+
+logger = logging.getLogger(__name__)
+
+_LEES_BLOK = 256 * 1024
+
+# Per worker één cache-instantie, zoals in tableau_batch
+_worker_cache = None
+
+
+class WachtrijVol(Exception):
+    """Wordt opgegooid als er geen plaats meer is in de wachtrij van de service."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Wachtrij vol, probeer het over {retry_after}s opnieuw")
+        self.retry_after = retry_after
+
+
+class UploadTeGroot(Exception):
+    """Wordt opgegooid als een upload groter is dan de ingestelde limiet."""
+
+
+def _init_worker(log_niveau, cache_config):
+    """Initialiseert een worker: logniveau van het hoofdproces en de gedeelde cache."""
+    global _worker_cache
+    tableau_analyzer.logger.setLevel(log_niveau)
+    _worker_cache = None
+    if cache_config is not None:
+        from tableau_cache import AnalyseCache
+        _worker_cache = AnalyseCache(*cache_config)
+
+
+def _analyseer_taak(pad, bestandsnaam, streaming, secties):
+    """
+    Analyseert één upload (in een worker) en retourneert het resultaat als compacte JSON-bytes.
+    Het coderen gebeurt in de worker: bytes zijn veel goedkoper terug te sturen naar
+    het hoofdproces dan een grote dict, en elk verzoek om het resultaat kan ze direct versturen.
+    """
+    project_data = analyze_stream(pad, bestandsnaam=bestandsnaam, streaming=streaming,
+                                  cache=_worker_cache, secties=secties)
+    return json.dumps(project_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class Taak:
+    """Eén analyse-aanvraag in de service."""
+
+    def __init__(self, id, bestandsnaam, grootte):
+        self.id = id
+        self.bestandsnaam = bestandsnaam
+        self.grootte = grootte
+        self.aangemaakt = time.time()
+        self.klaar_op = None
+        self.duur_s = None
+        self.resultaat = None # compacte JSON-bytes
+        self.fout = None
+        self.future = None
+        self.gereed = threading.Event()
+
+    @property
+    def status(self):
+        if self.gereed.is_set():
+            return "fout" if self.fout is not None else "klaar"
+        if self.future is not None and self.future.running():
+            return "bezig"
+        return "wachtend"
+
+    def naar_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "bestandsnaam": self.bestandsnaam,
+            "grootte": self.grootte,
+            "aangemaakt": self.aangemaakt,
+            "klaar_op": self.klaar_op,
+            "duur_s": self.duur_s,
+            "fout": self.fout,
+        }
+
+
+class AnalyseService:
+    """
+    Beheert de wachtrij, de workerpool en de resultaten van de HTTP-service.
+
+    De wachtrij is begrensd: er staan nooit meer dan `workers + max_wachtrij` taken
+    open (wachtend of bezig). Een nieuwe aanvraag daarboven wordt direct geweigerd met
+    WachtrijVol in plaats van het geheugen en de schijf te laten vollopen. Afgeronde
+    taken worden bewaard tot er meer dan `max_bewaard` zijn; de oudste gaan dan eerst.
+    """
+
+    def __init__(self, workers=None, max_wachtrij=16, procespool=True, streaming=True, cache_map=None,
+                 cache_max_mb=1024, max_bewaard=256, max_upload_mb=512, werk_map=None):
+        """
+        Args:
+            workers (int): Aantal workers. Standaard os.cpu_count().
+            max_wachtrij (int): Aantal taken dat mag wachten bovenop de taken die in bewerking zijn.
+            procespool (bool): Analyseer in aparte processen (standaard; benut alle cores).
+                Met False worden threads in dit proces gebruikt, wat geen opstartkosten heeft
+                maar door de GIL weinig parallel rekent.
+            streaming (bool): Standaard voor de parser (zie analyseer_tableau_bestand); per
+                aanvraag te wijzigen met `?streaming=0|1`.
+            cache_map (str): Optionele map voor een gedeelde AnalyseCache van alle workers.
+            cache_max_mb (int): Maximale grootte van die cache in MB.
+            max_bewaard (int): Aantal afgeronde taken waarvan het resultaat bewaard blijft.
+            max_upload_mb (int): Maximale grootte van een upload in MB.
+            werk_map (str): Map voor de tijdelijke uploads. Standaard de systeem-tempmap.
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_wachtrij = max(0, max_wachtrij)
+        self.procespool = procespool
+        self.streaming = streaming
+        self.max_bewaard = max_bewaard
+        self.max_upload_bytes = max_upload_mb * 1024 * 1024
+        self.werk_map = werk_map
+        self._cache_config = (cache_map, cache_max_mb * 1024 * 1024) if cache_map else None
+        self._lock = threading.Lock()
+        self._taken = OrderedDict() # id -> Taak; afgeronde taken in volgorde van afronding
+        self._open = 0
+        self._verwerkt = 0
+        self._geweigerd = 0
+        self._gemiddelde_duur = None
+        self._executor = None
+
+    @property
+    def capaciteit(self):
+        return self.workers + self.max_wachtrij
+
+    def start(self):
+        """Start de workerpool. Een procespool start zijn processen pas bij de eerste taak."""
+        if self._executor is not None:
+            return
+        initargs = (tableau_analyzer.logger.level, self._cache_config)
+        if self.procespool:
+            import multiprocessing
+            # spawn: forken vanuit een proces met lopende serverthreads is niet veilig
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker, initargs=initargs)
+        else:
+            _init_worker(*initargs)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analyse")
+        logger.info(f"Analyseservice gestart: {self.workers} worker(s), wachtrij {self.max_wachtrij}")
+
+    def stop(self, wacht=True):
+        """Stopt de workerpool; wachtende taken worden geannuleerd."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wacht, cancel_futures=True)
+            self._executor = None
+
+    def sleutel_opties(self, bestandsnaam, secties):
+        """De opties die, net als in analyze_stream, in de inhoudshash meetellen."""
+        opties = {"bestandsnaam": bestandsnaam}
+        if secties is not None:
+            opties["secties"] = sorted(secties)
+        return opties
+
+    def _retry_after(self):
+        """Schatting in seconden van wanneer er weer een plaats vrij is."""
+        duur = self._gemiddelde_duur or 1.0
+        return max(1, math.ceil(duur * max(1, self._open - self.workers + 1) / self.workers))
+
+    def ontvang(self, stroom, lengte, bestandsnaam, secties=None, streaming=None):
+        """
+        Neemt een upload aan en dient hem in als taak.
+        Args:
+            stroom: Binair file-like object waaruit de upload gelezen wordt.
+            lengte (int | None): Aantal bytes, of None voor chunked transfer encoding.
+            bestandsnaam (str): Oorspronkelijke bestandsnaam.
+            secties (frozenset | None): Zie normaliseer_secties.
+            streaming (bool | None): Parser per aanvraag; None voor de standaard van de service.
+        Returns:
+            tuple[Taak, bool]: De taak en of die nieuw is (False bij een duplicaat).
+        Raises:
+            WachtrijVol: Als er geen plaats is in de wachtrij.
+            UploadTeGroot: Als de upload groter is dan max_upload_mb.
+        """
+        if lengte is not None and lengte > self.max_upload_bytes:
+            raise UploadTeGroot(f"Upload van {lengte} bytes is groter dan de limiet van {self.max_upload_bytes}")
+        # Vroeg weigeren: bij een volle wachtrij hoeft de upload niet eerst naar schijf
+        with self._lock:
+            if self._open >= self.capaciteit:
+                self._geweigerd += 1
+                raise WachtrijVol(self._retry_after())
+
+        h = sleutel_hasher(**self.sleutel_opties(bestandsnaam, secties))
+        suffix = os.path.splitext(bestandsnaam)[1] or ".twb"
+        tijdelijk = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, dir=self.werk_map, delete=False)
+        try:
+            with tijdelijk:
+                grootte = 0
+                for blok in (_lees_chunked(stroom) if lengte is None else _lees_blokken(stroom, lengte)):
+                    grootte += len(blok)
+                    if grootte > self.max_upload_bytes:
+                        raise UploadTeGroot(f"Upload is groter dan de limiet van {self.max_upload_bytes} bytes")
+                    h.update(blok)
+                    tijdelijk.write(blok)
+            taak, nieuw = self._dien_in(h.hexdigest(), tijdelijk.name, bestandsnaam, grootte,
+                                        self.streaming if streaming is None else streaming, secties)
+        except BaseException:
+            _verwijder(tijdelijk.name)
+            raise
+        if not nieuw:
+            _verwijder(tijdelijk.name)
+        return taak, nieuw
+
+    def _dien_in(self, id, pad, bestandsnaam, grootte, streaming, secties):
+        with self._lock:
+            bestaand = self._taken.get(id)
+            if bestaand is not None and bestaand.fout is None:
+                logger.info(f"Dubbele aanvraag voor {bestandsnaam} ({id[:12]}), bestaande taak wordt gebruikt")
+                return bestaand, False
+            if self._open >= self.capaciteit:
+                self._geweigerd += 1
+                raise WachtrijVol(self._retry_after())
+            if self._executor is None:
+                raise RuntimeError("De service is niet gestart")
+            taak = Taak(id, bestandsnaam, grootte)
+            self._taken.pop(id, None)
+            self._taken[id] = taak
+            self._open += 1
+            taak.future = self._executor.submit(_analyseer_taak, pad, bestandsnaam, streaming, secties)
+        taak.future.add_done_callback(lambda future: self._rond_af(taak, pad, future))
+        return taak, True
+
+    def _rond_af(self, taak, pad, future):
+        _verwijder(pad)
+        try:
+            taak.resultaat = future.result()
+        except BaseException as e:
+            # Ook CancelledError bij het stoppen en BrokenProcessPool als een worker hard is gestopt
+            taak.fout = f"{type(e).__name__}: {e}"
+            logger.error(f"Analyse van {taak.bestandsnaam} ({taak.id[:12]}) mislukt: {taak.fout}")
+        taak.klaar_op = time.time()
+        taak.duur_s = round(taak.klaar_op - taak.aangemaakt, 3)
+        taak.future = None
+        with self._lock:
+            self._open -= 1
+            self._verwerkt += 1
+            duur = taak.duur_s
+            self._gemiddelde_duur = duur if self._gemiddelde_duur is None else 0.8 * self._gemiddelde_duur + 0.2 * duur
+            if self._taken.get(taak.id) is taak:
+                self._taken.move_to_end(taak.id)
+            afgerond = [t for t in self._taken.values() if t.klaar_op is not None]
+            for oud in afgerond[:max(0, len(afgerond) - self.max_bewaard)]:
+                del self._taken[oud.id]
+        taak.gereed.set()
+
+    def taak(self, id):
+        """Retourneert de taak met dit id, of None als die onbekend of al opgeruimd is."""
+        with self._lock:
+            return self._taken.get(id)
+
+    def gezondheid(self):
+        with self._lock:
+            open_taken = [t for t in self._taken.values() if t.klaar_op is None]
+            bezig = sum(1 for t in open_taken if t.status == "bezig")
+            return {
+                "workers": self.workers,
+                "procespool": self.procespool,
+                "capaciteit": self.capaciteit,
+                "bezig": bezig,
+                "wachtend": self._open - bezig,
+                "verwerkt": self._verwerkt,
+                "geweigerd": self._geweigerd,
+                "bewaard": len(self._taken) - len(open_taken),
+                "gemiddelde_duur_s": round(self._gemiddelde_duur, 3) if self._gemiddelde_duur is not None else None,
+            }
+
+
+def _verwijder(pad):
+    try:
+        os.remove(pad)
+    except FileNotFoundError:
+        pass
+
+
+def _lees_blokken(stroom, lengte):
+    """Leest precies `lengte` bytes in blokken."""
+    rest = lengte
+    while rest > 0:
+        blok = stroom.read(min(_LEES_BLOK, rest))
+        if not blok:
+            raise ValueError(f"Upload afgebroken na {lengte - rest} van {lengte} bytes")
+        rest -= len(blok)
+        yield blok
+
+
+def _lees_chunked(stroom):
+    """Decodeert een body met Transfer-Encoding: chunked."""
+    while True:
+        regel = stroom.readline(1024)
+        try:
+            lengte = int(regel.split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            raise ValueError(f"Ongeldige chunkgrootte: {regel[:40]!r}")
+        if lengte == 0:
+            # Eventuele trailers tot en met de lege regel overslaan
+            while stroom.readline(1024) not in (b'\r\n', b'\n', b''):
+                pass
+            return
+        yield from _lees_blokken(stroom, lengte)
+        stroom.readline(16) # CRLF na de chunk
+
+
+class _AnalyseHandler(BaseHTTPRequestHandler):
+    server_version = "TableauAnalyseService/" + tableau_analyzer.ANALYZER_VERSIE
+    protocol_version = "HTTP/1.1"
+    # Een stilgevallen upload of inactieve keep-alive verbinding houdt geen thread vast
+    timeout = 60
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _stuur(self, code, inhoud, content_type="application/json", headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(inhoud)))
+        for naam, waarde in (headers or {}).items():
+            self.send_header(naam, waarde)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(inhoud)
+
+    def _stuur_json(self, code, data, headers=None):
+        self._stuur(code, json.dumps(data, ensure_ascii=False).encode('utf-8'), headers=headers)
+
+    def _fout(self, code, melding, headers=None):
+        self._stuur_json(code, {"fout": melding}, headers)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != "/analyseer":
+            self.close_connection = True
+            return self._fout(HTTPStatus.NOT_FOUND, f"Onbekend pad: {url.path}")
+        # Na een geweigerde of afgebroken upload staat de rest van de body nog op de verbinding
+        self.close_connection = True
+        query = parse_qs(url.query)
+        bestandsnaam = os.path.basename(query.get("bestandsnaam", ["upload.twbx"])[0]) or "upload.twbx"
+        try:
+            secties = normaliseer_secties(query["secties"][0]) if "secties" in query else None
+        except ValueError as e:
+            return self._fout(HTTPStatus.BAD_REQUEST, str(e))
+        streaming = query["streaming"][0] not in ("0", "false", "nee") if "streaming" in query else None
+
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            lengte = None
+        elif self.headers.get("Content-Length") is not None:
+            try:
+                lengte = int(self.headers["Content-Length"])
+            except ValueError:
+                return self._fout(HTTPStatus.BAD_REQUEST, "Ongeldige Content-Length")
+        else:
+            return self._fout(HTTPStatus.LENGTH_REQUIRED, "Content-Length of chunked transfer encoding vereist")
+
+        try:
+            taak, nieuw = self.service.ontvang(self.rfile, lengte, bestandsnaam, secties, streaming)
+        except WachtrijVol as e:
+            return self._fout(HTTPStatus.SERVICE_UNAVAILABLE, str(e), {"Retry-After": str(e.retry_after)})
+        except UploadTeGroot as e:
+            return self._fout(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e))
+        except ValueError as e:
+            return self._fout(HTTPStatus.BAD_REQUEST, str(e))
+        self.close_connection = False
+        data = dict(taak.naar_dict(), duplicaat=not nieuw)
+        code = HTTPStatus.OK if taak.gereed.is_set() else HTTPStatus.ACCEPTED
+        self._stuur_json(code, data, {"Location": f"/status/{taak.id}"})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        delen = [deel for deel in url.path.split('/') if deel]
+        if delen == ["gezondheid"]:
+            return self._stuur_json(HTTPStatus.OK, self.service.gezondheid())
+        if len(delen) != 2 or delen[0] not in ("status", "resultaat"):
+            return self._fout(HTTPStatus.NOT_FOUND, f"Onbekend pad: {url.path}")
+        taak = self.service.taak(delen[1])
+        if taak is None:
+            return self._fout(HTTPStatus.NOT_FOUND, f"Onbekende taak: {delen[1]}")
+        if delen[0] == "status":
+            return self._stuur_json(HTTPStatus.OK, taak.naar_dict())
+
+        query = parse_qs(url.query)
+        try:
+            wacht = float(query.get("wacht", ["0"])[0])
+        except ValueError:
+            return self._fout(HTTPStatus.BAD_REQUEST, "Ongeldige waarde voor wacht")
+        if wacht > 0:
+            taak.gereed.wait(min(wacht, 300))
+        if not taak.gereed.is_set():
+            return self._stuur_json(HTTPStatus.ACCEPTED, taak.naar_dict(), {"Retry-After": "1"})
+        if taak.fout is not None:
+            return self._fout(HTTPStatus.INTERNAL_SERVER_ERROR, taak.fout)
+        self._stuur(HTTPStatus.OK, taak.resultaat)
+
+    do_HEAD = do_GET
+
+
+class AnalyseServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer met een verwijzing naar de AnalyseService voor de handlers."""
+
+    daemon_threads = True
+
+    def __init__(self, adres, service):
+        super().__init__(adres, _AnalyseHandler)
+        self.service = service
+
+
+def maak_server(service, host="127.0.0.1", poort=8765):
+    """
+    Start de workerpool van de service en maakt een server die verzoeken aanneemt.
+    Roep serve_forever() aan om verzoeken te verwerken; poort 0 kiest een vrije poort
+    (zie server.server_address).
+    """
+    service.start()
+    return AnalyseServer((host, poort), service)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP-service voor het analyseren van Tableau werkboeken.")
+    parser.add_argument("--host", default="127.0.0.1", help="Adres om op te luisteren (standaard: 127.0.0.1)")
+    parser.add_argument("--poort", type=int, default=8765, help="Poort (standaard: 8765)")
+    parser.add_argument("--workers", type=int, default=None, help="Aantal workers (standaard: aantal CPU's)")
+    parser.add_argument("--max-wachtrij", dest="max_wachtrij", type=int, default=16,
+                        help="Aantal taken dat mag wachten voordat aanvragen met 503 worden geweigerd")
+    parser.add_argument("--threads", action="store_true",
+                        help="Analyseer in threads van dit proces in plaats van in een procespool")
+    parser.add_argument("--boom", action="store_true",
+                        help="Gebruik standaard de boomparser in plaats van de streaming-parser")
+    parser.add_argument("--cache-map", dest="cache_map", default=None,
+                        help="Map voor een gedeelde analyse-cache")
+    parser.add_argument("--cache-max-mb", dest="cache_max_mb", type=int, default=1024,
+                        help="Maximale grootte van de cache in MB (standaard: 1024)")
+    parser.add_argument("--max-upload-mb", dest="max_upload_mb", type=int, default=512,
+                        help="Maximale grootte van een upload in MB (standaard: 512)")
+    parser.add_argument("--max-bewaard", dest="max_bewaard", type=int, default=256,
+                        help="Aantal afgeronde resultaten dat bewaard blijft (standaard: 256)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    service = AnalyseService(workers=args.workers, max_wachtrij=args.max_wachtrij, procespool=not args.threads,
+                             streaming=not args.boom, cache_map=args.cache_map, cache_max_mb=args.cache_max_mb,
+                             max_bewaard=args.max_bewaard, max_upload_mb=args.max_upload_mb)
+    server = maak_server(service, args.host, args.poort)
+    host, poort = server.server_address[:2]
+    logger.info(f"Luistert op http://{host}:{poort}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop(wacht=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,285 @@
+"""
+Custom SQL uit werkboeken: normalisatie, fingerprints en dubbele queries over de vloot.
+
+De parser neemt per databron de tekst van elke <relation type="text"> op (zie
+tableau_analyzer). normaliseer_sql() brengt die tekst in één regex-pass terug tot
+een canonieke vorm: commentaar weg, tekst- en getalliterals en Tableau-parameters
+vervangen door ?, een IN-lijst van literals ingekort tot (?), namen in kleine letters
+en witruimte genormaliseerd. sql_fingerprint() is een korte hash daarvan, zodat
+queries die alleen in filterwaarden, opmaak of hoofdletters verschillen dezelfde
+fingerprint krijgen.
+
+sql_rapport() groepeert de queries van veel werkboeken: eerst op fingerprint
+(identiek), daarna vergelijkbare queries via MinHash-signaturen over token-shingles
+en LSH-banden. Alleen paren die in minstens één band botsen worden met de exacte
+Jaccard-gelijkenis van hun shingles vergeleken, zodat de vloot niet paarsgewijs
+hoeft te worden doorgerekend.
+
+Gebruik:
+    python tableau_sql.py resultaten/*_analyse.json --drempel 0.8 --uitvoer dubbele_queries.json
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import sys
+
+logger = logging.getLogger(__name__)
+
+# MinHash: aantal hashfuncties, verdeeld over LSH-banden van RIJEN_PER_BAND rijen.
+# Met 16 banden van 4 rijen is de kans op een kandidaatpaar ~50% bij gelijkenis 0.5
+# en ruim 99% bij 0.8.
+MINHASH_PERMUTATIES = 64
+RIJEN_PER_BAND = 4
+SHINGLE_LENGTE = 3
+STANDAARD_DREMPEL = 0.8
+
+_PRIEM = (1 << 61) - 1
+
+_TOKEN_PATROON = re.compile(r"""
+      (?P<commentaar>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<tekst>'(?:[^']|'')*(?:'|\Z))
+    | (?P<parameter><\[?Parameters\]?\.[^>]*>)
+    | (?P<naam_quoted>"(?:[^"]|"")*(?:"|\Z)|\[[^\]]*\]|`[^`]*`)
+    | (?P<getal>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<naam>[A-Za-z_][\w$#]*)
+    | (?P<operator><>|<=|>=|!=|\|\||::|[^\s\w])
+""", re.VERBOSE | re.DOTALL | re.IGNORECASE)
+
+
+def sql_tokens(sql):
+    """
+    De genormaliseerde tokens van een query.
+    Literals en parameters worden '?', namen (ook tussen aanhalingstekens) kleine
+    letters, een lijst die alleen uit literals bestaat wordt '(?)' en een afsluitende
+    ';' vervalt.
+    """
+    tokens = []
+    for match in _TOKEN_PATROON.finditer(sql or ''):
+        soort = match.lastgroup
+        if soort == 'commentaar':
+            continue
+        if soort in ('tekst', 'parameter', 'getal'):
+            tokens.append('?')
+        elif soort in ('naam', 'naam_quoted'):
+            tokens.append(match.group().lower())
+        else:
+            tokens.append(match.group())
+            if tokens[-1] == ')':
+                _kort_literal_lijst_in(tokens)
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    return tokens
+
+
+def _kort_literal_lijst_in(tokens):
+    """Vervangt een net gesloten '( ?, ?, ... )' door '( ? )', zodat IN-lijsten van elke lengte gelijk zijn."""
+    i = len(tokens) - 2
+    while i >= 0 and tokens[i] in ('?', ','):
+        i -= 1
+    if i >= 0 and tokens[i] == '(' and len(tokens) - i > 3:
+        del tokens[i + 1:]
+        tokens.extend(('?', ')'))
+
+
+def normaliseer_sql(sql):
+    """De canonieke tekst van een query (zie sql_tokens), met enkele spaties tussen de tokens."""
+    return ' '.join(sql_tokens(sql))
+
+
+def sql_fingerprint(sql):
+    """Korte hash van de genormaliseerde query; gelijk voor queries die alleen in literals of opmaak verschillen."""
+    return hashlib.blake2b(normaliseer_sql(sql).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _shingles(tokens):
+    """Opeenvolgende groepen van SHINGLE_LENGTE tokens, als 64-bits hashes."""
+    if len(tokens) <= SHINGLE_LENGTE:
+        groepen = [tokens]
+    else:
+        groepen = [tokens[i:i + SHINGLE_LENGTE] for i in range(len(tokens) - SHINGLE_LENGTE + 1)]
+    return {int.from_bytes(hashlib.blake2b('\x00'.join(groep).encode('utf-8'), digest_size=8).digest(), 'big')
+            for groep in groepen}
+
+
+def _permutaties(aantal, seed=0):
+    rnd = random.Random(seed)
+    return [(rnd.randrange(1, _PRIEM), rnd.randrange(0, _PRIEM)) for _ in range(aantal)]
+
+
+def minhash(shingles, permutaties):
+    """MinHash-signatuur van een verzameling shingles: per (a, b) het minimum van (a*x + b) mod p."""
+    if not shingles:
+        return (0,) * len(permutaties)
+    return tuple(min((a * x + b) % _PRIEM for x in shingles) for a, b in permutaties)
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _kandidaat_paren(signaturen, rijen_per_band):
+    """Paren (i, j) met i < j waarvan de signaturen in minstens één LSH-band gelijk zijn."""
+    paren = set()
+    aantal_banden = len(signaturen[0]) // rijen_per_band if signaturen else 0
+    for band in range(aantal_banden):
+        emmers = {}
+        start = band * rijen_per_band
+        for i, signatuur in enumerate(signaturen):
+            emmers.setdefault(signatuur[start:start + rijen_per_band], []).append(i)
+        for leden in emmers.values():
+            for positie, i in enumerate(leden):
+                for j in leden[positie + 1:]:
+                    paren.add((i, j))
+    return paren
+
+
+def _vind(ouders, i):
+    while ouders[i] != i:
+        ouders[i] = ouders[ouders[i]]
+        i = ouders[i]
+    return i
+
+
+def verzamel_custom_sql(resultaten):
+    """
+    Alle custom SQL-queries uit een reeks analyseresultaten.
+    Args:
+        resultaten (iterable[dict | tuple[str, dict]]): project_data, of (werkboek, project_data)-paren.
+            Zonder werkboeknaam wordt project_data['bestandsnaam'] gebruikt.
+    Returns:
+        list[dict]: Per query het werkboek, de databron, de naam van de relatie, de
+            verbindingen (klasse, server, dbname) van de databron, de fingerprint en de SQL.
+    """
+    voorkomens = []
+    for resultaat in resultaten:
+        werkboek, project_data = resultaat if isinstance(resultaat, tuple) else (None, resultaat)
+        werkboek = werkboek or project_data.get("bestandsnaam")
+        for ds in project_data.get("databronnen", []):
+            verbindingen = [{"class": conn.get("class"), "server": conn.get("server"), "dbname": conn.get("dbname")}
+                            for conn in ds.get("verbindingen", []) if conn.get("class") != "federated"]
+            for query in ds.get("custom_sql") or []:
+                voorkomens.append({
+                    "werkboek": werkboek,
+                    "databron": ds.get("naam"),
+                    "naam": query.get("naam"),
+                    "verbindingen": verbindingen,
+                    "fingerprint": query.get("fingerprint") or sql_fingerprint(query.get("sql")),
+                    "sql": query.get("sql"),
+                })
+    return voorkomens
+
+
+def sql_rapport(resultaten, drempel=STANDAARD_DREMPEL, permutaties=MINHASH_PERMUTATIES,
+                rijen_per_band=RIJEN_PER_BAND):
+    """
+    Groepeert identieke en vergelijkbare custom SQL over een vloot van werkboeken.
+    Args:
+        resultaten: Zie verzamel_custom_sql.
+        drempel (float): Minimale Jaccard-gelijkenis (van de token-shingles) waarbij twee
+            verschillende fingerprints als vergelijkbaar in één groep komen. Met 1.0
+            worden alleen identieke fingerprints gegroepeerd.
+        permutaties, rijen_per_band: MinHash- en LSH-instellingen.
+    Returns:
+        dict: aantal_queries, unieke_queries en groepen: alleen groepen met minstens
+            twee voorkomens, de grootste eerst. Een groep bevat de fingerprints, of
+            alle voorkomens identiek zijn, de laagste gelijkenis binnen de groep, de
+            werkboeken, de servers (klasse:server/dbname), de genormaliseerde SQL van
+            de meest voorkomende fingerprint en alle voorkomens.
+    """
+    voorkomens = verzamel_custom_sql(resultaten)
+    per_fingerprint = {}
+    for voorkomen in voorkomens:
+        per_fingerprint.setdefault(voorkomen["fingerprint"], []).append(voorkomen)
+    fingerprints = list(per_fingerprint)
+    tokens = {fp: sql_tokens(per_fingerprint[fp][0]["sql"]) for fp in fingerprints}
+
+    ouders = list(range(len(fingerprints)))
+    gelijkenis = {}
+    if drempel < 1.0 and len(fingerprints) > 1:
+        shingles = [_shingles(tokens[fp]) for fp in fingerprints]
+        hashfuncties = _permutaties(permutaties)
+        signaturen = [minhash(s, hashfuncties) for s in shingles]
+        for i, j in _kandidaat_paren(signaturen, rijen_per_band):
+            score = jaccard(shingles[i], shingles[j])
+            if score >= drempel:
+                ouders[_vind(ouders, i)] = _vind(ouders, j)
+                gelijkenis[(i, j)] = score
+
+    groepen_per_wortel = {}
+    for i in range(len(fingerprints)):
+        groepen_per_wortel.setdefault(_vind(ouders, i), []).append(i)
+    laagste = {}
+    for (i, j), score in gelijkenis.items():
+        wortel = _vind(ouders, i)
+        laagste[wortel] = min(laagste.get(wortel, 1.0), score)
+
+    groepen = []
+    for wortel, leden in groepen_per_wortel.items():
+        groep_voorkomens = [v for i in leden for v in per_fingerprint[fingerprints[i]]]
+        if len(groep_voorkomens) < 2:
+            continue
+        leden.sort(key=lambda i: -len(per_fingerprint[fingerprints[i]]))
+        servers = {f"{conn['class']}:{conn['server']}/{conn['dbname']}"
+                   for v in groep_voorkomens for conn in v["verbindingen"]}
+        groepen.append({
+            "fingerprints": [fingerprints[i] for i in leden],
+            "identiek": len(leden) == 1,
+            "min_gelijkenis": round(laagste.get(wortel, 1.0), 3),
+            "aantal": len(groep_voorkomens),
+            "werkboeken": sorted({v["werkboek"] for v in groep_voorkomens if v["werkboek"] is not None}),
+            "servers": sorted(servers),
+            "sql": ' '.join(tokens[fingerprints[leden[0]]]),
+            "voorkomens": groep_voorkomens,
+        })
+    groepen.sort(key=lambda g: (-g["aantal"], g["fingerprints"][0]))
+    return {"aantal_queries": len(voorkomens), "unieke_queries": len(fingerprints), "groepen": groepen}
+
+
+def _laad_resultaat(pad, streaming=True):
+    """Laadt een analyseresultaat (.json/.json.gz) of analyseert een werkboek (.twb/.twbx)."""
+    if pad.lower().endswith(('.twb', '.twbx')):
+        from tableau_analyzer import analyze_stream  # niet bovenaan: tableau_analyzer importeert deze module
+        return analyze_stream(pad, streaming=streaming, secties="databronnen")
+    from tableau_json import laad_analyse_json
+    return laad_analyse_json(pad)
+
+
+def main(argv=None):
+    import argparse
+    import glob
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Zoek identieke en vergelijkbare custom SQL over werkboeken heen.")
+    parser.add_argument("bestanden", nargs="+", help="*_analyse.json(.gz), .twb of .twbx bestanden of glob-patronen")
+    parser.add_argument("--drempel", type=float, default=STANDAARD_DREMPEL,
+                        help="Minimale gelijkenis (0-1) voor vergelijkbare queries; 1.0 = alleen identiek")
+    parser.add_argument("--uitvoer", default=None, help="Schrijf het volledige rapport als JSON naar dit pad")
+    args = parser.parse_args(argv)
+
+    paden = [pad for bron in args.bestanden for pad in (sorted(glob.glob(bron)) if glob.has_magic(bron) else [bron])]
+    resultaten = []
+    for pad in paden:
+        try:
+            resultaten.append((pad, _laad_resultaat(pad)))
+        except Exception as e:
+            logger.warning(f"Kon {pad} niet laden: {type(e).__name__}: {e}")
+    rapport = sql_rapport(resultaten, drempel=args.drempel)
+
+    print(f"{rapport['aantal_queries']} queries, {rapport['unieke_queries']} uniek, "
+          f"{len(rapport['groepen'])} groepen met dubbele queries")
+    for groep in rapport["groepen"]:
+        soort = "identiek" if groep["identiek"] else f"vergelijkbaar (≥ {groep['min_gelijkenis']})"
+        print(f"- {groep['aantal']}x in {len(groep['werkboeken'])} werkboek(en), {soort}: {groep['sql'][:120]}")
+        for server in groep["servers"]:
+            print(f"      {server}")
+    if args.uitvoer:
+        with open(args.uitvoer, 'w', encoding='utf-8') as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Analyses op de achtergrond, met voortgang per fase en annuleren.
+
+AnalyseTaak voert analyze_stream uit in een eigen thread of op een gegeven executor.
+De invoer wordt gelezen via een stroom die de gelezen bytes telt, en de fases worden
+gevolgd met een FaseMeter; voortgang() geeft daarvan op elk moment een momentopname,
+inclusief de elementen die de streaming-parser tot nu toe heeft gezien.
+
+Annuleren is coöperatief maar snel: bij elke leesactie van de parser en aan het begin
+van elke fase wordt gecontroleerd of de taak is geannuleerd. Het parsen breekt dus
+binnen één leesblok af. Daarna verwijst niets meer naar de deels opgebouwde boom,
+project_data en de geüploade bytes, zodat dat geheugen direct vrijkomt.
+
+Gebruik:
+    taak = AnalyseTaak(inhoud, "werkboek.twbx", streaming=True).start()
+    taak.voortgang()   # {"status": "bezig", "fase": "streaming_parse", "gelezen_mb": ...}
+    taak.annuleer()
+"""
+import io
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from tableau_analyzer import analyze_stream
+from tableau_profiel import FaseMeter
+
+logger = logging.getLogger(__name__)
+
+STATUSSEN = ("wachtend", "bezig", "klaar", "fout", "geannuleerd")
+
+# Elementen uit de streaming-tellers die tijdens het parsen als voortgang worden getoond
+_LIVE_TAGS = {"datasource": "databronnen", "column": "kolommen", "worksheet": "werkbladen",
+              "dashboard": "dashboards"}
+
+
+class AnalyseGeannuleerd(BaseException):
+    """
+    Wordt in de analyse opgegooid als de taak is geannuleerd.
+    Erft van BaseException zodat de brede except-blokken in de analyzer het annuleren
+    niet als een verwerkingsfout loggen of opvangen.
+    """
+
+
+class _VoortgangsStroom:
+    """Binair file-like object dat de gelezen bytes telt en bij elke read het annuleren controleert."""
+
+    def __init__(self, stroom, taak):
+        self._stroom = stroom
+        self._taak = taak
+
+    def read(self, n=-1):
+        self._taak._controleer()
+        data = self._stroom.read(n)
+        self._taak.gelezen_bytes += len(data)
+        return data
+
+    # Bewust geen __getattr__: lxml leest een object met getvalue() of name in één keer buiten read() om
+    def seek(self, *args):
+        return self._stroom.seek(*args)
+
+    def tell(self):
+        return self._stroom.tell()
+
+    def seekable(self):
+        return self._stroom.seekable()
+
+
+class _TaakMeter(FaseMeter):
+    """FaseMeter die de lopende fase zichtbaar maakt en bij elke fase het annuleren controleert."""
+
+    def __init__(self, taak):
+        super().__init__(taak.bestandsnaam)
+        self._taak = taak
+        self.huidige = None
+
+    @contextmanager
+    def fase(self, naam):
+        self._taak._controleer()
+        with super().fase(naam) as meting:
+            self.huidige = meting
+            try:
+                yield meting
+            finally:
+                self.huidige = None
+        if "twb_gecomprimeerd_bytes" in meting:
+            # Van een .twbx wordt alleen het .twb-member geparst; de voortgang telt vanaf hier tot het einde daarvan
+            self._taak._parse_bereik = (self._taak.gelezen_bytes, meting["twb_gecomprimeerd_bytes"])
+
+
+class AnalyseTaak:
+    """
+    Eén analyse die op de achtergrond loopt.
+    Args:
+        bron (str | bytes): Pad naar het werkboek of de ruwe inhoud. Bytes worden na
+            afloop losgelaten.
+        bestandsnaam (str): Oorspronkelijke bestandsnaam. Standaard de basename van het pad.
+        streaming, secties, cache, analyzer: Zie analyze_stream.
+        register (tableau_cache.GeheugenCache): Optioneel; het resultaat wordt via
+            register.haal_of_bereken(sleutel, ...) gedeeld met andere sessies.
+        sleutel (str): Sleutel in het register (verplicht met register).
+    """
+
+    def __init__(self, bron, bestandsnaam=None, streaming=True, secties=None, cache=None, analyzer=None,
+                 register=None, sleutel=None):
+        if register is not None and sleutel is None:
+            raise ValueError("Een register vraagt om een sleutel")
+        is_pad = isinstance(bron, (str, os.PathLike))
+        self.bestandsnaam = bestandsnaam or (os.path.basename(bron) if is_pad else "onbekend.twb")
+        self.totaal_bytes = os.path.getsize(bron) if is_pad else len(bron)
+        self.gelezen_bytes = 0
+        self.status = "wachtend"
+        self.resultaat = None
+        self.fout = None
+        self.duur_s = None
+        self._bron = bron
+        self._opties = {"streaming": streaming, "secties": secties, "cache": cache, "analyzer": analyzer}
+        self._register = register
+        self._sleutel = sleutel
+        self._meter = _TaakMeter(self)
+        self._geannuleerd = threading.Event()
+        self._gereed = threading.Event()
+        self._future = None
+        self._start = None
+        self._parse_bereik = (0, self.totaal_bytes)
+
+    def start(self, executor=None):
+        """Start de analyse in een daemon-thread, of op `executor` (bijv. een gedeelde ThreadPoolExecutor)."""
+        if executor is None:
+            threading.Thread(target=self._voer_uit, name=f"analyse-{self.bestandsnaam}", daemon=True).start()
+        else:
+            self._future = executor.submit(self._voer_uit)
+        return self
+
+    def annuleer(self):
+        """Vraagt de analyse te stoppen; een taak die nog in de wachtrij van de executor staat, start niet meer."""
+        self._geannuleerd.set()
+        if self._future is not None and self._future.cancel():
+            self._rond_af("geannuleerd")
+
+    @property
+    def is_gereed(self):
+        return self._gereed.is_set()
+
+    def wacht(self, timeout=None):
+        """Wacht tot de taak klaar, mislukt of geannuleerd is. Geeft True als dat zo is."""
+        return self._gereed.wait(timeout)
+
+    def _controleer(self):
+        if self._geannuleerd.is_set():
+            raise AnalyseGeannuleerd(self.bestandsnaam)
+
+    def _analyseer(self):
+        bron = self._bron
+        stroom = open(bron, 'rb') if isinstance(bron, (str, os.PathLike)) else io.BytesIO(bron)
+        with stroom:
+            project_data = analyze_stream(_VoortgangsStroom(stroom, self), bestandsnaam=self.bestandsnaam,
+                                          metrics=self._meter, **self._opties)
+        project_data.pop("_metrics", None)
+        return project_data
+
+    def _voer_uit(self):
+        if self._geannuleerd.is_set():
+            self._rond_af("geannuleerd")
+            return
+        self.status = "bezig"
+        self._start = time.perf_counter()
+        try:
+            if self._register is not None:
+                self.resultaat = self._register.haal_of_bereken(self._sleutel, self._analyseer)
+            else:
+                self.resultaat = self._analyseer()
+            self._rond_af("klaar")
+        except AnalyseGeannuleerd:
+            logger.info(f"Analyse van {self.bestandsnaam} geannuleerd")
+            self._rond_af("geannuleerd")
+        except Exception as e:
+            self.fout = e
+            self._rond_af("fout")
+
+    def _rond_af(self, status):
+        if self._start is not None:
+            self.duur_s = round(time.perf_counter() - self._start, 3)
+        # Laat de geüploade bytes los; bij annuleren verwijst daarna niets meer naar de deelresultaten
+        self._bron = None
+        self.status = status
+        self._gereed.set()
+
+    def voortgang(self):
+        """
+        Momentopname van de voortgang.
+        Returns:
+            dict: status, bestandsnaam, fase (de lopende fase of None), gelezen_mb,
+                totaal_mb, fractie (0-1: het geparste deel van het .twb, bij een .twbx
+                dus van het gecomprimeerde member), fases (de
+                afgeronde fases met hun duur en aantallen), elementen (live aantallen
+                databronnen, kolommen, werkbladen en dashboards tijdens het streamen),
+                duur_s en fout.
+        """
+        huidige = self._meter.huidige
+        elementen = {}
+        if huidige is not None:
+            tellers = huidige.get("elementen_per_tag") or {}
+            elementen = {naam: tellers[tag] for tag, naam in _LIVE_TAGS.items() if tag in tellers}
+        basis, omvang = self._parse_bereik
+        if self.status == "klaar":
+            fractie = 1.0
+        else:
+            fractie = min(max(self.gelezen_bytes - basis, 0) / omvang, 1.0) if omvang else 0.0
+        duur = self.duur_s
+        if duur is None and self._start is not None:
+            duur = round(time.perf_counter() - self._start, 3)
+        return {
+            "status": self.status,
+            "bestandsnaam": self.bestandsnaam,
+            "fase": huidige["fase"] if huidige is not None else None,
+            "gelezen_mb": round(min(self.gelezen_bytes, self.totaal_bytes) / (1024 * 1024), 2),
+            "totaal_mb": round(self.totaal_bytes / (1024 * 1024), 2),
+            "fractie": round(fractie, 3),
+            "fases": [dict(meting) for meting in list(self._meter.fases)],
+            "elementen": elementen,
+            "duur_s": duur,
+            "fout": str(self.fout) if self.fout is not None else None,
+        }
@@ -0,0 +1,72 @@
+import unittest
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from tableau_analyzer import analyseer_tableau_bestand
+from genereer_werkboek import genereer_werkboek
+from benchmark import meet, vergelijk_met_baseline
+
+
+def _sterf(naam, bestanden, herhalingen, wachtrij):
+    os._exit(3)
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix="tableau_benchmark_tests_")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_generated_workbook_has_requested_scale(self):
+        """The generator produces the requested numbers of objects, deterministically."""
+        twb = os.path.join(self.test_dir, "synthetisch.twb")
+        twbx = genereer_werkboek(twb, databronnen=3, kolommen=10, berekende_velden=20, formule_diepte=4,
+                                 werkbladen=6, dashboards=2, twbx=True, seed=7)
+        with open(twb, 'rb') as f:
+            inhoud = f.read()
+
+        data = analyseer_tableau_bestand(twb)
+        eigen_databronnen = data["databronnen"][:3] # De overige zijn verwijzingen vanuit werkbladen
+        self.assertEqual([len(ds["kolommen"]) for ds in eigen_databronnen], [17, 17, 16])
+        berekend = [c for ds in eigen_databronnen for c in ds["kolommen"] if c["is_berekend_veld"]]
+        self.assertEqual(len(berekend), 20)
+        self.assertTrue(any(c["afhankelijkheden"] and c["afhankelijkheden"][0].startswith("[Berekening")
+                            for c in berekend))
+        self.assertEqual(len(data["werkbladen"]), 6)
+        self.assertEqual(len(data["dashboards"]), 2)
+
+        with zipfile.ZipFile(twbx) as zf:
+            self.assertEqual(zf.read("synthetisch.twb"), inhoud)
+        genereer_werkboek(twb, databronnen=3, kolommen=10, berekende_velden=20, formule_diepte=4,
+                          werkbladen=6, dashboards=2, seed=7)
+        with open(twb, 'rb') as f:
+            self.assertEqual(f.read(), inhoud)
+
+    def test_regression_check_uses_threshold(self):
+        """Only slowdowns beyond the threshold (and above the noise floor) are regressions."""
+        baseline = {"resultaten": {"klein": {"analyse_boom": {"tijd_s": 1.0, "piek_geheugen_mb": 50.0}}}}
+        binnen = {"resultaten": {"klein": {"analyse_boom": {"tijd_s": 1.15, "piek_geheugen_mb": 51.0}}}}
+        buiten = {"resultaten": {"klein": {"analyse_boom": {"tijd_s": 1.5, "piek_geheugen_mb": 50.0}}}}
+        self.assertEqual(vergelijk_met_baseline(binnen, baseline, drempel=0.2), [])
+        regressies = vergelijk_met_baseline(buiten, baseline, drempel=0.2)
+        self.assertEqual(len(regressies), 1)
+        self.assertIn("klein/analyse_boom: tijd_s", regressies[0])
+
+    def test_dead_measurement_process_is_reported(self):
+        """A measurement process that dies without a result yields an error instead of hanging."""
+        with mock.patch('benchmark._meet_in_proces', _sterf):
+            meting = meet("analyse_boom", {}, poll_seconden=0.1)
+        self.assertIn("exitcode 3", meting["fout"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
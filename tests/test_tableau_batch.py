@@ -0,0 +1,135 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import time
+import zipfile
+from unittest import mock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tableau_analyzer
+from tableau_batch import verzamel_bestanden, verwerk_batch
+
+VALID_TWB = """
+<workbook>
+  <datasources>
+    <datasource name="ds1">
+      <column name="[col1]" datatype="string" role="dimension"/>
+    </datasource>
+  </datasources>
+</workbook>
+"""
+MALFORMED_TWB = "<workbook><datasources>"
+
+
+class TestTableauBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix="tableau_batch_tests_")
+        self.output_dir = os.path.join(self.test_dir, "uitvoer")
+        self.bron_dir = os.path.join(self.test_dir, "bronnen")
+        os.makedirs(os.path.join(self.bron_dir, "sub"))
+        self.twb_a = self._write("a.twb", VALID_TWB)
+        self.twb_b = self._write(os.path.join("sub", "b.twb"), VALID_TWB)
+        self.twbx_c = os.path.join(self.bron_dir, "sub", "c.twbx")
+        with zipfile.ZipFile(self.twbx_c, 'w') as zf:
+            zf.writestr("c.twb", VALID_TWB)
+        self.broken = self._write("broken.twb", MALFORMED_TWB)
+        self._write("notes.txt", "geen werkboek")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, rel_path, content):
+        path = os.path.join(self.bron_dir, rel_path)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_collect_from_directory_glob_and_manifest(self):
+        """Directories are walked recursively, globs expanded and manifest paths resolved."""
+        from_dir = verzamel_bestanden([self.bron_dir])
+        self.assertEqual(from_dir, [self.twb_a, self.broken, self.twb_b, self.twbx_c])
+
+        from_glob = verzamel_bestanden([os.path.join(self.bron_dir, "**", "*.twbx")])
+        self.assertEqual(from_glob, [self.twbx_c])
+
+        manifest = os.path.join(self.bron_dir, "manifest.txt")
+        with open(manifest, 'w') as f:
+            f.write("# nachtelijke run\n\na.twb\nsub/*.twb\nnotes.txt\na.twb\n")
+        self.assertEqual(verzamel_bestanden([], manifest=manifest), [self.twb_a, self.twb_b])
+
+    def test_batch_summary_sequential_and_parallel(self):
+        """The summary counts successes and failures and keeps the input order."""
+        bestanden = [self.twb_a, self.broken, self.twbx_c]
+        for workers in (1, 2):
+            samenvatting = verwerk_batch(bestanden, workers=workers, output_dir=self.output_dir)
+            self.assertEqual(samenvatting["totaal"], 3)
+            self.assertEqual(samenvatting["geslaagd"], 2)
+            self.assertEqual(samenvatting["mislukt"], 1)
+            self.assertEqual([r["pad"] for r in samenvatting["bestanden"]], bestanden)
+            self.assertEqual([r["status"] for r in samenvatting["bestanden"]], ["ok", "fout", "ok"])
+            self.assertTrue(all(r["duur_s"] is not None for r in samenvatting["bestanden"]))
+
+        with open(os.path.join(self.output_dir, "c_analyse.json"), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["databronnen"][0]["naam"], "ds1")
+
+    def test_batch_loads_inventory(self):
+        """Successful results are loaded into the SQLite inventory, keyed by workbook path."""
+        from tableau_inventaris import Inventaris
+        database = os.path.join(self.test_dir, "inventaris.sqlite")
+        for _ in range(2): # Een tweede run vervangt de werkboeken in plaats van ze te dupliceren
+            samenvatting = verwerk_batch([self.twb_a, self.broken, self.twbx_c], workers=2,
+                                         output_dir=self.output_dir, gzip_uitvoer=True, inventaris=database)
+            self.assertEqual(samenvatting["in_inventaris"], 2)
+        with Inventaris(database) as inventaris:
+            sleutels = [r["sleutel"] for r in inventaris.query("SELECT sleutel FROM werkboeken ORDER BY sleutel")]
+            self.assertEqual(sleutels, sorted([self.twb_a, self.twbx_c]))
+            self.assertEqual(inventaris.aantallen()["kolommen"], 2)
+
+    @unittest.skipUnless(hasattr(__import__('signal'), 'SIGALRM'), "Timeouts vereisen SIGALRM")
+    def test_batch_timeout_per_file(self):
+        """A file exceeding the timeout is reported as a timeout, the others still run."""
+        def slow_then_fast(pad, **opties):
+            if pad == self.twb_a:
+                time.sleep(5)
+            return True
+
+        with mock.patch('tableau_batch.process_tableau_file', side_effect=slow_then_fast):
+            samenvatting = verwerk_batch([self.twb_a, self.twb_b], workers=1, timeout=0.2)
+        self.assertEqual([r["status"] for r in samenvatting["bestanden"]], ["timeout", "ok"])
+        self.assertEqual(samenvatting["timeouts"], 1)
+        self.assertLess(samenvatting["bestanden"][0]["duur_s"], 2)
+
+    @unittest.skipUnless(hasattr(__import__('signal'), 'SIGALRM'), "Timeouts vereisen SIGALRM")
+    def test_batch_timeout_forces_streaming(self):
+        """With a timeout the tree parser (one uninterruptible C call) is replaced by streaming parsing."""
+        with mock.patch('tableau_batch.process_tableau_file', return_value=True) as verwerk:
+            verwerk_batch([self.twb_a], workers=1, timeout=10, streaming=False)
+            self.assertTrue(verwerk.call_args.kwargs["streaming"])
+            verwerk_batch([self.twb_a], workers=1, streaming=False)
+            self.assertFalse(verwerk.call_args.kwargs["streaming"])
+
+        kolommen = "".join(f'<column name="[c{i}]" datatype="string" role="dimension"/>' for i in range(200000))
+        groot = self._write("groot.twb", f'<workbook><datasources><datasource name="ds">{kolommen}'
+                                         f'</datasource></datasources></workbook>')
+        samenvatting = verwerk_batch([groot], workers=1, timeout=0.01, output_dir=self.output_dir)
+        self.assertEqual(samenvatting["bestanden"][0]["status"], "timeout")
+
+    def test_cli_batch_mode(self):
+        """main() switches to batch mode for directories and writes the summary."""
+        summary_path = os.path.join(self.test_dir, "samenvatting.json")
+        exit_code = tableau_analyzer.main([os.path.join(self.bron_dir, "sub"), "--workers", "1",
+                                           "--uitvoer-map", self.output_dir,
+                                           "--samenvatting", summary_path])
+        self.assertEqual(exit_code, 0)
+        with open(summary_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["geslaagd"], 2)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "b_analyse.json")))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,205 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tableau_analyzer import analyze_bytes, process_tableau_file
+from tableau_cache import AnalyseCache, GeheugenCache, bereken_sleutel
+
+TWB_CONTENT = b"""
+<workbook>
+  <datasources>
+    <datasource name="ds1">
+      <column name="[Sales]" datatype="real" role="measure"/>
+      <column name="[Double]" datatype="real" role="measure">
+        <calculation formula="[Sales] * 2"/>
+      </column>
+    </datasource>
+  </datasources>
+</workbook>
+"""
+
+
+class TestAnalyseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix="tableau_cache_tests_")
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_key_depends_on_content_version_and_options(self):
+        """The key changes with the content, the analyzer version and the options."""
+        basis = bereken_sleutel(TWB_CONTENT)
+        self.assertEqual(basis, bereken_sleutel(TWB_CONTENT))
+        self.assertNotEqual(basis, bereken_sleutel(TWB_CONTENT + b" "))
+        self.assertNotEqual(basis, bereken_sleutel(TWB_CONTENT, bestandsnaam="a.twb"))
+        with mock.patch('tableau_cache.ANALYZER_VERSIE', '0.0.0-test'):
+            self.assertNotEqual(basis, bereken_sleutel(TWB_CONTENT))
+
+        pad = os.path.join(self.test_dir, "wb.twb")
+        with open(pad, 'wb') as f:
+            f.write(TWB_CONTENT)
+        self.assertEqual(basis, bereken_sleutel(pad))
+        with open(pad, 'rb') as f:
+            f.read(3)
+            self.assertEqual(bereken_sleutel(f), bereken_sleutel(TWB_CONTENT[3:]))
+            self.assertEqual(f.tell(), 3, "File position should be restored after hashing")
+
+    def test_hit_skips_parsing(self):
+        """A second analysis of the same content is served from the cache without parsing."""
+        cache = AnalyseCache(self.cache_dir)
+        eerste = analyze_bytes(TWB_CONTENT, "wb.twb", cache=cache)
+        self.assertEqual(len(cache), 1)
+
+        with mock.patch('tableau_analyzer.analyseer_tableau_bestand') as analyse:
+            tweede = analyze_bytes(TWB_CONTENT, "wb.twb", cache=cache)
+            analyse.assert_not_called()
+        self.assertEqual(tweede["databronnen"], eerste["databronnen"])
+
+        # A fresh instance on the same directory sees the persisted entry
+        with mock.patch('tableau_analyzer.analyseer_tableau_bestand') as analyse:
+            analyze_bytes(TWB_CONTENT, "wb.twb", cache=AnalyseCache(self.cache_dir))
+            analyse.assert_not_called()
+
+    def test_metrics_are_not_cached(self):
+        """_metrics describes one run: it is never stored, and a hit reports the cache lookup."""
+        cache = AnalyseCache(self.cache_dir)
+        eerste = analyze_bytes(TWB_CONTENT, "wb.twb", cache=cache, metrics=True)
+        self.assertIn("afhankelijkheden", [f["fase"] for f in eerste["_metrics"]["fases"]])
+        self.assertNotIn("_metrics", analyze_bytes(TWB_CONTENT, "wb.twb", cache=cache))
+
+        treffer = analyze_bytes(TWB_CONTENT, "wb.twb", cache=cache, metrics=True)
+        self.assertEqual([(f["fase"], f.get("treffer")) for f in treffer["_metrics"]["fases"]],
+                         [("cache_opzoeken", True)])
+
+    def test_extract_datum_handling(self):
+        """extract_datum is refreshed on hits unless negeer_extract_datum is False."""
+        cache = AnalyseCache(self.cache_dir)
+        cache.put("k", {"bestandsnaam": "wb.twb", "extract_datum": "2000-01-01T00:00:00"})
+        with open(os.path.join(self.cache_dir, "k.json"), encoding='utf-8') as f:
+            self.assertNotIn("extract_datum", json.load(f))
+        self.assertNotEqual(cache.get("k")["extract_datum"], "2000-01-01T00:00:00")
+
+        stabiel = AnalyseCache(os.path.join(self.test_dir, "stabiel"), negeer_extract_datum=False)
+        stabiel.put("k", {"bestandsnaam": "wb.twb", "extract_datum": "2000-01-01T00:00:00"})
+        self.assertEqual(stabiel.get("k")["extract_datum"], "2000-01-01T00:00:00")
+
+    def test_lru_eviction(self):
+        """Entries that were not used recently are evicted once max_bytes is exceeded."""
+        entry = {"bestandsnaam": "x", "data": "x" * 1000}
+        cache = AnalyseCache(self.cache_dir, max_bytes=2500)
+        cache.put("a", entry)
+        cache.put("b", entry)
+        self.assertIsNotNone(cache.get("a")) # 'a' is nu het meest recent gebruikt
+        cache.put("c", entry)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertLessEqual(cache.totale_grootte, 2500)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["a.json", "c.json"])
+
+        # The LRU order survives a restart through the file modification times
+        os.utime(os.path.join(self.cache_dir, "a.json"), (time.time() - 60, time.time() - 60))
+        herstart = AnalyseCache(self.cache_dir, max_bytes=2500)
+        herstart.put("d", entry)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["c.json", "d.json"])
+
+    def test_size_bound_holds_across_processes(self):
+        """Several caches on the same directory (e.g. batch workers) evict against the shared total."""
+        entry = {"bestandsnaam": "x", "data": "x" * 1000}
+        workers = [AnalyseCache(self.cache_dir, max_bytes=2500, herscan_seconden=0) for _ in range(3)]
+        for i, cache in enumerate(workers * 2):
+            cache.put(f"sleutel{i}", entry)
+        totaal = sum(os.path.getsize(os.path.join(self.cache_dir, naam)) for naam in os.listdir(self.cache_dir))
+        self.assertLessEqual(totaal, 2500)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["sleutel4.json", "sleutel5.json"])
+
+    def test_put_rescans_only_to_evict(self):
+        """Puts below the size bound update the index in memory instead of rescanning the directory."""
+        cache = AnalyseCache(self.cache_dir, max_bytes=10000, herscan_seconden=3600)
+        entry = {"bestandsnaam": "x", "data": "x" * 1000}
+        with mock.patch('tableau_cache.os.scandir', wraps=os.scandir) as scandir:
+            for i in range(5):
+                cache.put(f"sleutel{i}", entry)
+            scandir.assert_not_called()
+            self.assertEqual(cache.totale_grootte,
+                             sum(os.path.getsize(os.path.join(self.cache_dir, naam)) for naam in os.listdir(self.cache_dir)))
+            for i in range(5, 12):
+                cache.put(f"sleutel{i}", entry)
+            self.assertTrue(scandir.called)
+        self.assertLessEqual(cache.totale_grootte, 10000)
+
+    def test_process_tableau_file_with_cache(self):
+        """process_tableau_file writes the same JSON on a cache hit."""
+        pad = os.path.join(self.test_dir, "wb.twb")
+        with open(pad, 'wb') as f:
+            f.write(TWB_CONTENT)
+        uitvoer = os.path.join(self.test_dir, "uitvoer")
+        cache = AnalyseCache(self.cache_dir)
+        self.assertTrue(process_tableau_file(pad, output_dir=uitvoer, cache=cache))
+        os.remove(os.path.join(uitvoer, "wb_analyse.json"))
+        with mock.patch('tableau_analyzer.analyseer_tableau_bestand') as analyse:
+            self.assertTrue(process_tableau_file(pad, output_dir=uitvoer, cache=cache))
+            analyse.assert_not_called()
+        with open(os.path.join(uitvoer, "wb_analyse.json"), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["databronnen"][0]["naam"], "ds1")
+
+
+class TestGeheugenCache(unittest.TestCase):
+
+    def test_ttl_and_max_entries(self):
+        """Entries expire after the TTL and the least recently used entry is dropped first."""
+        nu = [0.0]
+        cache = GeheugenCache(max_entries=2, ttl_seconden=10, klok=lambda: nu[0])
+        cache.put("a", {"naam": "a"})
+        cache.put("b", {"naam": "b"})
+        self.assertEqual(cache.get("a"), {"naam": "a"})
+        cache.put("c", {"naam": "c"})
+        self.assertIsNone(cache.get("b"), "'b' was least recently used")
+        self.assertEqual(len(cache), 2)
+
+        nu[0] = 10.5
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_values_are_shared_not_copied(self):
+        """All callers receive the same object, so sessions do not each hold a copy."""
+        cache = GeheugenCache()
+        data = {"databronnen": []}
+        cache.put("k", data)
+        self.assertIs(cache.get("k"), data)
+
+    def test_concurrent_requests_compute_once(self):
+        """Concurrent haal_of_bereken calls for the same key run the computation once."""
+        cache = GeheugenCache()
+        aanroepen = []
+
+        def bereken():
+            aanroepen.append(1)
+            time.sleep(0.1)
+            return {"resultaat": True}
+
+        resultaten = []
+        threads = [threading.Thread(target=lambda: resultaten.append(cache.haal_of_bereken("k", bereken)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(aanroepen), 1)
+        self.assertEqual(len(resultaten), 5)
+        self.assertTrue(all(r is resultaten[0] for r in resultaten))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,131 @@
+import unittest
+import os
+from unittest import mock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tableau_analyzer import analyze_bytes
+import tableau_diff
+from tableau_diff import bereken_structuur_hashes, vergelijk_versies
+
+TWB = """<workbook>
+  <datasources>
+    <datasource name="ds1">
+      <connection class="postgres" dbname="dwh" server="prod01"/>
+      <column name="[Sales]" datatype="real" role="measure"/>
+      <column name="[Profit]" datatype="real" role="measure"/>
+      <column name="[Ratio]" datatype="real" role="measure">
+        <calculation formula="SUM([Profit]) / SUM([Sales])"/>
+      </column>
+      <column name="[Label]" datatype="string" role="dimension">
+        <calculation formula="IF [Ratio] > 0.1 THEN 'Goed' ELSE [Target] END"/>
+      </column>
+      {extra}
+    </datasource>
+  </datasources>
+  <worksheets>
+    <worksheet name="Overzicht">
+      <table><view><datasource-dependencies datasource="ds1"><column name="[Sales]"/></datasource-dependencies></view></table>
+    </worksheet>
+    {werkblad}
+  </worksheets>
+  <dashboards>
+    <dashboard name="Dash"><zones><zone id="1" name="Overzicht" type-v2="viz"/></zones></dashboard>
+  </dashboards>
+</workbook>"""
+
+
+def _analyse(extra="", werkblad="", streaming=False, vorige=None, metrics=False):
+    inhoud = TWB.format(extra=extra, werkblad=werkblad).encode('utf-8')
+    return analyze_bytes(inhoud, bestandsnaam="wb.twb", streaming=streaming, vorige=vorige, metrics=metrics)
+
+
+def _zonder_vluchtig(project_data):
+    return {k: v for k, v in project_data.items() if k not in ("extract_datum", "_metrics")}
+
+
+class TestTableauDiff(unittest.TestCase):
+
+    def test_hashes_match_between_parsers(self):
+        """Tree and streaming mode produce the same structure hashes, which can also be recomputed later."""
+        boom = _analyse()
+        stroom = _analyse(streaming=True)
+        self.assertEqual(boom["structuur_hashes"], stroom["structuur_hashes"])
+        herberekend = bereken_structuur_hashes(boom, boom["structuur_hashes"]["analyzer_versie"])
+        self.assertEqual(herberekend, boom["structuur_hashes"])
+
+    def test_diff_reports_changed_entities(self):
+        """The diff lists added, removed and changed entities and columns only for what changed."""
+        oud = _analyse()
+        self.assertTrue(vergelijk_versies(oud, _analyse())["identiek"])
+
+        nieuw = _analyse(extra='<column name="[Target]" datatype="string" role="dimension"/>',
+                         werkblad='<worksheet name="Nieuw"/>')
+        verschillen = vergelijk_versies(oud, nieuw)
+        self.assertFalse(verschillen["identiek"])
+        self.assertEqual(set(verschillen["secties"]), {"databronnen", "werkbladen"})
+        self.assertEqual(verschillen["secties"]["werkbladen"],
+                         {"toegevoegd": ["Nieuw"], "verwijderd": [], "gewijzigd": []})
+        (databron,) = verschillen["secties"]["databronnen"]["gewijzigd"]
+        self.assertEqual(databron["naam"], "ds1")
+        self.assertFalse(databron["eigenschappen_gewijzigd"])
+        self.assertEqual(databron["kolommen"], {"toegevoegd": ["[Target]"], "verwijderd": [], "gewijzigd": []})
+
+        # Resultaten zonder structuur_hashes (oudere uitvoer) worden eerst gehasht
+        oud.pop("structuur_hashes")
+        self.assertEqual(vergelijk_versies(oud, nieuw), verschillen)
+
+    def test_diff_only_visits_changed_blocks(self):
+        """In a large section the diff only looks at the entities in blocks that changed."""
+        def _werkboek(werkbladen):
+            return {"werkbladen": [{"naam": naam, "filters": filters} for naam, filters in werkbladen],
+                    "secties": ["werkbladen"]}
+
+        werkbladen = [(f"Blad {i}", []) for i in range(4000)]
+        nieuw = list(werkbladen)
+        nieuw[1000] = ("Blad 1000", ["[Regio]"])
+        del nieuw[2500]
+        nieuw.insert(3000, ("Extra", []))
+        oud_hashes, nieuw_hashes = (bereken_structuur_hashes(_werkboek(w)) for w in (werkbladen, nieuw))
+
+        bekeken = []
+        origineel = tableau_diff._gewijzigde_blok_namen
+
+        def _tel(blokken, andere_blokken):
+            namen = origineel(blokken, andere_blokken)
+            bekeken.extend(namen)
+            return namen
+
+        with mock.patch.object(tableau_diff, '_gewijzigde_blok_namen', _tel):
+            verschillen = vergelijk_versies({"structuur_hashes": oud_hashes}, {"structuur_hashes": nieuw_hashes})
+        self.assertEqual(verschillen["secties"]["werkbladen"],
+                         {"toegevoegd": ["Extra"], "verwijderd": ["Blad 2500"], "gewijzigd": ["Blad 1000"]})
+        self.assertLess(len(bekeken), 20 * tableau_diff.BLOK_GROOTTE)
+
+        # Output of an older version without blocks gives the same differences
+        for hashes in (oud_hashes, nieuw_hashes):
+            hashes["secties"]["werkbladen"].pop("blokken")
+        self.assertEqual(vergelijk_versies({"structuur_hashes": oud_hashes}, {"structuur_hashes": nieuw_hashes}),
+                         verschillen)
+
+    def test_incremental_analysis_matches_full_analysis(self):
+        """Reusing a previous result gives the same output; formulas mentioning a new field are recomputed."""
+        vorige = _analyse()
+        extra = '<column name="[Target]" datatype="string" role="dimension"/>'
+        volledig = _analyse(extra=extra)
+        incrementeel = _analyse(extra=extra, vorige=vorige, metrics=True)
+
+        fase = next(f for f in incrementeel["_metrics"]["fases"] if f["fase"] == "afhankelijkheden")
+        self.assertEqual(fase["hergebruikt"], 1) # [Ratio]; [Label] noemt het nieuwe veld [Target]
+        self.assertEqual(_zonder_vluchtig(incrementeel), _zonder_vluchtig(volledig))
+        label = next(c for c in incrementeel["databronnen"][0]["kolommen"] if c["naam"] == "[Label]")
+        self.assertEqual(label["afhankelijkheden"], ["[Ratio]", "[Target]"])
+
+        ongewijzigd = _analyse(werkblad='<worksheet name="Nieuw"/>', vorige=vorige, metrics=True)
+        fase = next(f for f in ongewijzigd["_metrics"]["fases"] if f["fase"] == "afhankelijkheden")
+        self.assertEqual(fase["hergebruikt"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import os
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tableau_formule import (tokeniseer, formule_metrieken, score_formules, parse_formule,
+                             analyseer_formule, formule_cache_info, FormuleParseFout, Knoop)
+
+
+class TestTableauFormule(unittest.TestCase):
+
+    def test_tokenizer_keeps_literals_and_drops_comments(self):
+        """Strings, dates and field references are single tokens; comments are skipped."""
+        tokens, commentaar_lengte = tokeniseer(
+            "// kop\nIF [Order Date] > #2020-01-01# THEN 'it''s (not) SUM(' /* x */ END")
+        self.assertEqual([soort for soort, _ in tokens],
+                         ['naam', 'veld', 'operator', 'datum', 'naam', 'tekst', 'naam'])
+        self.assertEqual(tokens[5][1], "'it''s (not) SUM('")
+        self.assertEqual(commentaar_lengte, len("// kop") + len("/* x */"))
+
+    def test_counts_only_real_functions(self):
+        """Parentheses inside strings and unknown names do not count as functions."""
+        metrieken = formule_metrieken('SUM([Sales]) + MYFUNC([x]) + LEN("SUM(a)")')
+        self.assertEqual(metrieken["functies"], 2) # SUM en LEN
+        self.assertEqual(metrieken["nesting_diepte"], 1)
+
+        in_commentaar = formule_metrieken("[Sales] // SUM(AVG(MIN(MAX([x]))))")
+        self.assertEqual(in_commentaar["functies"], 0)
+        self.assertEqual(in_commentaar["label"], "Eenvoudig")
+
+    def test_lod_and_table_calculations(self):
+        """LOD expressions and table calculations are counted and raise the label."""
+        lod = formule_metrieken("{FIXED [Customer] : MIN([Order Date])}")
+        self.assertEqual(lod["lod_expressies"], 1)
+        self.assertEqual(lod["nesting_diepte"], 2)
+        self.assertEqual(lod["label"], "Gemiddeld")
+
+        tabel = formule_metrieken("RUNNING_SUM(SUM([Sales])) / TOTAL(SUM([Sales]))")
+        self.assertEqual(tabel["tabelberekeningen"], 2)
+        self.assertEqual(tabel["functies"], 4)
+        self.assertEqual(tabel["label"], "Complex")
+        self.assertGreater(tabel["score"], lod["score"])
+
+    def test_score_formules_batch(self):
+        """Batch scoring returns one result per formula and reuses results for duplicates."""
+        formules = ["SUM([Sales])", "[Sales] * 2", "SUM([Sales])"]
+        resultaat = score_formules(formules)
+        self.assertEqual([r["label"] for r in resultaat], ["Eenvoudig", "Eenvoudig", "Eenvoudig"])
+        self.assertIs(resultaat[0], resultaat[2])
+        self.assertEqual(resultaat[0], formule_metrieken("SUM([Sales])"))
+
+    def test_parser_builds_ast(self):
+        """IF/ELSEIF, operator precedence, functions and LOD expressions become AST nodes."""
+        ast = parse_formule("IF [a] > 1 + 2 * 3 THEN SUM([b]) ELSEIF NOT [c] THEN 0 ELSE NULL END")
+        self.assertEqual(ast.soort, 'if')
+        self.assertTrue(ast.waarde) # heeft ELSE
+        vergelijking = ast.kinderen[0]
+        self.assertEqual((vergelijking.soort, vergelijking.waarde), ('binair', '>'))
+        self.assertEqual(vergelijking.kinderen[1].waarde, '+')
+        self.assertEqual(vergelijking.kinderen[1].kinderen[1].waarde, '*')
+        self.assertEqual(ast.kinderen[1], Knoop('functie', 'SUM', (Knoop('veld', (None, 'b'), ()),)))
+
+        lod = parse_formule("{FIXED [ds].[Klant], [Regio] : MIN([Datum])}")
+        self.assertEqual((lod.soort, lod.waarde), ('lod', 'FIXED'))
+        self.assertEqual([d.waarde for d in lod.kinderen[0].kinderen], [('ds', 'Klant'), (None, 'Regio')])
+
+        case = parse_formule("CASE [x] WHEN 'a' THEN 1 WHEN 'b' THEN 2 END")
+        self.assertEqual((case.soort, case.waarde, len(case.kinderen)), ('case', False, 5))
+
+        with self.assertRaises(FormuleParseFout):
+            parse_formule("IF [a] THEN 1")
+
+    def test_single_analysis_feeds_all_consumers(self):
+        """References, functions and metrics come from one cached parse; strings are ignored."""
+        analyse = analyseer_formule('IF CONTAINS([Naam], "[Geen veld]") THEN SUM([Omzet]) END')
+        self.assertIsNone(analyse.fout)
+        self.assertEqual(analyse.referenties, ((None, 'Naam'), (None, 'Omzet')))
+        self.assertEqual(analyse.functies, ('CONTAINS', 'SUM'))
+
+        voor = formule_cache_info().hits
+        self.assertIs(analyseer_formule('IF CONTAINS([Naam], "[Geen veld]") THEN SUM([Omzet]) END'), analyse)
+        self.assertEqual(formule_cache_info().hits, voor + 1)
+
+    def test_unparsable_formula_falls_back_to_tokens(self):
+        """A formula that does not parse still gets metrics and references from its tokens."""
+        analyse = analyseer_formule("((([Field]))))")
+        self.assertIsNone(analyse.ast)
+        self.assertIsNotNone(analyse.fout)
+        self.assertEqual(analyse.referenties, ((None, 'Field'),))
+        self.assertEqual(analyse.label, "Complex")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
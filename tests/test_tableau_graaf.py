@@ -0,0 +1,70 @@
+import unittest
+import json
+import os
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tableau_graaf import AfhankelijkheidsGraaf
+
+
+def _graaf(kanten, knopen=()):
+    return AfhankelijkheidsGraaf.bouw([("ds", k) for k in knopen],
+                                      [(("ds", van), ("ds", naar)) for van, naar in kanten])
+
+
+class TestAfhankelijkheidsGraaf(unittest.TestCase):
+
+    def test_closure_order_and_depth(self):
+        """Transitive dependencies, topological order and depth follow the chain of calculations."""
+        graaf = _graaf([("[Profit]", "[Sales]"), ("[Marge]", "[Profit]"), ("[Marge]", "[Sales]")],
+                       knopen=["[Sales]", "[Profit]", "[Marge]", "[Los]"])
+        sales, profit, marge = (graaf.id_van(n) for n in ("[Sales]", "[Profit]", "[Marge]"))
+
+        self.assertEqual(graaf.transitieve_afhankelijkheden(marge), sorted([sales, profit]))
+        self.assertEqual(graaf.impact(sales), sorted([profit, marge]))
+        self.assertEqual([graaf.dieptes[i] for i in (sales, profit, marge)], [0, 1, 2])
+        volgorde = graaf.topologische_volgorde
+        self.assertLess(volgorde.index(sales), volgorde.index(profit))
+        self.assertLess(volgorde.index(profit), volgorde.index(marge))
+        self.assertEqual(graaf.cycli, [])
+
+    def test_cycles_are_reported_and_closed(self):
+        """Members of a cycle share their transitive dependencies and are reported once."""
+        graaf = _graaf([("[a]", "[b]"), ("[b]", "[c]"), ("[c]", "[a]"), ("[d]", "[a]"), ("[e]", "[e]")])
+        a, b, c, d, e = (graaf.id_van(n) for n in ("[a]", "[b]", "[c]", "[d]", "[e]"))
+
+        self.assertEqual(sorted(map(sorted, graaf.cycli)), sorted([sorted([a, b, c]), [e]]))
+        self.assertEqual(graaf.transitieve_afhankelijkheden(d), sorted([a, b, c]))
+        self.assertEqual(graaf.impact(c), sorted([a, b, c, d]))
+
+    def test_long_chain_without_recursion(self):
+        """Deep chains are handled iteratively; the transitive closure is only built when asked for."""
+        n = 5000
+        graaf = _graaf([(f"[{i}]", f"[{i - 1}]") for i in range(1, n)])
+        self.assertEqual(graaf.dieptes[graaf.id_van(f"[{n - 1}]")], n - 1)
+        graaf.naar_dict()
+        self.assertIsNone(graaf._transitief)
+        self.assertEqual(len(graaf.transitieve_afhankelijkheden(graaf.id_van(f"[{n - 1}]"))), n - 1)
+        self.assertEqual(len(graaf.impact(graaf.id_van("[0]"))), n - 1)
+
+    def test_roundtrip_through_project_data(self):
+        """The serialized section rebuilds an identical graph, including its transitive closure."""
+        graaf = _graaf([("[b]", "[a]"), ("[c]", "[b]")])
+        sectie = graaf.naar_dict()
+        self.assertNotIn("transitief", sectie["knopen"][0])
+        herbouwd = AfhankelijkheidsGraaf.uit_project_data({"afhankelijkheidsgraaf": sectie})
+        self.assertEqual(herbouwd.naar_dict(), sectie)
+        c = herbouwd.id_van("[c]")
+        self.assertEqual(herbouwd.transitieve_afhankelijkheden(c), graaf.transitieve_afhankelijkheden(c))
+        self.assertEqual(len(herbouwd.transitieve_afhankelijkheden(c)), 2)
+
+    def test_serialized_size_is_linear(self):
+        """A long chain serializes to output linear in its length, not quadratic."""
+        grootte = {n: len(json.dumps(_graaf([(f"[{i}]", f"[{i - 1}]") for i in range(1, n)]).naar_dict()))
+                   for n in (1000, 2000)}
+        self.assertLess(grootte[2000], 2.5 * grootte[1000])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
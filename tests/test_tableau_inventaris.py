@@ -0,0 +1,132 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tableau_inventaris import Inventaris
+from tableau_json import schrijf_analyse_json
+
+
+def _project_data(bestandsnaam, server="prod01", kolommen=3):
+    return {
+        "bestandsnaam": bestandsnaam,
+        "extract_datum": "2024-01-01T00:00:00",
+        "databronnen": [{
+            "naam": "federated.ds1",
+            "versie": "18.1",
+            "verbindingen": [{"class": "postgres", "dbname": "dwh", "server": server, "username": "bi"}],
+            "kolommen": [{"naam": f"[Kolom {i}]", "datatype": "real", "rol": "measure", "is_berekend_veld": False}
+                         for i in range(kolommen)] + [
+                {"naam": "[Marge]", "is_berekend_veld": True, "formule": "ZN([Kolom 0]) / 2",
+                 "complexiteit": "Eenvoudig", "complexiteit_score": 1, "afhankelijkheden": ["[Kolom 0]"],
+                 "gebruikte_functies": ["ZN"]},
+            ],
+        }],
+        "werkbladen": [{"naam": "Overzicht", "gebruikte_databronnen": ["federated.ds1"],
+                        "gebruikte_velden_direct": ["[Marge]", "[Marge]"], "filters": []}],
+        "dashboards": [{"naam": "Dashboard", "objecten": [{"id": "1", "type": "viz", "naam_object": "Overzicht"}]}],
+    }
+
+
+class TestInventaris(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.inventaris = Inventaris(os.path.join(self.test_dir, "inventaris.sqlite"))
+
+    def tearDown(self):
+        self.inventaris.sluit()
+        shutil.rmtree(self.test_dir)
+
+    def test_bulk_load_and_fleet_queries(self):
+        """A bulk load fills every table and the helper queries answer fleet-wide questions."""
+        geladen = self.inventaris.voeg_toe_veel([(None, _project_data("a.twb")),
+                                                 (None, _project_data("b.twb", server="test01", kolommen=600))])
+        self.assertEqual(geladen, 2)
+        aantallen = self.inventaris.aantallen()
+        self.assertEqual(aantallen["werkboeken"], 2)
+        self.assertEqual(aantallen["kolommen"], 3 + 1 + 600 + 1)
+        self.assertEqual(aantallen["berekende_velden"], 2)
+        self.assertEqual(aantallen["werkblad_velden"], 2)
+        self.assertEqual(aantallen["dashboard_zones"], 2)
+
+        self.assertEqual([r["sleutel"] for r in self.inventaris.werkboeken_met_server("prod01")], ["a.twb"])
+        groot = self.inventaris.databronnen_met_minimaal(500)
+        self.assertEqual([(r["sleutel"], r["aantal_kolommen"]) for r in groot], [("b.twb", 601)])
+        functies = self.inventaris.query(
+            "SELECT DISTINCT w.sleutel FROM berekening_functies f JOIN werkboeken w ON w.id = f.werkboek_id "
+            "WHERE f.functie = ? ORDER BY w.sleutel", ("ZN",))
+        self.assertEqual([r["sleutel"] for r in functies], ["a.twb", "b.twb"])
+
+    def test_largest_packages(self):
+        """Package members are loaded per workbook and the largest .twbx files are ranked first."""
+        def _pakket(hyper_mb):
+            return {"bestanden": [
+                {"naam": "Data/extract.hyper", "type": "hyper", "gecomprimeerd_bytes": hyper_mb * 1048576,
+                 "ongecomprimeerd_bytes": hyper_mb * 2 * 1048576},
+                {"naam": "a.twb", "type": "twb", "gecomprimeerd_bytes": 1048576, "ongecomprimeerd_bytes": 4194304},
+            ]}
+        klein, groot = _project_data("klein.twb"), _project_data("groot.twb")
+        klein["pakket"], groot["pakket"] = _pakket(2), _pakket(3000)
+        self.inventaris.voeg_toe_veel([(None, klein), (None, groot), (None, _project_data("los.twb"))])
+
+        pakketten = self.inventaris.grootste_pakketten()
+        self.assertEqual([p["sleutel"] for p in pakketten], ["groot.twb", "klein.twb"])
+        self.assertEqual(pakketten[0]["gecomprimeerd_mb"], 3001.0)
+        self.assertEqual(pakketten[0]["ongecomprimeerd_mb"], 6004.0)
+        self.assertEqual(pakketten[0]["per_type_mb"], {"hyper": 3000.0, "twb": 1.0})
+        self.assertEqual(len(self.inventaris.grootste_pakketten(limiet=1)), 1)
+
+    def test_duplicate_custom_sql(self):
+        """Custom SQL is loaded per datasource and fingerprints shared by several workbooks are listed."""
+        werkboeken = []
+        for naam, fingerprint in (("a.twb", "f1"), ("b.twb", "f1"), ("c.twb", "f2")):
+            data = _project_data(naam)
+            data["databronnen"][0]["custom_sql"] = [{"naam": "Orders", "fingerprint": fingerprint,
+                                                     "sql": f"SELECT * FROM orders -- {naam}"}]
+            werkboeken.append((None, data))
+        self.inventaris.voeg_toe_veel(werkboeken)
+
+        self.assertEqual(self.inventaris.aantallen()["custom_sql"], 3)
+        dubbel = self.inventaris.dubbele_queries()
+        self.assertEqual([(r["fingerprint"], r["werkboeken"], r["servers"]) for r in dubbel], [("f1", 2, "prod01")])
+        self.assertEqual(len(self.inventaris.dubbele_queries(min_werkboeken=1)), 2)
+
+    def test_reload_replaces_workbook(self):
+        """Loading the same key again replaces all rows of that workbook."""
+        self.inventaris.voeg_toe(_project_data("a.twb"), sleutel="/backups/a.twb")
+        self.inventaris.voeg_toe(_project_data("a.twb", server="prod02", kolommen=1), sleutel="/backups/a.twb")
+
+        self.assertEqual(self.inventaris.aantallen()["werkboeken"], 1)
+        self.assertEqual(self.inventaris.aantallen()["kolommen"], 2)
+        self.assertEqual(self.inventaris.werkboeken_met_server("prod01"), [])
+        self.assertEqual(len(self.inventaris.werkboeken_met_server("prod02")), 1)
+
+        self.assertTrue(self.inventaris.verwijder("/backups/a.twb"))
+        self.assertEqual(sum(self.inventaris.aantallen().values()), 0)
+
+    def test_failed_load_rolls_back(self):
+        """A failing bulk load leaves the inventory unchanged."""
+        self.inventaris.voeg_toe(_project_data("a.twb"))
+        with self.assertRaises(ValueError):
+            self.inventaris.voeg_toe_veel([(None, _project_data("b.twb")), (None, {"databronnen": []})])
+        self.assertEqual([r["sleutel"] for r in self.inventaris.query("SELECT sleutel FROM werkboeken")], ["a.twb"])
+
+    def test_load_json_files(self):
+        """laad_bestanden reads plain and gzipped analysis files and skips unreadable ones."""
+        paden = [os.path.join(self.test_dir, "a_analyse.json"), os.path.join(self.test_dir, "b_analyse.json.gz")]
+        schrijf_analyse_json(_project_data("a.twb"), paden[0])
+        schrijf_analyse_json(_project_data("b.twb"), paden[1], compact=True)
+        kapot = os.path.join(self.test_dir, "kapot_analyse.json")
+        with open(kapot, 'w') as f:
+            f.write("{")
+
+        self.assertEqual(self.inventaris.laad_bestanden(paden + [kapot], blokgrootte=1), 2)
+        self.assertEqual(self.inventaris.aantallen()["werkboeken"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tableau_analyzer
+from tableau_analyzer import analyze_stream, process_tableau_file
+from tableau_json import GZIP_SIGNATUUR, knoop_op_pad, laad_analyse_json, parse_pad, schrijf_analyse_json, voorbeeld
+
+DATA = {
+    "bestandsnaam": "café.twb",
+    "databronnen": [
+        {"naam": "ds1", "kolommen": [{"naam": "[Sales]", "formule": "SUM([a])\n/ 2", "afhankelijkheden": []}]},
+        {"naam": "ds2", "kolommen": []},
+    ],
+    "werkbladen": [],
+    "dashboards": {},
+    "afhankelijkheidsgraaf": {"knopen": [], "cycli": [[1, 2]], "diepte": None},
+    "aantal": 3.5,
+}
+
+
+class TestTableauJson(unittest.TestCase):
+
+    def setUp(self):
+        self.map = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.map)
+
+    def _lees(self, naam):
+        with open(os.path.join(self.map, naam), encoding='utf-8') as f:
+            return f.read()
+
+    def test_output_matches_json_dump(self):
+        """Indented and compact output are byte-identical to the equivalent json.dumps call."""
+        schrijf_analyse_json(DATA, os.path.join(self.map, "ingesprongen.json"))
+        schrijf_analyse_json(DATA, os.path.join(self.map, "compact.json"), compact=True)
+        schrijf_analyse_json({}, os.path.join(self.map, "leeg.json"))
+
+        self.assertEqual(self._lees("ingesprongen.json"), json.dumps(DATA, indent=4, ensure_ascii=False))
+        self.assertEqual(self._lees("compact.json"),
+                         json.dumps(DATA, ensure_ascii=False, separators=(',', ':')))
+        self.assertEqual(self._lees("leeg.json"), "{}")
+
+    def test_gzip_round_trip(self):
+        """A .gz path is compressed automatically and the loader reads both variants."""
+        gz_pad = os.path.join(self.map, "analyse.json.gz")
+        pad = os.path.join(self.map, "analyse.json")
+        schrijf_analyse_json(DATA, gz_pad, compact=True)
+        schrijf_analyse_json(DATA, pad)
+
+        with open(gz_pad, 'rb') as f:
+            self.assertEqual(f.read(2), GZIP_SIGNATUUR)
+        self.assertEqual(laad_analyse_json(gz_pad), DATA)
+        self.assertEqual(laad_analyse_json(pad), DATA)
+
+    def test_process_tableau_file_gzip(self):
+        """process_tableau_file writes *_analyse.json.gz when gzip output is requested."""
+        pad = os.path.join(self.map, "wb.twb")
+        with open(pad, 'w', encoding='utf-8') as f:
+            f.write('<workbook><datasources><datasource name="ds1"/></datasources></workbook>')
+        self.assertTrue(process_tableau_file(pad, output_dir=self.map, compact=True, gzip_uitvoer=True))
+        data = laad_analyse_json(os.path.join(self.map, "wb_analyse.json.gz"))
+        self.assertEqual(data["databronnen"][0]["naam"], "ds1")
+
+
+    def test_sections_are_written_as_they_finish(self):
+        """Worksheets and dashboards reach the writer before the datasources are enriched."""
+        pad = os.path.join(self.map, "wb.twb")
+        with open(pad, 'w', encoding='utf-8') as f:
+            f.write('<workbook><datasources><datasource name="ds1"><column name="[a]" datatype="real"/>'
+                    '<column name="[b]"><calculation formula="[a] * 2"/></column></datasource></datasources>'
+                    '<worksheets><worksheet name="Blad"/></worksheets></workbook>')
+        verrijk = tableau_analyzer._verrijk_berekende_velden
+        bij_verrijken = []
+
+        def _volg(project_data, *args, **kwargs):
+            bij_verrijken.append(set(schrijver.geschreven))
+            return verrijk(project_data, *args, **kwargs)
+
+        uitvoer = os.path.join(self.map, "wb_analyse.json")
+        with tableau_analyzer.analyse_json_schrijver(uitvoer) as schrijver, \
+                mock.patch.object(tableau_analyzer, '_verrijk_berekende_velden', _volg):
+            data = analyze_stream(pad, uitvoer=schrijver)
+            self.assertFalse(os.path.exists(uitvoer))
+            schrijver.schrijf_resterend(data)
+        self.assertIn("werkbladen", bij_verrijken[0])
+        self.assertNotIn("databronnen", bij_verrijken[0])
+        self.assertEqual(laad_analyse_json(uitvoer), json.loads(json.dumps(data)))
+        self.assertEqual(laad_analyse_json(uitvoer)["databronnen"][0]["kolommen"][1]["afhankelijkheden"], ["[a]"])
+
+    def test_failed_analysis_keeps_previous_output(self):
+        """A failing analysis leaves an existing output file untouched and no temporary files behind."""
+        pad = os.path.join(self.map, "wb.twb")
+        with open(pad, 'w', encoding='utf-8') as f:
+            f.write('<workbook><worksheets><worksheet name="Blad"/></worksheets></workbook>')
+        self.assertTrue(process_tableau_file(pad, output_dir=self.map))
+        vorige = self._lees("wb_analyse.json")
+        with open(pad, 'w', encoding='utf-8') as f:
+            f.write('<workbook><worksheets><worksheet name="Blad"/>')
+        self.assertFalse(process_tableau_file(pad, output_dir=self.map))
+        self.assertEqual(self._lees("wb_analyse.json"), vorige)
+        self.assertEqual(sorted(os.listdir(self.map)), ["wb.twb", "wb_analyse.json"])
+
+    def test_preview_navigation(self):
+        """Paths resolve nodes; the preview is one level deep, paged and truncated."""
+        self.assertEqual(parse_pad("/databronnen/0/kolommen/"), ["databronnen", 0, "kolommen"])
+        kolommen = knoop_op_pad(DATA, parse_pad("databronnen/0/kolommen"))
+        self.assertEqual(kolommen[0]["naam"], "[Sales]")
+        with self.assertRaises(KeyError):
+            knoop_op_pad(DATA, ["bestaat_niet"])
+
+        self.assertEqual(voorbeeld(DATA, max_items=2), {"bestandsnaam": "café.twb", "databronnen": "[… 2 items]"})
+        self.assertEqual(voorbeeld(DATA["databronnen"], start=1), {"1": "{… 2 sleutels}"})
+        self.assertEqual(voorbeeld("x" * 10, max_tekst=4), "xxxx… (+6 tekens)")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import os
+import shutil
+import tempfile
+import zipfile
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tableau_analyzer import analyze_stream
+from tableau_linter import lint_bestand, lint_werkboek, rangschik
+
+TWB_MET_FILTERS = """<?xml version='1.0' encoding='utf-8' ?>
+<workbook>
+  <datasources>
+    <datasource name="federated.verkoop">
+      <connection class="federated">
+        <named-connections>
+          <named-connection name="sqlserver.1">
+            <connection class="sqlserver" server="sql-prod" dbname="DWH"/>
+          </named-connection>
+        </named-connections>
+      </connection>
+      <column name="[Regio]" datatype="string" role="dimension"/>
+    </datasource>
+  </datasources>
+  <worksheets>
+    <worksheet name="Omzet"/>
+    <worksheet name="Marge"/>
+  </worksheets>
+  <windows>
+    <window class="worksheet" name="Omzet">
+      <cards>
+        <edge name="right">
+          <strip size="160">
+            <card type="filter" param="[federated.verkoop].[none:Regio:nk]"/>
+            <card type="filter" param="[federated.verkoop].[none:Land:nk]"/>
+            <card type="filter" param="[federated.verkoop].[none:Stad:nk]"/>
+            <card type="filter" param="[federated.verkoop].[none:Klant:nk]"/>
+            <card type="filter" param="[federated.verkoop].[none:Product:nk]"/>
+            <card type="color" param="[federated.verkoop].[none:Regio:nk]"/>
+          </strip>
+        </edge>
+      </cards>
+    </window>
+    <window class="worksheet" name="Marge">
+      <cards>
+        <edge name="left">
+          <strip size="160"><card type="pages"/></strip>
+        </edge>
+      </cards>
+    </window>
+    <window class="dashboard" name="Overzicht"/>
+  </windows>
+</workbook>
+"""
+
+
+def _kolom(naam, formule=None, afhankelijkheden=None):
+    return {"naam": naam, "is_berekend_veld": formule is not None, "formule": formule,
+            "afhankelijkheden": afhankelijkheden or []}
+
+
+class TestTableauLinter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp(prefix="tableau_linter_tests_")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def _regels(self, rapport):
+        return {(b["regel"], b["object"]): b for b in rapport["bevindingen"]}
+
+    def test_datasource_rules(self):
+        """Live connections without an extract are flagged, and COUNTD is weighed by datasource size."""
+        project_data = {
+            "bestandsnaam": "bronnen.twbx",
+            "databronnen": [
+                {"naam": "live", "verbindingen": [{"class": "federated"}, {"class": "oracle", "server": "ora"}],
+                 "kolommen": [_kolom("Klanten", "COUNTD([Klant])")]},
+                {"naam": "extract", "verbindingen": [{"class": "federated"},
+                                                     {"class": "hyper", "dbname": "Data/Extracts/groot.hyper"}],
+                 "kolommen": [_kolom("Orders", "COUNTD([Order])")]},
+                {"naam": "klein", "verbindingen": [{"class": "hyper", "dbname": "Data/Extracts/klein.hyper"}],
+                 "kolommen": [_kolom("Producten", "COUNTD([Product])")]},
+                {"naam": "csv", "verbindingen": [{"class": "textscan", "dbname": "data.csv"}], "kolommen": []},
+            ],
+            "pakket": {"bestanden": [
+                {"naam": "Data/Extracts/groot.hyper", "ongecomprimeerd_bytes": 500 * 1024 * 1024},
+                {"naam": "Data/Extracts/klein.hyper", "ongecomprimeerd_bytes": 1024 * 1024},
+            ]},
+        }
+        regels = self._regels(lint_werkboek(project_data))
+        self.assertEqual(regels[("live_zonder_extract", "live")]["servers"], ["oracle:ora"])
+        self.assertNotIn(("live_zonder_extract", "extract"), regels)
+        self.assertNotIn(("live_zonder_extract", "csv"), regels)
+        self.assertEqual(regels[("countd_op_grote_databron", "live")]["ernst"], "middel")
+        self.assertEqual(regels[("countd_op_grote_databron", "extract")]["ernst"], "hoog")
+        self.assertEqual(regels[("countd_op_grote_databron", "extract")]["velden"], ["Orders"])
+        self.assertNotIn(("countd_op_grote_databron", "klein"), regels)
+
+    def test_calculation_rules(self):
+        """FIXED LODs are counted per workbook; text-heavy row calcs and nested table calcs per field."""
+        kolommen = [_kolom(f"LOD {i}", "{FIXED [Klant] : SUM([Omzet])}") for i in range(12)]
+        kolommen += [
+            _kolom("Code", "UPPER(LEFT(TRIM([Naam]), 3)) + REGEXP_EXTRACT([Naam], '(\\d+)')"),
+            _kolom("Kort", "LEFT([Naam], 1)"),
+            _kolom("Geaggregeerd", "MAX(UPPER(LEFT(TRIM([Naam]), 3)))"),
+            _kolom("Genest", "RUNNING_SUM(WINDOW_AVG(SUM([Omzet])))"),
+            _kolom("Lopend", "RUNNING_SUM(SUM([Omzet]))"),
+            _kolom("Bovenop", "RANK([Lopend])", afhankelijkheden=["Lopend"]),
+        ]
+        project_data = {"bestandsnaam": "berekeningen.twb",
+                        "databronnen": [{"naam": "ds", "verbindingen": [], "kolommen": kolommen}]}
+        regels = self._regels(lint_werkboek(project_data))
+
+        fixed = regels[("veel_fixed_lod", "berekeningen.twb")]
+        self.assertEqual(fixed["ernst"], "middel")
+        self.assertIn("12 FIXED", fixed["bericht"])
+        self.assertEqual(len(fixed["velden"]), 10)
+
+        tekst = regels[("tekst_zware_rijberekening", "Code")]
+        self.assertEqual(tekst["ernst"], "middel")
+        self.assertIn("REGEXP_EXTRACT", tekst["functies"])
+        self.assertNotIn(("tekst_zware_rijberekening", "Kort"), regels)
+        self.assertNotIn(("tekst_zware_rijberekening", "Geaggregeerd"), regels)
+
+        self.assertIn(("geneste_tabelberekening", "Genest"), regels)
+        self.assertIn("Lopend", regels[("geneste_tabelberekening", "Bovenop")]["bericht"])
+        self.assertNotIn(("geneste_tabelberekening", "Lopend"), regels)
+
+    def test_quick_filters_and_zones(self):
+        """The analyzer counts filter cards per worksheet; dashboards are judged on filter zones and zone count."""
+        twb = os.path.join(self.test_dir, "filters.twb")
+        with open(twb, 'w', encoding='utf-8') as f:
+            f.write(TWB_MET_FILTERS)
+        twbx = os.path.join(self.test_dir, "filters.twbx")
+        with zipfile.ZipFile(twbx, 'w') as z:
+            z.write(twb, "filters.twb")
+        for streaming in (True, False):
+            for secties in (None, "werkbladen"):
+                with self.subTest(streaming=streaming, secties=secties):
+                    werkbladen = analyze_stream(twbx, streaming=streaming, secties=secties)["werkbladen"]
+                    self.assertEqual({ws["naam"]: ws["quick_filters"] for ws in werkbladen}, {"Omzet": 5, "Marge": 0})
+
+        rapport = lint_bestand(twbx)
+        self.assertTrue(rapport["quick_filters_per_werkblad"])
+        regels = self._regels(rapport)
+        self.assertEqual(regels[("veel_quick_filters", "Omzet")]["ernst"], "middel")
+        self.assertIn(("live_zonder_extract", "federated.verkoop"), regels)
+
+        objecten = [{"type": "filter"}] * 12 + [{"type": "text"}] * 90
+        regels = self._regels(lint_werkboek({"dashboards": [{"naam": "Druk", "objecten": objecten}]}))
+        self.assertEqual(regels[("veel_quick_filters", "Druk")]["aantal"], 12)
+        self.assertEqual(regels[("veel_quick_filters", "Druk")]["ernst"], "hoog")
+        self.assertEqual(regels[("veel_zones", "Druk")]["ernst"], "hoog")
+
+    def test_risk_score_and_ranking(self):
+        """The score sums severity weights, capped per rule, and ranks workbooks highest risk first."""
+        schoon = {"bestandsnaam": "schoon.twb", "databronnen": [], "dashboards": []}
+        veel_velden = {"bestandsnaam": "veel.twb", "databronnen": [{
+            "naam": "ds", "verbindingen": [],
+            "kolommen": [_kolom(f"T{i}", "UPPER(LEFT(TRIM([Naam]), 3))") for i in range(50)]}]}
+        live = {"bestandsnaam": "live.twb", "databronnen": [
+            {"naam": f"ds{i}", "verbindingen": [{"class": "postgres", "server": "pg"}], "kolommen": []}
+            for i in range(3)]}
+
+        rapporten = [lint_werkboek(pd) for pd in (schoon, veel_velden, live)]
+        self.assertEqual(rapporten[0]["risicoscore"], 0)
+        self.assertEqual(rapporten[0]["risico"], "laag")
+        self.assertEqual(rapporten[1]["per_ernst"]["laag"], 50)
+        self.assertEqual(rapporten[1]["risicoscore"], 20)
+        self.assertEqual(rapporten[1]["risico"], "hoog")
+        self.assertEqual(rapporten[2]["risicoscore"], 9)
+        self.assertEqual(rapporten[2]["risico"], "middel")
+        self.assertTrue(rapporten[2]["quick_filters_per_werkblad"])
+        self.assertFalse(lint_werkboek({"werkbladen": [{"naam": "Oud"}]})["quick_filters_per_werkblad"])
+        self.assertEqual([r["bestandsnaam"] for r in rangschik(rapporten)], ["veel.twb", "live.twb", "schoon.twb"])
+
+        streng = lint_werkboek(live, drempels={"risico_middel": 20, "risico_hoog": 40})
+        self.assertEqual(streng["risico"], "laag")
+
+
+if __name__ == '__main__':
+    unittest.main()
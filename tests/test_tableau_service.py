@@ -0,0 +1,129 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import threading
+import http.client
+from unittest import mock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tableau_service
+from tableau_cache import bereken_sleutel
+from tableau_service import AnalyseService, maak_server
+
+VALID_TWB = b"""
+<workbook>
+  <datasources>
+    <datasource name="ds1">
+      <column name="[col1]" datatype="string" role="dimension"/>
+    </datasource>
+  </datasources>
+</workbook>
+"""
+MALFORMED_TWB = b"<workbook><datasources>"
+
+
+class TestTableauService(unittest.TestCase):
+
+    def setUp(self):
+        self.werk_map = tempfile.mkdtemp(prefix="tableau_service_tests_")
+        self.servers = []
+
+    def tearDown(self):
+        for server, service in self.servers:
+            server.shutdown()
+            server.server_close()
+            service.stop()
+        shutil.rmtree(self.werk_map)
+
+    def _start(self, **opties):
+        opties.setdefault("procespool", False)
+        service = AnalyseService(werk_map=self.werk_map, **opties)
+        server = maak_server(service, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append((server, service))
+        return server.server_address[1]
+
+    def _verzoek(self, poort, methode, pad, body=None, headers=None):
+        verbinding = http.client.HTTPConnection("127.0.0.1", poort, timeout=30)
+        try:
+            verbinding.request(methode, pad, body=body, headers=headers or {})
+            antwoord = verbinding.getresponse()
+            return antwoord.status, dict(antwoord.getheaders()), antwoord.read()
+        finally:
+            verbinding.close()
+
+    def test_analyse_roundtrip_and_deduplication(self):
+        """An upload is analyzed; an identical upload reuses the job, whose id is the cache key."""
+        poort = self._start(workers=2)
+        status, headers, body = self._verzoek(poort, "POST", "/analyseer?bestandsnaam=a.twb", VALID_TWB)
+        self.assertIn(status, (200, 202))
+        taak = json.loads(body)
+        self.assertEqual(taak["id"], bereken_sleutel(VALID_TWB, bestandsnaam="a.twb"))
+        self.assertEqual(headers["Location"], f"/status/{taak['id']}")
+
+        status, _, body = self._verzoek(poort, "GET", f"/resultaat/{taak['id']}?wacht=10")
+        self.assertEqual(status, 200)
+        resultaat = json.loads(body)
+        self.assertEqual(resultaat["bestandsnaam"], "a.twb")
+        self.assertEqual(resultaat["databronnen"][0]["naam"], "ds1")
+
+        status, _, body = self._verzoek(poort, "POST", "/analyseer?bestandsnaam=a.twb", VALID_TWB)
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body)["duplicaat"])
+        status, _, body = self._verzoek(poort, "GET", f"/status/{taak['id']}")
+        self.assertEqual(json.loads(body)["status"], "klaar")
+        self.assertEqual(json.loads(self._verzoek(poort, "GET", "/gezondheid")[2])["verwerkt"], 1)
+        self.assertEqual(os.listdir(self.werk_map), [])
+
+    def test_chunked_upload_and_errors(self):
+        """Chunked uploads are decoded; parse errors, unknown jobs and bad sections are reported."""
+        poort = self._start(workers=1)
+        # http.client sends an iterator without Content-Length as a chunked body
+        delen = iter([MALFORMED_TWB[:10], MALFORMED_TWB[10:]])
+        status, _, body = self._verzoek(poort, "POST", "/analyseer?bestandsnaam=kapot.twb", delen)
+        self.assertIn(status, (200, 202))
+        taak = json.loads(body)
+        self.assertEqual(taak["grootte"], len(MALFORMED_TWB))
+
+        status, _, body = self._verzoek(poort, "GET", f"/resultaat/{taak['id']}?wacht=10")
+        self.assertEqual(status, 500)
+        self.assertIn("fout", json.loads(body))
+        self.assertEqual(self._verzoek(poort, "GET", "/resultaat/onbekend")[0], 404)
+        self.assertEqual(self._verzoek(poort, "POST", "/analyseer?secties=onzin", VALID_TWB)[0], 400)
+
+    def test_full_queue_is_rejected_with_retry_after(self):
+        """With every worker busy and no queue left, new uploads get 503 instead of piling up."""
+        vrijgeven = threading.Event()
+        origineel = tableau_service._analyseer_taak
+
+        def _langzaam(*args):
+            vrijgeven.wait(10)
+            return origineel(*args)
+
+        with mock.patch("tableau_service._analyseer_taak", _langzaam):
+            poort = self._start(workers=1, max_wachtrij=1)
+            for naam in ("a.twb", "b.twb"):
+                status, _, _ = self._verzoek(poort, "POST", f"/analyseer?bestandsnaam={naam}", VALID_TWB)
+                self.assertEqual(status, 202)
+            status, headers, _ = self._verzoek(poort, "POST", "/analyseer?bestandsnaam=c.twb", VALID_TWB)
+            self.assertEqual(status, 503)
+            self.assertGreaterEqual(int(headers["Retry-After"]), 1)
+            gezondheid = json.loads(self._verzoek(poort, "GET", "/gezondheid")[2])
+            self.assertEqual((gezondheid["bezig"], gezondheid["wachtend"], gezondheid["geweigerd"]), (1, 1, 1))
+            vrijgeven.set()
+
+    def test_process_pool(self):
+        """The default process pool analyzes uploads in long-lived worker processes."""
+        poort = self._start(workers=1, procespool=True)
+        taak = json.loads(self._verzoek(poort, "POST", "/analyseer?bestandsnaam=a.twb", VALID_TWB)[2])
+        status, _, body = self._verzoek(poort, "GET", f"/resultaat/{taak['id']}?wacht=60")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["databronnen"][0]["naam"], "ds1")
+
+
+if __name__ == '__main__':
+    unittest.main()
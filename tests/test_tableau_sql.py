@@ -0,0 +1,102 @@
+import unittest
+import os
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tableau_analyzer import analyze_bytes
+from tableau_sql import normaliseer_sql, sql_fingerprint, sql_rapport
+
+TWB_MET_CUSTOM_SQL = """
+<workbook>
+  <datasources>
+    <datasource name="federated.orders" version="18.1">
+      <connection class="federated">
+        <named-connections>
+          <named-connection name="oracle.1">
+            <connection class="oracle" server="ora-prod" dbname="DWH" username="bi"/>
+          </named-connection>
+        </named-connections>
+        <_.fcp.ObjectModelEncapsulateLegacy.false...relation name="Orders" type="text">SELECT * FROM orders WHERE region = 'EU'</_.fcp.ObjectModelEncapsulateLegacy.false...relation>
+        <_.fcp.ObjectModelEncapsulateLegacy.true...relation name="Orders" type="text">SELECT * FROM orders WHERE region = 'EU'</_.fcp.ObjectModelEncapsulateLegacy.true...relation>
+      </connection>
+      <column name="[region]" datatype="string" role="dimension"/>
+    </datasource>
+    <datasource name="federated.tabel">
+      <connection class="federated">
+        <relation name="Klanten" table="[dbo].[klanten]" type="table"/>
+      </connection>
+    </datasource>
+  </datasources>
+</workbook>
+"""
+
+
+def _project_data(bestandsnaam, *queries, server="ora-prod"):
+    return {
+        "bestandsnaam": bestandsnaam,
+        "databronnen": [{
+            "naam": "federated.ds",
+            "verbindingen": [{"class": "federated"}, {"class": "oracle", "server": server, "dbname": "DWH"}],
+            "custom_sql": [{"naam": f"Query {i}", "sql": sql} for i, sql in enumerate(queries)],
+        }],
+    }
+
+
+class TestTableauSql(unittest.TestCase):
+
+    def test_normalization_strips_literals_comments_and_case(self):
+        """Queries that differ only in literals, comments, whitespace or case share a fingerprint."""
+        a = "SELECT Naam, SUM(bedrag) FROM verkoop -- totaal\nWHERE jaar = 2023 AND regio IN ('EU', 'US');"
+        b = "select naam,sum(BEDRAG)\n  from VERKOOP /* ander commentaar */ where JAAR = 2024 and regio in ('NL')"
+        self.assertEqual(normaliseer_sql(a), "select naam , sum ( bedrag ) from verkoop where jaar = ? "
+                                             "and regio in ( ? )")
+        self.assertEqual(sql_fingerprint(a), sql_fingerprint(b))
+        self.assertNotEqual(sql_fingerprint(a), sql_fingerprint(a.replace("verkoop", "inkoop")))
+        # Comment markers inside a string literal are data, and Tableau parameters are literals
+        self.assertEqual(normaliseer_sql("SELECT '-- geen commentaar' FROM t WHERE d > <[Parameters].[Start]>"),
+                         "select ? from t where d > ?")
+
+    def test_custom_sql_is_extracted_per_datasource(self):
+        """Text relations (also the object model variants) are extracted once, identically in both parsers."""
+        resultaten = [analyze_bytes(TWB_MET_CUSTOM_SQL.encode('utf-8'), "orders.twb", streaming=streaming)
+                      for streaming in (False, True)]
+        resultaten.append(analyze_bytes(TWB_MET_CUSTOM_SQL.encode('utf-8'), "orders.twb", streaming=True,
+                                        secties="databronnen"))
+        for data in resultaten:
+            orders, tabel = data["databronnen"]
+            self.assertEqual(orders["custom_sql"], [{
+                "naam": "Orders", "sql": "SELECT * FROM orders WHERE region = 'EU'",
+                "fingerprint": sql_fingerprint("select * from orders where region = ?")}])
+            self.assertEqual(tabel["custom_sql"], [])
+        self.assertEqual(resultaten[0]["structuur_hashes"], resultaten[1]["structuur_hashes"])
+
+    def test_fleet_report_groups_identical_and_similar_queries(self):
+        """Identical fingerprints are grouped; near-duplicates join them only above the threshold."""
+        basis = ("SELECT o.order_id, o.klant_id, o.bedrag, k.naam, k.segment, k.land FROM orders o "
+                 "JOIN klanten k ON k.klant_id = o.klant_id WHERE o.jaar = 2024 AND k.land = 'NL'")
+        extra_kolom = basis.replace("k.land FROM", "k.land, k.regio FROM")
+        resultaten = [
+            _project_data("a.twb", basis),
+            _project_data("b.twb", basis.replace("2024", "2023").replace("'NL'", "'BE'")),
+            _project_data("c.twb", extra_kolom, server="ora-test"),
+            _project_data("d.twb", "SELECT * FROM voorraad"),
+        ]
+
+        rapport = sql_rapport(resultaten, drempel=0.8)
+        self.assertEqual((rapport["aantal_queries"], rapport["unieke_queries"]), (4, 3))
+        self.assertEqual(len(rapport["groepen"]), 1)
+        groep = rapport["groepen"][0]
+        self.assertFalse(groep["identiek"])
+        self.assertEqual(groep["werkboeken"], ["a.twb", "b.twb", "c.twb"])
+        self.assertEqual(groep["servers"], ["oracle:ora-prod/DWH", "oracle:ora-test/DWH"])
+        self.assertEqual(groep["fingerprints"][0], sql_fingerprint(basis))
+        self.assertGreaterEqual(groep["min_gelijkenis"], 0.8)
+
+        alleen_identiek = sql_rapport(resultaten, drempel=1.0)
+        self.assertEqual([(g["identiek"], g["werkboeken"]) for g in alleen_identiek["groepen"]],
+                         [(True, ["a.twb", "b.twb"])])
+
+
+if __name__ == '__main__':
+    unittest.main()
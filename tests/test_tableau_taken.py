@@ -0,0 +1,114 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from tableau_analyzer import analyze_stream
+from tableau_cache import GeheugenCache
+from tableau_taken import AnalyseTaak
+from genereer_werkboek import genereer_werkboek
+
+
+class _AnnuleerTijdensParsen(AnalyseTaak):
+    """Cancels itself as soon as the parser has read its first block."""
+
+    def _controleer(self):
+        if self.gelezen_bytes > 1024:
+            self.annuleer()
+        super()._controleer()
+
+
+class TestAnalyseTaak(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp(prefix="tableau_taken_tests_")
+        cls.twb = os.path.join(cls.test_dir, "synthetisch.twb")
+        genereer_werkboek(cls.twb, databronnen=3, kolommen=100, berekende_velden=200, formule_diepte=3,
+                          werkbladen=20, dashboards=4, seed=3)
+        with open(cls.twb, 'rb') as f:
+            cls.inhoud = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def test_background_analysis_reports_phases(self):
+        """A finished task has the same result as a direct analysis and reports every phase."""
+        for streaming in (True, False):
+            with self.subTest(streaming=streaming):
+                taak = AnalyseTaak(self.inhoud, "synthetisch.twb", streaming=streaming).start()
+                self.assertTrue(taak.wacht(30))
+                self.assertEqual(taak.status, "klaar")
+                verwacht = analyze_stream(self.inhoud, bestandsnaam="synthetisch.twb", streaming=streaming)
+                self.assertEqual(taak.resultaat["databronnen"], verwacht["databronnen"])
+                self.assertNotIn("_metrics", taak.resultaat)
+
+                voortgang = taak.voortgang()
+                self.assertEqual(voortgang["fractie"], 1.0)
+                self.assertEqual(voortgang["gelezen_mb"], voortgang["totaal_mb"])
+                fases = [meting["fase"] for meting in voortgang["fases"]]
+                self.assertIn("afhankelijkheden", fases)
+                self.assertIn("streaming_parse" if streaming else "parsen", fases)
+
+    def test_live_element_counts_during_streaming(self):
+        """While streaming, the progress snapshot shows the elements parsed so far."""
+        gezien = []
+
+        class _Peilend(AnalyseTaak):
+            def _controleer(self):
+                if self.gelezen_bytes:
+                    gezien.append(self.voortgang())
+                super()._controleer()
+
+        taak = _Peilend(self.inhoud, "synthetisch.twb", streaming=True).start()
+        self.assertTrue(taak.wacht(30))
+        tijdens_parsen = [v for v in gezien if v["fase"] == "streaming_parse" and v["elementen"]]
+        self.assertTrue(tijdens_parsen)
+        self.assertLess(tijdens_parsen[0]["fractie"], 1.0)
+        self.assertIn("databronnen", tijdens_parsen[-1]["elementen"])
+
+    def test_cancel_stops_parsing_and_releases_input(self):
+        """Cancelling aborts the parser mid-file, stores nothing and drops the uploaded bytes."""
+        register = GeheugenCache()
+        for streaming in (True, False):
+            with self.subTest(streaming=streaming):
+                taak = _AnnuleerTijdensParsen(self.inhoud, "synthetisch.twb", streaming=streaming,
+                                              register=register, sleutel=f"sleutel-{streaming}").start()
+                self.assertTrue(taak.wacht(30))
+                self.assertEqual(taak.status, "geannuleerd")
+                self.assertIsNone(taak.resultaat)
+                self.assertLess(taak.gelezen_bytes, len(self.inhoud))
+                self.assertIsNone(taak._bron)
+                self.assertIsNone(register.get(f"sleutel-{streaming}"))
+
+    def test_cancel_queued_task(self):
+        """A task still waiting for a pool worker is cancelled without ever running."""
+        vrijgeven = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(vrijgeven.wait, 10)
+            taak = AnalyseTaak(self.twb, streaming=True).start(pool)
+            self.assertEqual(taak.voortgang()["status"], "wachtend")
+            taak.annuleer()
+            self.assertTrue(taak.is_gereed)
+            self.assertEqual(taak.status, "geannuleerd")
+            self.assertEqual(taak.gelezen_bytes, 0)
+            vrijgeven.set()
+
+    def test_error_is_reported(self):
+        """A parse error ends the task with status 'fout' and keeps the exception."""
+        taak = AnalyseTaak(b"<workbook><datasources>", "kapot.twb").start()
+        self.assertTrue(taak.wacht(30))
+        self.assertEqual(taak.status, "fout")
+        self.assertIsNotNone(taak.fout)
+        self.assertIsNotNone(taak.voortgang()["fout"])
+
+
+if __name__ == '__main__':
+    unittest.main()